@@ -1,55 +1,91 @@
 import os
+import sys
 import time
 import re
+import json
+import hashlib
+import shutil
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
 import faiss
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
+from langchain_community.document_loaders import TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
 
+# Shared helpers from the backend (rate limiter, embedding backend, filing-name parsing)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rate_limiter import ApiKeyRateLimiter, estimate_tokens
+from embeddings import EMBEDDING_BACKEND, create_embeddings, get_embeddings, embedding_info, read_embedding_info, write_embedding_info
+from vector_store import parse_company_name, parse_quarter, replace_directory
+from ann_index import INDEX_TYPES, FAISS_INDEX_TYPE, save_store, load_store
+
 # Load environment variables
 load_dotenv()
 
 # Configuration
 FAISS_STORE_PATH = "update_faiss_store_finance"
 DATA_DIR = "./extracted_sec_text_test"
-EMBEDDED_FILES_PATH = "update_embedded_files.txt"
+MANIFEST_NAME = "manifest.json"  # saved inside FAISS_STORE_PATH
+INDEX_TYPE = FAISS_INDEX_TYPE  # index servers search: flat (exact), ivf_flat, hnsw or ivf_pq
+
+# Ingestion pipeline (override via .env)
+EMBED_API_KEYS = [k.strip() for k in os.getenv("EMBED_API_KEYS", os.getenv("GOOGLE_API_KEY", "")).split(",") if k.strip()]
+EMBED_RPM = int(os.getenv("EMBED_RPM", "100"))                 # embedding requests per minute, per key
+EMBED_TPM = int(os.getenv("EMBED_TPM", "1000000"))             # embedding tokens per minute, per key
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))   # chunks per request (API maximum is 100)
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))   # rate-limit retries per batch
+EMBED_MAX_WAIT = float(os.getenv("EMBED_MAX_WAIT", "600"))     # longest wait for key capacity (s)
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", str(2 * max(1, len(EMBED_API_KEYS)))))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 2)))
+CHECKPOINT_FILES = int(os.getenv("CHECKPOINT_FILES", "5"))
+CHECKPOINT_SECONDS = float(os.getenv("CHECKPOINT_SECONDS", "120"))
+PRUNE_MAX_FILES = int(os.getenv("PRUNE_MAX_FILES", "5"))  # more missing files than this need --prune-deleted
 HTML_CLEANER = re.compile(r'<.*?>|&([a-z0-9]+|#[0-9]{1,6}|#x[0-9a-f]{1,6});')
 URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
 REFERENCE_PATTERN = re.compile(r'\[\d+\]|\(Source:.*?\)')
 
 # --------------------------- Helper Functions ---------------------------
-def load_embedded_files():
-    """Load already processed files"""
-    if os.path.exists(EMBEDDED_FILES_PATH):
-        with open(EMBEDDED_FILES_PATH, "r") as f:
-            return set(line.strip() for line in f if line.strip())
-    return set()
-
-def save_embedded_files(new_files):
-    """Update embedded files tracking"""
-    existing = load_embedded_files()
-    updated = existing.union(set(new_files))
-    with open(EMBEDDED_FILES_PATH, "w") as f:
-        f.write("\n".join(updated))
-
-def save_faiss_index(vectorstore):
-    """Save FAISS index"""
-    vectorstore.save_local(FAISS_STORE_PATH)
+def save_faiss_index(vectorstore, manifest=None):
+    """
+    Save FAISS index and its manifest together. Both are written aside and the
+    directory is renamed into place, so a crash never leaves half an index or a
+    manifest that describes a different one. With an ANN INDEX_TYPE the exact index
+    is kept as flat.* for the next incremental run and index.* is rebuilt from it.
+    """
+    staging = f"{FAISS_STORE_PATH}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    save_store(vectorstore, staging, INDEX_TYPE)
+    write_embedding_info(staging)
+    if manifest is not None:
+        manifest.save(os.path.join(staging, MANIFEST_NAME))
+    replace_directory(staging, FAISS_STORE_PATH)
     print("💾 Vector store updated")
 
+def delete_vectors(vectorstore, doc_ids):
+    """Remove chunks from the index and docstore (ids that are already gone are ignored)."""
+    present = set(vectorstore.index_to_docstore_id.values()) if vectorstore is not None else set()
+    doc_ids = [doc_id for doc_id in doc_ids if doc_id in present]
+    if doc_ids:
+        vectorstore.delete(doc_ids)
+    return len(doc_ids)
+
 def load_faiss_index():
-    """Load existing FAISS index"""
+    """Load existing FAISS index (it must have been embedded with the configured backend)"""
     if os.path.exists(FAISS_STORE_PATH):
+        built_with = read_embedding_info(FAISS_STORE_PATH)
+        if built_with != embedding_info():
+            raise RuntimeError(f"{FAISS_STORE_PATH} was embedded with {built_with}, not {embedding_info()}; "
+                               f"re-embed it first: python vector_store.py migrate --store {FAISS_STORE_PATH}")
         try:
-            embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-            return FAISS.load_local(FAISS_STORE_PATH, embeddings, allow_dangerous_deserialization=True)
+            return load_store(FAISS_STORE_PATH, get_embeddings())
         except Exception as e:
             print(f"⚠️ Error loading index: {e}")
     return None
@@ -73,165 +109,416 @@ def financial_chunking(text):
         return 768   # Dense numerical data
     return 512  # General text
 
-# --------------------------- Rapid Embedding Function ---------------------------
-def rapid_embedding(vectorstore, texts, metadatas, max_retries=3, max_wait=300):
+# --------------------------- Embedding Pool ---------------------------
+def is_rate_limit_error(error):
+    error_str = str(error)
+    return "429" in error_str or "RATE_LIMIT_EXCEEDED" in error_str or "RESOURCE_EXHAUSTED" in error_str
+
+class EmbeddingPool:
     """
-    Attempts to add the provided texts and metadatas to the vectorstore.
-    Retries if a rate limit error (429) is encountered, using exponential backoff
-    capped at max_wait seconds. If the wait time exceeds max_wait, the embedding is skipped.
-    
-    Returns True if successful, otherwise prints the error and returns False.
+    Embedding clients for several API keys behind one shared token-bucket limiter.
+
+    Batches are sized adaptively (AIMD): every successful request grows the batch by
+    one chunk up to `max_batch_size`, a rate-limit error halves it and blocks the key
+    for the back-off period. Safe to call from many threads at once. The local
+    backend has no keys or quotas: one shared client and no limiter.
     """
-    attempt = 0
-    while attempt < max_retries:
-        try:
-            vectorstore.add_texts(texts, metadatas=metadatas)
-            return True
-        except Exception as e:
-            error_str = str(e)
-            if "429" in error_str or "RATE_LIMIT_EXCEEDED" in error_str:
+
+    def __init__(self, api_keys, batch_size=EMBED_BATCH_SIZE, rpm=EMBED_RPM, tpm=EMBED_TPM, backend=EMBEDDING_BACKEND):
+        if backend == "local":
+            self.limiter = None
+            self.clients = {"local": get_embeddings()}
+        else:
+            if not api_keys:
+                raise ValueError("No embedding API keys configured (set EMBED_API_KEYS or GOOGLE_API_KEY)")
+            self.limiter = ApiKeyRateLimiter(api_keys, rpm=rpm, tpm=tpm)
+            self.clients = {key: create_embeddings(backend, api_key=key) for key in api_keys}
+        self.max_batch_size = batch_size
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "rate_limited": 0, "chunks": 0}
+
+    @property
+    def embeddings(self):
+        """Any client; used by FAISS to embed queries against the saved index."""
+        return next(iter(self.clients.values()))
+
+    def _resize(self, success):
+        with self._lock:
+            if success:
+                self.batch_size = min(self.max_batch_size, self.batch_size + 1)
+            else:
+                self.batch_size = max(1, self.batch_size // 2)
+
+    def embed(self, texts, max_retries=EMBED_MAX_RETRIES):
+        """Embed all texts, in adaptively sized batches. Raises once a batch exhausts its retries."""
+        vectors = []
+        attempt = 0
+        while len(vectors) < len(texts):
+            batch = texts[len(vectors):len(vectors) + self.batch_size]
+            if self.limiter is None:
+                vectors.extend(self.clients["local"].embed_documents(batch))
+                with self._lock:
+                    self.stats["requests"] += 1
+                    self.stats["chunks"] += len(batch)
+                continue
+            key = self.limiter.acquire(estimate_tokens("".join(batch)), max_wait=EMBED_MAX_WAIT)
+            if key is None:
+                raise RuntimeError(f"No embedding key had capacity within {EMBED_MAX_WAIT}s")
+            try:
+                vectors.extend(self.clients[key].embed_documents(batch))
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= max_retries:
+                    raise
                 wait_time = (2 ** attempt) * 5  # Exponential backoff: 5, 10, 20, ...
-                if wait_time > max_wait:
-                    print(f"Wait time {wait_time} seconds exceeds maximum threshold of {max_wait} seconds. Skipping file embedding.")
-                    return False
-                print(f"Rate limit exceeded, waiting {wait_time} seconds before retrying... (Attempt {attempt + 1}/{max_retries})")
-                time.sleep(wait_time)
+                self.limiter.penalize(key, wait_time)
+                self._resize(success=False)
                 attempt += 1
+                with self._lock:
+                    self.stats["rate_limited"] += 1
+                continue
+            self._resize(success=True)
+            attempt = 0
+            with self._lock:
+                self.stats["requests"] += 1
+                self.stats["chunks"] += len(batch)
+        return vectors
+
+# --------------------------- Index Manifest ---------------------------
+def file_signature(path):
+    """(mtime, size) used to skip hashing files that haven't been touched."""
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_key(company, text):
+    """Content hash of a chunk; identical text within one company's filings is stored once."""
+    return hashlib.sha256(f"{company}\x00{text}".encode("utf-8")).hexdigest()[:32]
+
+class IndexManifest:
+    """
+    What the index holds, by content. For every file: its hash, stat signature and
+    chunk keys. For every chunk: its docstore id and how many files contain it, so a
+    chunk shared by several filings is embedded once and only deleted with the last
+    file that references it.
+    """
+
+    def __init__(self, files=None, chunks=None):
+        self.files = files or {}
+        self.chunks = chunks or {}
+
+    @classmethod
+    def load(cls, store_path=FAISS_STORE_PATH):
+        path = os.path.join(store_path, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(data["files"], data["chunks"])
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"files": self.files, "chunks": self.chunks}, f)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        """
+        Manifest for an index built before manifests existed, keyed from the docstore
+        contents. Returns (manifest, duplicate_ids): extra copies of a chunk to delete.
+        """
+        manifest, duplicates = cls(), []
+        for doc_id in list(vectorstore.index_to_docstore_id.values()):
+            doc = vectorstore.docstore.search(doc_id)
+            source = doc.metadata.get("source", "")
+            key = chunk_key(parse_company_name(source), doc.page_content)
+            entry = manifest.files.get(source)
+            if entry is None:
+                exists = os.path.exists(source)
+                entry = manifest.files[source] = {
+                    "sha256": file_sha256(source) if exists else None,
+                    "signature": file_signature(source) if exists else None,
+                    "chunks": [],
+                }
+            if key in manifest.chunks:
+                if manifest.chunks[key]["id"] != doc_id:
+                    duplicates.append(doc_id)
             else:
-                print(f"Error in rapid_embedding: {e}")
-                return False
-    return False
-
-# --------------------------- Sequential File Processing ---------------------------
-def process_files_sequentially(session, new_files):
-    """Process files with cooling period and error handling, tracking embedding results"""
-    embedded_files = load_embedded_files()
-    embedded_count = 0
-    skipped_files = []
-
-    for idx, file_path in enumerate(new_files):
-        if file_path in embedded_files:
-            continue
-
-        print(f"\n🔨 Processing: {os.path.basename(file_path)}")
-        start_time = time.time()
-        
-        try:
-            # Load and preprocess file
-            loader = TextLoader(file_path)
-            doc = loader.load()[0]
-            doc.page_content = financial_preprocessor(doc.page_content)
-            
-            # Adaptive chunking
-            chunk_size = financial_chunking(doc.page_content)
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size,
-                chunk_overlap=int(chunk_size * 0.2),
-                separators=["\n\n", "\n", r"(?<=\. )", " "]
-            )
-            
-            # Split and embed
-            chunks = text_splitter.split_documents([doc])
-            if chunks:
-                success = rapid_embedding(
-                    session["vectors"], 
-                    [c.page_content for c in chunks],
-                    [c.metadata for c in chunks]
-                )
-                
-                if success:
-                    print(f"✅ Embedded {len(chunks)} chunks in {time.time()-start_time:.2f}s")
-                    embedded_files.add(file_path)
-                    save_embedded_files([file_path])
-                    embedded_count += 1
-                else:
-                    print(f"❌ Skipping {file_path} due to excessive rate limiting.")
-                    skipped_files.append(file_path)
-                    
-                # Cooling period between files
-                if idx < len(new_files)-1:
-                    print("⏳ Cooling period: 90s")
-                    time.sleep(90)
-        except Exception as e:
-            print(f"❌ Failed to process {file_path}: {str(e)}")
-            with open("processing_errors.log", "a") as f:
-                f.write(f"{file_path}: {str(e)}\n")
-            skipped_files.append(file_path)
-
-    # Return summary counts
-    return {
-        "total_files": len(new_files),
-        "embedded_count": embedded_count,
-        "skipped_files": skipped_files
-    }
+                manifest.chunks[key] = {"id": doc_id, "refs": 0}
+            if key not in entry["chunks"]:
+                entry["chunks"].append(key)
+                manifest.chunks[key]["refs"] += 1
+        return manifest, duplicates
+
+    def stale_files(self, files):
+        """Files that are new or whose size/mtime changed since they were indexed."""
+        return [f for f in files if f not in self.files or self.files[f]["signature"] != file_signature(f)]
+
+    def deleted_files(self, files):
+        present = set(files)
+        return [f for f in self.files if f not in present]
+
+    def unchanged(self, path, sha256):
+        entry = self.files.get(path)
+        return entry is not None and entry["sha256"] == sha256
+
+    def touch(self, path, signature):
+        self.files[path]["signature"] = signature
+
+    def add_chunk(self, key, doc_id):
+        self.chunks[key] = {"id": doc_id, "refs": 0}
+
+    def record_file(self, path, sha256, signature, keys):
+        """Point a file at its current chunks; returns docstore ids no file references any more."""
+        for key in keys:
+            self.chunks[key]["refs"] += 1
+        orphaned = self.remove_file(path)
+        self.files[path] = {"sha256": sha256, "signature": signature, "chunks": keys}
+        return orphaned
+
+    def drop_unreferenced(self):
+        """
+        Forget chunks no file references; returns their docstore ids. A checkpoint can
+        save chunks of a file that was still waiting for others (refs 0); if that file
+        is gone by the next run, nothing would ever remove them.
+        """
+        referenced = {key for entry in self.files.values() for key in entry["chunks"]}
+        unreferenced = [key for key, chunk in self.chunks.items() if chunk["refs"] <= 0 and key not in referenced]
+        return [self.chunks.pop(key)["id"] for key in unreferenced]
+
+    def remove_file(self, path):
+        """Forget a file; returns docstore ids no file references any more."""
+        entry = self.files.pop(path, None)
+        if entry is None:
+            return []
+        orphaned = []
+        for key in entry["chunks"]:
+            chunk = self.chunks[key]
+            chunk["refs"] -= 1
+            if chunk["refs"] <= 0:
+                orphaned.append(chunk["id"])
+                del self.chunks[key]
+        return orphaned
+
+# --------------------------- Parallel Ingestion ---------------------------
+def load_and_chunk(file_path):
+    """
+    Hash, read, clean and split one filing (runs in a worker process).
+    Returns (sha256, signature, texts, metadatas).
+    """
+    signature, sha256 = file_signature(file_path), file_sha256(file_path)
+    doc = TextLoader(file_path).load()[0]
+    doc.page_content = financial_preprocessor(doc.page_content)
+
+    # Adaptive chunking
+    chunk_size = financial_chunking(doc.page_content)
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=int(chunk_size * 0.2),
+        separators=["\n\n", "\n", r"(?<=\. )", " "]
+    )
+    chunks = text_splitter.split_documents([doc])
+    metadata = {"source": file_path, "company": parse_company_name(file_path), "quarter": parse_quarter(file_path)}
+    return sha256, signature, [c.page_content for c in chunks], [dict(metadata) for _ in chunks]
+
+def list_data_files(data_dir=DATA_DIR):
+    """Text filings in data_dir, named the way DirectoryLoader reports their source."""
+    return sorted(str(path) for path in Path(data_dir).glob("*.txt"))
+
+def merge_vectors(vectorstore, embeddings, texts, vectors, metadatas, ids):
+    """Add precomputed vectors to the store (creating it on first use)."""
+    text_embeddings = list(zip(texts, vectors))
+    if vectorstore is None:
+        return FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+    vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+    return vectorstore
+
+def ingest(files, vectorstore, manifest, embedding_pool=None, parse_workers=PARSE_WORKERS, embed_workers=EMBED_WORKERS):
+    """
+    Parse/chunk files in a process pool and embed them on a thread pool sharing one
+    rate limiter. Only chunks whose content hash isn't in the manifest yet are
+    embedded; a file is recorded (and the chunks it no longer contains dropped) once
+    all its chunks are in the index. The index and manifest are checkpointed every
+    CHECKPOINT_FILES files or CHECKPOINT_SECONDS; the caller saves the final state.
+
+    Returns (vectorstore, summary).
+    """
+    embedding_pool = embedding_pool or EmbeddingPool(EMBED_API_KEYS)
+    summary = {"total_files": len(files), "embedded_count": 0, "unchanged": 0, "skipped_files": [],
+               "chunks_embedded": 0, "chunks_reused": 0, "chunks_removed": 0}
+    pending_keys = set()  # chunks being embedded right now
+    waiting = {}          # file -> (sha256, signature, keys) until all its chunks are in the index
+    recorded_since_checkpoint = 0
+    last_checkpoint = time.time()
+    start_time = time.time()
+
+    def record_ready_files():
+        nonlocal recorded_since_checkpoint
+        for file_path, (sha256, signature, keys) in list(waiting.items()):
+            if all(key in manifest.chunks for key in keys):
+                del waiting[file_path]
+                orphaned = manifest.record_file(file_path, sha256, signature, keys)
+                summary["chunks_removed"] += delete_vectors(vectorstore, orphaned)
+                summary["embedded_count"] += 1
+                recorded_since_checkpoint += 1
+                print(f"✅ {os.path.basename(file_path)}: {len(keys)} chunks "
+                      f"({summary['embedded_count']}/{len(files)}, batch size {embedding_pool.batch_size})")
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as parsers, \
+            ThreadPoolExecutor(max_workers=embed_workers) as embedders:
+        in_flight = {parsers.submit(load_and_chunk, file_path): ("parse", file_path, None) for file_path in files}
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, file_path, new_chunks = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"❌ Failed to process {file_path}: {str(e)}")
+                    with open("processing_errors.log", "a") as f:
+                        f.write(f"{file_path}: {str(e)}\n")
+                    summary["skipped_files"].append(file_path)
+                    waiting.pop(file_path, None)
+                    if new_chunks:
+                        pending_keys.difference_update(new_chunks[0])
+                    continue
+
+                if stage == "parse":
+                    sha256, signature, texts, metadatas = result
+                    if manifest.unchanged(file_path, sha256):
+                        manifest.touch(file_path, signature)  # touched, same content
+                        summary["unchanged"] += 1
+                        continue
+                    keys, new_keys, new_texts, new_metadatas = [], [], [], []
+                    for text, metadata in zip(texts, metadatas):
+                        key = chunk_key(metadata["company"], text)
+                        if key in keys:
+                            continue
+                        keys.append(key)
+                        if key in manifest.chunks or key in pending_keys:
+                            summary["chunks_reused"] += 1
+                            continue
+                        new_keys.append(key)
+                        new_texts.append(text)
+                        new_metadatas.append(metadata)
+                    waiting[file_path] = (sha256, signature, keys)
+                    if new_keys:
+                        pending_keys.update(new_keys)
+                        in_flight[embedders.submit(embedding_pool.embed, new_texts)] = (
+                            "embed", file_path, (new_keys, new_texts, new_metadatas))
+                    continue
+
+                new_keys, new_texts, new_metadatas = new_chunks
+                vectorstore = merge_vectors(vectorstore, embedding_pool.embeddings, new_texts, result,
+                                            new_metadatas, new_keys)
+                for key in new_keys:
+                    manifest.add_chunk(key, key)
+                pending_keys.difference_update(new_keys)
+                summary["chunks_embedded"] += len(new_keys)
+
+            record_ready_files()
+            if vectorstore is not None and recorded_since_checkpoint and (
+                    recorded_since_checkpoint >= CHECKPOINT_FILES or time.time() - last_checkpoint > CHECKPOINT_SECONDS):
+                save_faiss_index(vectorstore, manifest)
+                recorded_since_checkpoint, last_checkpoint = 0, time.time()
+
+    # Files still waiting shared a chunk with a file whose embedding failed
+    summary["skipped_files"].extend(waiting)
+    print(f"⏱️ Ingested {summary['embedded_count']} files in {time.time() - start_time:.1f}s "
+          f"({embedding_pool.stats['requests']} requests, {embedding_pool.stats['rate_limited']} rate limited, "
+          f"{summary['chunks_embedded']} chunks embedded, {summary['chunks_reused']} reused)")
+    return vectorstore, summary
 
 # --------------------------- Main Workflow ---------------------------
 
-def vector_embedding(session):
-    """Core embedding logic with error handling and reporting"""
-    existing_vectors = load_faiss_index()
-    session["embeddings"] = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-    
-    if existing_vectors:
-        session["vectors"] = existing_vectors
-        print("🔄 Checking for new files...")
-        
-        try:
-            loader = DirectoryLoader(DATA_DIR, loader_cls=TextLoader)
-            current_files = {doc.metadata["source"] for doc in loader.load()}
-            new_files = [f for f in current_files if f not in load_embedded_files()]
-            
-            if new_files:
-                print(f"Found {len(new_files)} new files to process")
-                results = process_files_sequentially(session, new_files)
-                save_faiss_index(session["vectors"])
-                
-                # Reporting results
-                print("\n-------------------------------------")
-                print(f"Count of data: {results['total_files']}")
-                print(f"Total files embedded: {results['embedded_count']}")
-                print(f"Skipped files: {results['skipped_files']}")
-                print("-------------------------------------")
-                
-                # Prompt to retry embedding for skipped files
-                if results["skipped_files"]:
-                    retry = input("Do you want to try embedding the skipped files? (y/n): ").lower()
-                    if retry == "y":
-                        # Recursively call vector_embedding for the skipped files.
-                        process_files_sequentially(session, results["skipped_files"])
-                        save_faiss_index(session["vectors"])
-            else:
-                print("✅ All files already embedded")
-        except Exception as e:
-            print(f"❌ Error loading directory: {str(e)}")
+def vector_embedding(session, data_dir=DATA_DIR, retry_rounds=1, prune_deleted=False):
+    """
+    Core embedding logic with error handling and reporting. Brings the index in
+    line with data_dir: new and changed files (by content hash) are re-chunked and
+    only their new chunks embedded, deleted files' chunks are removed. Skipped files
+    are retried `retry_rounds` times.
+
+    A missing or empty data_dir is an error, never "every file was deleted". When
+    more than PRUNE_MAX_FILES indexed files are missing, their chunks are only
+    removed with prune_deleted (a mistyped path or a legacy index whose sources
+    live elsewhere would otherwise empty the index).
+    """
+    if not os.path.isdir(data_dir):
+        raise FileNotFoundError(f"Data directory {data_dir} does not exist")
+    files = list_data_files(data_dir)
+    if not files:
+        raise FileNotFoundError(f"No *.txt files in {data_dir}")
+
+    embedding_pool = EmbeddingPool(EMBED_API_KEYS)
+    session["embeddings"] = embedding_pool.embeddings
+    vectorstore = session["vectors"] = load_faiss_index()
+    print("🔄 Checking for changed files..." if vectorstore else "🆕 Creating new vector store...")
+
+    changed = False
+    manifest = IndexManifest.load() if vectorstore else None
+    if manifest is not None:
+        unreferenced = manifest.drop_unreferenced()
+        if unreferenced:
+            removed = delete_vectors(vectorstore, unreferenced)
+            print(f"🧹 Removed {removed} chunks no file references (left by an interrupted run)")
+            changed = True
     else:
-        print("🆕 Creating new vector store...")
-        try:
-            loader = DirectoryLoader(DATA_DIR, loader_cls=TextLoader)
-            docs = loader.load()
-            
-            # Preprocess all documents
-            processed_docs = []
-            for doc in docs:
-                doc.page_content = financial_preprocessor(doc.page_content)
-                processed_docs.append(doc)
-            
-            # Create optimal chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=512,
-                chunk_overlap=128,
-                separators=["\n\n", "\n", r"(?<=\. )", " "]
-            )
-            chunks = text_splitter.split_documents(processed_docs)
-            
-            # Create and save vector store
-            session["vectors"] = FAISS.from_documents(chunks, session["embeddings"])
-            save_faiss_index(session["vectors"])
-            save_embedded_files([doc.metadata["source"] for doc in chunks])
-            
-        except Exception as e:
-            print(f"❌ Initial embedding failed: {str(e)}")
-            raise
+        manifest = IndexManifest()
+        if vectorstore is not None:
+            # Index from before manifests: key its chunks by content, drop duplicate copies
+            manifest, duplicates = IndexManifest.from_vectorstore(vectorstore)
+            removed = delete_vectors(vectorstore, duplicates)
+            print(f"🧾 Built manifest for {len(manifest.files)} files ({removed} duplicate chunks removed)")
+            changed = True
+
+    removed = 0
+    deleted = manifest.deleted_files(files)
+    if len(deleted) > PRUNE_MAX_FILES and not prune_deleted:
+        print(f"⚠️ {len(deleted)} indexed files are not in {data_dir}; keeping their chunks "
+              f"(check the path, or pass --prune-deleted to remove them)")
+        deleted = []
+    for file_path in deleted:
+        removed += delete_vectors(vectorstore, manifest.remove_file(file_path))
+    if deleted:
+        print(f"🗑️ Removed {len(deleted)} deleted files ({removed} chunks)")
+        changed = True
+
+    stale = manifest.stale_files(files)
+    results = None
+    if stale:
+        print(f"Found {len(stale)} new or modified files to process")
+        vectorstore, results = ingest(stale, vectorstore, manifest, embedding_pool)
+        for round_number in range(retry_rounds):
+            if not results["skipped_files"]:
+                break
+            print(f"🔁 Retrying {len(results['skipped_files'])} skipped files (round {round_number + 1}/{retry_rounds})")
+            vectorstore, retry = ingest(results["skipped_files"], vectorstore, manifest, embedding_pool)
+            for name in ("embedded_count", "unchanged", "chunks_embedded", "chunks_reused", "chunks_removed"):
+                results[name] += retry[name]
+            results["skipped_files"] = retry["skipped_files"]
+        changed = True
+
+        # Reporting results
+        print("\n-------------------------------------")
+        print(f"Count of data: {results['total_files']}")
+        print(f"Total files embedded: {results['embedded_count']}")
+        print(f"Unchanged content: {results['unchanged']}")
+        print(f"Chunks embedded / reused / removed: {results['chunks_embedded']} / "
+              f"{results['chunks_reused']} / {results['chunks_removed']}")
+        print(f"Skipped files: {results['skipped_files']}")
+        print("-------------------------------------")
+
+    session["vectors"] = vectorstore
+    if changed and vectorstore is not None:
+        save_faiss_index(vectorstore, manifest)
+    elif not changed:
+        print("✅ Index is up to date")
+    return results
 
 # --------------------------- Q&A System ---------------------------
 def main():
@@ -298,4 +585,27 @@ Answer in clear financial terms:"""
             print(f"⚠️ Error processing query: {str(e)}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FinQA - Financial RAG System")
+    parser.add_argument("command", nargs="?", default="chat", choices=["chat", "ingest", "reindex"],
+                        help="chat: interactive Q&A (default); ingest: embed new files without prompts; "
+                             "reindex: rebuild the served index with --index-type, no embedding calls")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--retry-rounds", type=int, default=1, help="extra passes over skipped files")
+    parser.add_argument("--prune-deleted", action="store_true",
+                        help=f"remove chunks of missing files even when more than {PRUNE_MAX_FILES} are missing")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE)
+    args = parser.parse_args()
+    INDEX_TYPE = args.index_type
+    if args.command == "reindex":
+        vectorstore = load_faiss_index()
+        if vectorstore is None:
+            sys.exit("❌ No vector store to reindex")
+        save_faiss_index(vectorstore, IndexManifest.load(FAISS_STORE_PATH))
+        sys.exit(0)
+    if args.command == "ingest":
+        try:
+            results = vector_embedding({}, args.data_dir, args.retry_rounds, args.prune_deleted)
+        except FileNotFoundError as e:
+            sys.exit(f"❌ {e}")
+        sys.exit(1 if results and results["skipped_files"] else 0)
     main()
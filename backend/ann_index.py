@@ -0,0 +1,223 @@
+"""
+Approximate-nearest-neighbour FAISS indexes for the vector store.
+
+Ingestion keeps an exact flat index as the canonical copy: it supports the
+incremental adds/deletes of structured_emb_rag.py, lets vectors be reconstructed
+exactly (sharding, re-embedding) and is the ground truth for recall. With
+FAISS_INDEX_TYPE set to 'ivf_flat', 'hnsw' or 'ivf_pq', the canonical copy is saved
+as flat.faiss/flat.pkl and the index.faiss/index.pkl that servers load is an ANN
+index built from it (trained on a random sample of the vectors).
+
+Query-time knobs: FAISS_NPROBE (IVF lists searched) and FAISS_EF_SEARCH (HNSW
+candidate list), applied by tune() whenever an index is loaded.
+
+    python ann_index.py bench --store Rag    # recall@k / p50 / p99 / memory vs flat
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+from dotenv import load_dotenv
+from langchain_community.vectorstores import FAISS
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+FLAT_INDEX_NAME = "flat"  # canonical exact copy saved next to an ANN index
+IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))            # inverted lists; 0 = about 4*sqrt(n)
+PQ_M = int(os.getenv("FAISS_PQ_M", "0"))                      # PQ sub-quantizers; 0 = one per 8 dimensions
+PQ_BITS = int(os.getenv("FAISS_PQ_BITS", "8"))
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))                 # graph neighbours per node
+HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "200"))
+TRAIN_SAMPLE = int(os.getenv("FAISS_TRAIN_SAMPLE", "50000"))  # vectors used to train IVF/PQ
+NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+
+# --------------------------- Building ---------------------------
+
+def default_nlist(n):
+    """About 4*sqrt(n) lists, with at least 39 training points per list."""
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+def default_pq_m(dim):
+    """Largest divisor of dim that leaves at least 8 dimensions per sub-quantizer."""
+    return max(m for m in range(1, max(1, dim // 8) + 1) if dim % m == 0)
+
+def build_index(vectors, index_type=FAISS_INDEX_TYPE, metric=faiss.METRIC_L2, seed=0):
+    """
+    FAISS index of `index_type` holding `vectors` (float32, shape (n, d)), in row order.
+    Falls back to an exact flat index when there are too few vectors to train on.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r} (expected one of {', '.join(INDEX_TYPES)})")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    min_vectors = {"flat": 0, "hnsw": 0, "ivf_flat": 39, "ivf_pq": 2 ** PQ_BITS}[index_type]
+    if n < min_vectors:
+        print(f"⚠️ {n} vectors are too few to train {index_type}; using a flat index")
+        index_type = "flat"
+
+    if index_type == "flat":
+        index = faiss.IndexFlat(dim, metric)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, metric)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    else:
+        nlist = min(IVF_NLIST, n) if IVF_NLIST else default_nlist(n)
+        quantizer = faiss.IndexFlat(dim, metric)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, PQ_M or default_pq_m(dim), PQ_BITS, metric)
+        sample = vectors
+        if n > TRAIN_SAMPLE:
+            sample = vectors[np.random.default_rng(seed).choice(n, TRAIN_SAMPLE, replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    tune(index)
+    return index
+
+def tune(index, nprobe=NPROBE, ef_search=EF_SEARCH):
+    """Apply query-time search parameters to an index (no-op for flat)."""
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    except RuntimeError:
+        pass
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+    return index
+
+def index_type_of(index):
+    if hasattr(index, "hnsw"):
+        return "hnsw"
+    try:
+        return "ivf_pq" if isinstance(faiss.downcast_index(faiss.extract_index_ivf(index)), faiss.IndexIVFPQ) else "ivf_flat"
+    except RuntimeError:
+        return "flat"
+
+def index_bytes(index):
+    """Serialized size of an index, close to what it occupies in memory once loaded."""
+    return int(faiss.serialize_index(index).nbytes)
+
+# --------------------------- LangChain Stores ---------------------------
+
+def with_index(store, index):
+    """The same documents and ids as `store`, searched through another FAISS index."""
+    return FAISS(store.embedding_function, index, store.docstore, store.index_to_docstore_id,
+                 normalize_L2=store._normalize_L2, distance_strategy=store.distance_strategy)
+
+def save_store(store, folder, index_type=FAISS_INDEX_TYPE, keep_flat=True):
+    """
+    Save a store whose index is flat. For an ANN `index_type`, index.* becomes an ANN
+    index built from its vectors and, with keep_flat, the exact copy is kept as flat.*.
+    """
+    if index_type == "flat":
+        store.save_local(folder)
+        return
+    if keep_flat:
+        store.save_local(folder, index_name=FLAT_INDEX_NAME)
+    vectors = store.index.reconstruct_n(0, store.index.ntotal)
+    with_index(store, build_index(vectors, index_type, metric=store.index.metric_type)).save_local(folder)
+
+def load_store(folder, embeddings, exact=True):
+    """Load a saved store: the exact flat copy when there is one (exact=True), else index.*."""
+    index_name = FLAT_INDEX_NAME if exact and os.path.exists(os.path.join(folder, f"{FLAT_INDEX_NAME}.faiss")) else "index"
+    store = FAISS.load_local(folder, embeddings, index_name=index_name, allow_dangerous_deserialization=True)
+    tune(store.index)
+    return store
+
+# --------------------------- Benchmark ---------------------------
+
+def measure(index, queries, truth, k):
+    """recall@k against `truth` and per-query latency percentiles (single-query searches, like serving)."""
+    timings, found = [], 0
+    for query, expected in zip(queries, truth):
+        start_time = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        timings.append((time.perf_counter() - start_time) * 1000)
+        found += len(set(ids[0]) & set(expected))
+    timings.sort()
+    return {
+        f"recall@{k}": round(found / (len(queries) * k), 4),
+        "p50_ms": round(timings[len(timings) // 2], 3),
+        "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+    }
+
+def benchmark(folder, index_types, k=4, queries=200, nprobes=(4, 16, 64), ef_searches=(32, 64, 128),
+              questions=None, seed=0):
+    """
+    Build each index type from the store's exact vectors and compare it with the flat
+    index. Queries are the embedded `questions` if given (a list of strings), otherwise
+    stored vectors sampled at random with a little noise added.
+    """
+    from embeddings import get_embeddings
+    store = load_store(folder, get_embeddings())
+    flat = store.index
+    if index_type_of(flat) != "flat":
+        raise ValueError(f"{folder} has no exact flat index to compare against")
+    vectors = flat.reconstruct_n(0, flat.ntotal)
+    rng = np.random.default_rng(seed)
+    if questions:
+        query_vectors = np.array(get_embeddings().embed_documents(questions), dtype=np.float32)
+    else:
+        sample = vectors[rng.choice(len(vectors), min(queries, len(vectors)), replace=False)]
+        noise = rng.normal(scale=0.1 * float(np.std(vectors)), size=sample.shape)
+        query_vectors = (sample + noise).astype(np.float32)
+    _, truth = flat.search(query_vectors, k)
+
+    results = [dict(type="flat", params="", build_s=0.0, bytes=index_bytes(flat), **measure(flat, query_vectors, truth, k))]
+    for index_type in index_types:
+        start_time = time.perf_counter()
+        index = build_index(vectors, index_type, metric=flat.metric_type, seed=seed)
+        build_seconds = round(time.perf_counter() - start_time, 2)
+        size = index_bytes(index)
+        if index_type == "hnsw":
+            settings = [(f"efSearch={ef}", dict(ef_search=ef)) for ef in ef_searches]
+        elif index_type_of(index) == "flat":
+            settings = [("(fell back to flat)", {})]
+        else:
+            settings = [(f"nprobe={nprobe}", dict(nprobe=nprobe)) for nprobe in nprobes]
+        for label, params in settings:
+            tune(index, **params)
+            results.append(dict(type=index_type, params=label, build_s=build_seconds, bytes=size,
+                                **measure(index, query_vectors, truth, k)))
+    return results
+
+def print_results(results, k):
+    print(f"{'index':<9} {'params':<20} {'recall@' + str(k):>9} {'p50 ms':>8} {'p99 ms':>8} {'MB':>8} {'build s':>8}")
+    for row in results:
+        print(f"{row['type']:<9} {row['params']:<20} {row[f'recall@{k}']:>9.4f} {row['p50_ms']:>8.3f} "
+              f"{row['p99_ms']:>8.3f} {row['bytes'] / 1e6:>8.2f} {row['build_s']:>8.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ANN index recall/latency benchmark")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--store", default=os.getenv("FAISS_STORE_PATH", "Rag"))
+    parser.add_argument("--types", default="ivf_flat,hnsw,ivf_pq", help="comma-separated index types")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200, help="sampled queries when --questions is not given")
+    parser.add_argument("--questions", help="file with one real question per line (embedded once)")
+    parser.add_argument("--nprobe", default="4,16,64")
+    parser.add_argument("--ef-search", default="32,64,128")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    questions = None
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    results = benchmark(
+        args.store, [t.strip() for t in args.types.split(",") if t.strip()], k=args.k, queries=args.queries,
+        nprobes=[int(v) for v in args.nprobe.split(",")], ef_searches=[int(v) for v in args.ef_search.split(",")],
+        questions=questions,
+    )
+    print_results(results, args.k)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
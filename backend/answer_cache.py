@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from classifier import preprocess
+
+# Configuration
+CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") == "1"
+CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))               # seconds an answer stays valid
+CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))  # in-process LRU size
+CACHE_PERSIST = os.getenv("ANSWER_CACHE_PERSIST", "0") == "1"           # enable the SQLite tier
+CACHE_DB_PATH = os.getenv("ANSWER_CACHE_PATH", "answer_cache.db")
+CACHE_DB_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_DB_MAX_ENTRIES", "50000"))
+
+def normalize_question(question):
+    """Lemmatized, punctuation-free form of a question (same preprocessing as the classifier)."""
+    return " ".join(preprocess(question).split())
+
+def cache_key(question, company):
+    normalized = f"{(company or '').strip().lower()}\x00{normalize_question(question)}"
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+# --------------------------- Persistent Tier ---------------------------
+
+class SqliteAnswerStore:
+    """Disk tier shared by all workers on a host; survives restarts."""
+
+    def __init__(self, path=CACHE_DB_PATH, max_entries=CACHE_DB_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self._writes = 0
+
+    @property
+    def _conn(self):
+        """Connection opened lazily per process (SQLite handles must not cross a fork)."""
+        if self._connection is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " key TEXT PRIMARY KEY, kind TEXT, version TEXT, payload TEXT,"
+                " created REAL, accessed REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_answers_accessed ON answers (accessed)")
+            conn.commit()
+            self._connection, self._pid = conn, os.getpid()
+        return self._connection
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT kind, version, payload, created FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE answers SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        kind, version, payload, created = row
+        return {"kind": kind, "version": version, "payload": json.loads(payload), "created": created}
+
+    def put(self, key, entry):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, kind, version, payload, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, entry["kind"], entry["version"], json.dumps(entry["payload"]), entry["created"], time.time()),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict()
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop expired rows and the least recently used ones beyond max_entries."""
+        self._conn.execute("DELETE FROM answers WHERE created < ?", (time.time() - CACHE_TTL,))
+        self._conn.execute(
+            "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+
+# --------------------------- Answer Cache ---------------------------
+
+class AnswerCache:
+    """
+    Two-tier cache of successful /query_chatbot answers.
+
+    Entries are keyed on the normalized question plus the selected company and
+    remember which kind of answer they are ('numerical' or 'contextual') and the
+    version of the data they came from. `version_providers` maps each kind to a
+    function returning the current version (schema catalog hash, FAISS checksum);
+    an entry whose version no longer matches is treated as a miss and dropped.
+    """
+
+    def __init__(self, version_providers, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, store=None):
+        self.version_providers = version_providers
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "invalidated": 0, "evictions": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _valid(self, entry):
+        if time.time() - entry["created"] > self.ttl:
+            self._count("expired")
+            return False
+        provider = self.version_providers.get(entry["kind"])
+        if provider is not None and provider() != entry["version"]:
+            self._count("invalidated")
+            return False
+        return True
+
+    def get(self, question, company):
+        """Cached payload for this question/company, or None."""
+        key = cache_key(question, company)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            if self._valid(entry):
+                self._count("hits")
+                return entry["payload"]
+            with self._lock:
+                self._entries.pop(key, None)
+
+        if self.store is not None:
+            try:
+                entry = self.store.get(key)
+            except sqlite3.Error as e:
+                logging.warning("⚠️ Answer cache disk tier unavailable: %s", e)
+                entry = None
+            if entry is not None:
+                if self._valid(entry):
+                    self._remember(key, entry)
+                    self._count("disk_hits")
+                    return entry["payload"]
+                self.store.delete(key)
+
+        self._count("misses")
+        return None
+
+    def put(self, question, company, kind, payload):
+        """Store a successful answer together with the current data version."""
+        provider = self.version_providers.get(kind)
+        entry = {
+            "kind": kind,
+            "version": provider() if provider is not None else None,
+            "payload": payload,
+            "created": time.time(),
+        }
+        key = cache_key(question, company)
+        self._remember(key, entry)
+        if self.store is not None:
+            try:
+                self.store.put(key, entry)
+            except sqlite3.Error as e:
+                logging.warning("⚠️ Could not persist cached answer: %s", e)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def report(self):
+        """Hit/miss counters and hit ratio."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        stats["persistent"] = self.store is not None
+        return stats
@@ -1,76 +1,160 @@
-from flask import Flask, request, jsonify
+from startup import timed, mark, startup_report, log_startup_report  # first, so import time is measured
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event as sa_event
 from flask_cors import CORS
 import uuid
 import logging
 import os
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from real_chatbot import query_llm, extract_sql_and_notes, execute_sql  # Import your chatbot functions
-from real_chatbot_rag import load_faiss_index, query_llm_groq
-from classifier import classify_question  # Import the classification logic
+from real_chatbot_rag import query_llm_groq_cached, query_llm_groq_stream, retrieve_for_question, semantic_cache, query_embedding_cache
+from vector_store import get_vector_store, company_shards, scoped_query, vector_store_version
+from classifier import classify_question, classify_with_confidence, load_models  # Import the classification logic
+from db_pool import get_db_config, pool_stats
+from groq_clients import groq_clients
+from rate_limiter import get_rate_limiter
+from schema_catalog import get_schema_catalog, company_mapping
+from schema_pruner import prune_schema
+from sql_templates import generate_sql
+from chat_schema import migrate_chat_db
+from chat_writer import ChatWriter, SessionOwnerCache, apply_sqlite_pragmas
+from chat_cleanup import EmptySessionSweeper, delete_session
+from storage import configure_app, pool_status, CHAT_DATABASE_URL
+from answer_cache import AnswerCache, SqliteAnswerStore, CACHE_ENABLED, CACHE_PERSIST
+from sse import SSE_HEADERS, wants_stream, sse_event, format_sources
 from dotenv import load_dotenv
-import oracledb
 
-import nltk
-nltk.download('wordnet')
-nltk.download('punkt')
+mark("imports")
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Before"])
 
-# ✅ SQLite DB Setup
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///chats.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# ✅ Chat DB Setup (SQLite by default; CHAT_DATABASE_URL=postgresql://... for several instances)
+configure_app(app, CHAT_DATABASE_URL)
 db = SQLAlchemy(app)
 
 # Retrieve database configuration
-db_config = {
-        "user": os.getenv("DB_USER"),
-        "password": os.getenv("DB_PASSWORD"),
-        "dsn": os.getenv("DB_DSN"),
-        "wallet_location": os.getenv("DB_WALLET_LOCATION"),
-    }
+db_config = get_db_config()
+
+# Speculative /query_chatbot execution (see answer_speculatively)
+SPECULATIVE_ENABLED = os.getenv("SPECULATIVE_EXECUTION", "1") == "1"
+SPECULATIVE_BORDERLINE = float(os.getenv("SPECULATIVE_BORDERLINE", "0.65"))  # below this, answer both ways
+speculation_pool = ThreadPoolExecutor(max_workers=int(os.getenv("SPECULATIVE_WORKERS", "8")),
+                                      thread_name_prefix="speculative")  # LLM-free plan/prefetch work only
+# Borderline questions answer contextually on a separate, bounded pool so LLM calls never
+# hold up other requests' plan/prefetch; when it is full, only the classifier's pick is answered
+SPECULATIVE_ANSWER_WORKERS = int(os.getenv("SPECULATIVE_ANSWER_WORKERS", "4"))
+speculative_answer_pool = ThreadPoolExecutor(max_workers=SPECULATIVE_ANSWER_WORKERS,
+                                             thread_name_prefix="speculative-answer")
+speculative_answer_slots = threading.BoundedSemaphore(SPECULATIVE_ANSWER_WORKERS)
+
+# Chat history pagination (?before=<cursor>&limit=<n>)
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "100"))
+CHAT_PAGE_MAX = int(os.getenv("CHAT_PAGE_MAX", "500"))
 
 # ✅ Chat Model
 class ChatSession(db.Model):
+    __table_args__ = (db.Index("ix_chat_session_user_created", "user_id", "created_at"),)
     id = db.Column(db.String(50), primary_key=True)
     title = db.Column(db.String(100))
     user_id = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Chat(db.Model):
+    __table_args__ = (db.Index("ix_chat_session_id_id", "session_id", "id"),)
     id = db.Column(db.Integer, primary_key=True)
     sender = db.Column(db.String(10))  # 'user' or 'bot'
     message = db.Column(db.Text)
     session_id = db.Column(db.String(50), db.ForeignKey('chat_session.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-# ✅ Initialize the DB
-with app.app_context():
+# ✅ Initialize the DB (and upgrade databases created before the columns/indexes existed)
+with timed("chat_db"), app.app_context():
+    if db.engine.dialect.name == "sqlite":
+        sa_event.listen(db.engine, "connect", apply_sqlite_pragmas)  # WAL + synchronous level, see chat_writer.py
     db.create_all()
-
-# ✅ Route to Save Chat Message
-@app.route('/save_chat', methods=['POST'])
-def save_chat():
-    data = request.get_json()
-    session_id = data['session_id']
-    user_id = data['user_id']
-    sender = data['sender']
-    message = data['message']
-
+    for step in migrate_chat_db(db.engine):
+        logging.info("🛠️ Chat DB migrated: %s", step)
+    # Group commit / write-behind for /save_chat(s); durability per CHAT_WRITE_MODE
+    chat_writer = ChatWriter(db.engine, Chat.__table__)
+    # Chunked NOT EXISTS deletes of empty sessions, also swept every CHAT_CLEANUP_INTERVAL seconds
+    session_sweeper = EmptySessionSweeper(db.engine, Chat.__table__, ChatSession.__table__,
+                                          on_deleted=lambda ids: session_owners.forget(*ids))
+
+session_owners = SessionOwnerCache()
+
+@app.before_request
+def start_session_sweeper():
+    # Started lazily so it runs in the gunicorn workers, not in the preloading master
+    session_sweeper.start()
+
+# ✅ Parse the Oracle DDLs once at startup
+with timed("schema_catalog"):
+    schema_catalog = get_schema_catalog()
+
+# ✅ Answer cache: invalidated when the DDLs or the FAISS index change
+answer_cache = AnswerCache(
+    version_providers={
+        "numerical": lambda: schema_catalog.version,
+        "contextual": vector_store_version,
+    },
+    store=SqliteAnswerStore() if CACHE_PERSIST else None,
+)
+
+def warm_up():
+    """
+    Load the classifier, NLTK data and FAISS index now instead of on the first request.
+    Under gunicorn with preload_app this runs in the master, so forked workers share
+    the loaded pages copy-on-write (see gunicorn.conf.py).
+    """
+    with timed("classifier"):
+        load_models()
+    with timed("vector_store"):
+        # Per-company shards when they exist, the combined index otherwise
+        shards = company_shards.names()
+        for shard in shards:
+            company_shards.get(shard)
+        if not shards:
+            get_vector_store()
+    log_startup_report()
+
+def session_belongs_to(session_id, user_id):
+    return db.session.query(ChatSession.id).filter_by(id=session_id, user_id=user_id).first() is not None
+
+def chat_row(session_id, sender, message):
     # Convert list or nested list responses to a string
     if isinstance(message, list):
         message = str(message[0][0]) if message and isinstance(message[0], list) else str(message)
+    return {"session_id": session_id, "sender": sender, "message": message, "created_at": datetime.utcnow()}
 
-    chat_session = ChatSession.query.filter_by(id=session_id, user_id=user_id).first()
-    if not chat_session:
+def save_messages(session_id, user_id, messages):
+    """Ownership check (cached) and one write for all messages; returns the response."""
+    if not session_owners.owns(session_id, user_id, session_belongs_to):
         return jsonify({"status": "Error", "message": "Invalid session or unauthorized"}), 403
+    rows = [chat_row(session_id, m['sender'], m['message']) for m in messages]
+    if not rows:
+        return jsonify({"status": "Error", "message": "No messages"}), 400
+    if chat_writer.write(rows):
+        return jsonify({"status": "Message saved!", "saved": len(rows)}), 201
+    return jsonify({"status": "Message queued", "queued": len(rows)}), 202
 
-    chat_message = Chat(sender=sender, message=message, session_id=session_id)
-    db.session.add(chat_message)
-    db.session.commit()
+# ✅ Route to Save Chat Message
+@app.route('/save_chat', methods=['POST'])
+def save_chat():
+    data = request.get_json()
+    return save_messages(data['session_id'], data['user_id'], [data])
 
-    return jsonify({"status": "Message saved!"}), 201
+# ✅ Route to Save Several Chat Messages at once (e.g. a question and its answer)
+@app.route('/save_chats', methods=['POST'])
+def save_chats():
+    data = request.get_json()
+    return save_messages(data['session_id'], data['user_id'], data.get('messages') or [])
 
 
 # ✅ Route to Create New Chat Session
@@ -86,54 +170,96 @@ def new_session():
 
     return jsonify({"session_id": new_session_id, "title": new_chat_session.title}), 201
 
+# ---- Chat history pagination ----
+# Lists come one page at a time: ?limit= (default CHAT_PAGE_SIZE, at most CHAT_PAGE_MAX)
+# and ?before=<cursor> for the page after that. The cursor for the next page is sent
+# in the X-Next-Before header (and as "next_before" in /get_chat); none means last page.
+
+def page_limit():
+    return min(max(int(request.args.get("limit", CHAT_PAGE_SIZE)), 1), CHAT_PAGE_MAX)
+
+def message_page(session_id, before, limit):
+    """The `limit` newest messages older than message id `before`, oldest first, and the next cursor."""
+    query = Chat.query.filter_by(session_id=session_id)
+    if before:
+        query = query.filter(Chat.id < int(before))
+    chats = query.order_by(Chat.id.desc()).limit(limit + 1).all()
+    next_before = chats[limit - 1].id if len(chats) > limit else None
+    return chats[:limit][::-1], next_before
+
+def session_page(user_id, before, limit):
+    """A user's sessions, newest first, starting after session id `before`, and the next cursor."""
+    query = ChatSession.query.filter_by(user_id=user_id)
+    if before:
+        cursor = ChatSession.query.filter_by(id=before, user_id=user_id).first()
+        if cursor is None:
+            raise ValueError("Unknown session cursor")
+        query = query.filter(db.or_(
+            ChatSession.created_at < cursor.created_at,
+            db.and_(ChatSession.created_at == cursor.created_at, ChatSession.id < cursor.id),
+        ))
+    sessions = query.order_by(ChatSession.created_at.desc(), ChatSession.id.desc()).limit(limit + 1).all()
+    next_before = sessions[limit - 1].id if len(sessions) > limit else None
+    return sessions[:limit], next_before
+
+def message_json(chat):
+    return {'id': chat.id, 'sender': chat.sender, 'message': chat.message,
+            'created_at': chat.created_at.isoformat() if chat.created_at else None}
+
+def paged_response(items, next_before):
+    response = jsonify(items)
+    if next_before is not None:
+        response.headers["X-Next-Before"] = str(next_before)
+    return response
+
 # ✅ Route to Get Chat Sessions for a Specific User
 @app.route('/get_sessions/<user_id>', methods=['GET'])
 def get_sessions(user_id):
-    sessions = ChatSession.query.filter_by(user_id=user_id).all()
+    try:
+        sessions, next_before = session_page(user_id, request.args.get("before"), page_limit())
+    except ValueError as e:
+        return jsonify({"status": "Error", "message": str(e)}), 400
     session_data = [{"id": session.id, "title": session.title} for session in sessions]
-    return jsonify(session_data)
+    return paged_response(session_data, next_before)
 
 # ✅ Route to Get Chat Messages for a Session
 @app.route('/get_chats/<session_id>', methods=['GET'])
 def get_chats(session_id):
-    chats = Chat.query.filter_by(session_id=session_id).all()
-    chat_history = [{'sender': chat.sender, 'message': chat.message} for chat in chats]
-    return jsonify(chat_history)
+    try:
+        chats, next_before = message_page(session_id, request.args.get("before"), page_limit())
+    except ValueError as e:
+        return jsonify({"status": "Error", "message": str(e)}), 400
+    return paged_response([message_json(chat) for chat in chats], next_before)
 
 # ✅ Route to Get All Chat Sessions
 @app.route('/get_all_sessions/<user_id>', methods=['GET'])
 def get_all_sessions(user_id):
-    sessions = ChatSession.query.filter_by(user_id=user_id).all()
+    try:
+        sessions, next_before = session_page(user_id, request.args.get("before"), page_limit())
+    except ValueError as e:
+        return jsonify({"status": "Error", "message": str(e)}), 400
     session_list = [{'session_id': session.id, 'title': session.title} for session in sessions]
-    return jsonify(session_list)
+    return paged_response(session_list, next_before)
 
 # ✅ Route to Delete a Chat Session
 @app.route('/delete_chat/<session_id>', methods=['DELETE'])
 def delete_chat(session_id):
     try:
-        Chat.query.filter_by(session_id=session_id).delete()
-        ChatSession.query.filter_by(id=session_id).delete()
-        db.session.commit()
+        delete_session(db.engine, Chat.__table__, ChatSession.__table__, session_id)
+        session_owners.forget(session_id)
         return jsonify({"status": "Chat deleted successfully!"}), 200
     except Exception as e:
-        db.session.rollback()
         return jsonify({"status": "Error deleting chat", "error": str(e)}), 500
 
-# ✅ Route to Cleanup Empty Sessions
+# ✅ Route to Cleanup Empty Sessions (?min_age=<seconds> keeps recently created ones)
 @app.route('/cleanup_empty_sessions', methods=['DELETE'])
 def cleanup_empty_sessions():
     try:
-        active_sessions = db.session.query(Chat.session_id).distinct().all()
-        active_session_ids = [session[0] for session in active_sessions]
-        empty_sessions = ChatSession.query.filter(~ChatSession.id.in_(active_session_ids)).all()
-
-        for session in empty_sessions:
-            db.session.delete(session)
-
-        db.session.commit()
-        return jsonify({"status": "Empty chat sessions cleaned up!"}), 200
+        deleted = session_sweeper.run(min_age=float(request.args.get("min_age", 0)))
+        if deleted is None:
+            return jsonify({"status": "Cleanup already running", "progress": session_sweeper.report()["progress"]}), 409
+        return jsonify({"status": "Empty chat sessions cleaned up!", "deleted": deleted}), 200
     except Exception as e:
-        db.session.rollback()
         return jsonify({"status": "Error during cleanup", "error": str(e)}), 500
 
 # ✅ Route to Get a Specific Chat Session
@@ -142,11 +268,14 @@ def get_chat(session_id):
     try:
         chat_session = ChatSession.query.filter_by(id=session_id).first()
         if chat_session:
-            messages = Chat.query.filter_by(session_id=session_id).all()
-            message_list = [{'sender': msg.sender, 'message': msg.message} for msg in messages]
-            return jsonify({"messages": message_list}), 200
+            messages, next_before = message_page(session_id, request.args.get("before"), page_limit())
+            message_list = [message_json(msg) for msg in messages]
+            response = paged_response({"messages": message_list, "next_before": next_before}, next_before)
+            return response, 200
         else:
             return jsonify({"status": "Error", "message": "Session not found"}), 404
+    except ValueError as e:
+        return jsonify({"status": "Error", "message": str(e)}), 400
     except Exception as e:
         return jsonify({"status": "Error", "message": str(e)}), 500
 
@@ -171,19 +300,35 @@ def query_chatbot():
         if not user_question or not session_id or not user_id or not selected_company:
             return jsonify({"error": "Invalid request data - Missing required fields"}), 400
 
-        print("🔍 Classifying question...")
-        classification = classify_question(user_question)
-        print(f"✅ Classification result: {classification}")
+        # 📡 Server-sent events: progress, sources and tokens as soon as they exist
+        if wants_stream(data, request.headers.get("Accept")):
+            return Response(stream_with_context(stream_chatbot_answer(user_question, selected_company)),
+                            mimetype="text/event-stream", headers=SSE_HEADERS)
 
-        if classification == 'numerical':
-            print("🔍 Handling numerical query...")
-            response = handle_numerical_query(user_question, session_id, user_id, selected_company)
+        cached = answer_cache.get(user_question, selected_company) if CACHE_ENABLED else None
+        if cached is not None:
+            print("⚡ Answer cache hit")
+            return jsonify(cached), 200
+
+        if SPECULATIVE_ENABLED:
+            classification, (payload, status) = answer_speculatively(user_question, selected_company)
         else:
-            print("🔍 Handling contextual query...")
-            response = handle_contextual_query(user_question, selected_company)
+            print("🔍 Classifying question...")
+            classification = classify_question(user_question)
+            print(f"✅ Classification result: {classification}")
 
-        print("✅ Response generated:", response)
-        return response
+            if classification == 'numerical':
+                print("🔍 Handling numerical query...")
+                payload, status = numerical_answer(user_question, selected_company)
+            else:
+                print("🔍 Handling contextual query...")
+                payload, status = contextual_answer(user_question, selected_company)
+
+        if CACHE_ENABLED and status == 200:
+            answer_cache.put(user_question, selected_company, classification, payload)
+
+        print("✅ Response generated:", payload)
+        return jsonify(payload), status
 
     except Exception as e:
         print("❌ Error in /query_chatbot:", str(e))  # 🔥 Log the exact error
@@ -195,114 +340,251 @@ def home():
     return jsonify({"status": "success", "message": "Chatbot service is running."})
 
 def get_ddl_prefix_from_db(company_name):
-    """Fetch DDL prefix from the Oracle database mapping table."""
-    connection = oracledb.connect(
-            user=db_config["user"],
-            password=db_config["password"],
-            dsn=db_config["dsn"],
-            config_dir=db_config["wallet_location"],
-            wallet_location=db_config["wallet_location"],
-            wallet_password=db_config["password"]
-            )
-    cursor = connection.cursor()
-
-    query = "SELECT DDL_PREFIX FROM COMPANY_MAPPING WHERE LOWER(COMPANY_NAME) = LOWER(:company_name)"
-    cursor.execute(query, {"company_name": company_name})
-    
-    result = cursor.fetchone()
-    cursor.close()
-    connection.close()
-
-    return result[0] if result else None
+    """Fetch DDL prefix from the (TTL-cached) Oracle database mapping table."""
+    return company_mapping.get_prefix(company_name, db_config)
 
 def get_company_names_from_db():
-    """Fetch distinct company names from the COMPANY_MAPPING table."""
-    connection = oracledb.connect(
-        user=db_config["user"],
-        password=db_config["password"],
-        dsn=db_config["dsn"],
-        config_dir=db_config["wallet_location"],
-        wallet_location=db_config["wallet_location"],
-        wallet_password=db_config["password"]
-    )
-    cursor = connection.cursor()
-    query = "SELECT DISTINCT UPPER(COMPANY_NAME) FROM COMPANY_MAPPING"
-    cursor.execute(query)
-    
-    companies = [row[0] for row in cursor.fetchall()]
-    cursor.close()
-    connection.close()
-    
-    return companies
+    """Fetch distinct company names from the (TTL-cached) COMPANY_MAPPING table."""
+    return company_mapping.company_names(db_config)
+
+@app.route('/health/db', methods=['GET'])
+def db_health():
+    """Oracle session pool statistics"""
+    return jsonify(pool_stats())
+
+@app.route('/health/chat_writes', methods=['GET'])
+def chat_writes_health():
+    """Chat write batching, session ownership cache and chat DB pool statistics"""
+    return jsonify({"writer": chat_writer.report(), "session_owners": session_owners.stats, "db": pool_status(db.engine)})
+
+@app.route('/health/chat_cleanup', methods=['GET'])
+def chat_cleanup_health():
+    """Empty session sweeper progress and totals"""
+    return jsonify(session_sweeper.report())
+
+@app.route('/health/cache', methods=['GET'])
+def cache_health():
+    """Answer cache hit/miss statistics"""
+    return jsonify({
+        "answers": answer_cache.report(),
+        "semantic": semantic_cache.report(),
+        "query_embeddings": query_embedding_cache.report() if query_embedding_cache is not None else None,
+    })
+
+@app.route('/health/llm', methods=['GET'])
+def llm_health():
+    """Groq latency histograms and rate-limit state per API key"""
+    return jsonify({"clients": groq_clients.stats(), "rate_limits": get_rate_limiter().stats()})
+
+@app.route('/health/startup', methods=['GET'])
+def startup_health():
+    """Startup timings for this worker"""
+    return jsonify(startup_report())
 
 @app.route('/api/companies', methods=['GET'])
 def fetch_companies():
     """API Endpoint to get company names"""
     return jsonify(get_company_names_from_db())
 
-def handle_numerical_query(user_question, session_id, user_id, selected_company):
+def numerical_answer(user_question, selected_company, plan=None):
+    """(payload, status) for a numerical question."""
+    for event, data in numerical_query_steps(user_question, selected_company, plan):
+        if event == "result":
+            payload, status = data
+    return payload, status
+
+def plan_numerical_query(user_question, selected_company):
+    """
+    The LLM-free part of a numerical query: company lookup, then template SQL or the
+    pruned DDL for the prompt. Returns (error, template_match, ddl_content) where
+    error is a (payload, status) pair or None.
+    """
     # ✅ Validate if a company is selected
     if not selected_company:
-        return jsonify({"error": "No company selected for numerical query"}), 400
-    ddl_directory = "Oracle_DDLs"
-    model_name = "llama-3.3-70b-versatile"
-
-    # Retrieve API keys as a list
-    api_keys = os.getenv("API_KEYS").split(",")
+        return ({"error": "No company selected for numerical query"}, 400), None, None
 
     # ddl_prefix = detect_company(selected_company)
     ddl_prefix = get_ddl_prefix_from_db(selected_company)
 
-    if ddl_prefix:
-        ddl_file_path = os.path.join(ddl_directory, f"{ddl_prefix}_ddl.sql")
+    if not ddl_prefix:
+        return ({"error": "Company not recognized"}, 404), None, None
+
+    company_schema = schema_catalog.get(ddl_prefix)
+    if company_schema is None:
+        return ({"error": "DDL not found for the specified company"}, 404), None, None
+
+    # ⚡ Simple lookups (value, sum, change, ratio, min/max...) don't need the LLM
+    template_match = generate_sql(user_question, company_schema, [selected_company])
+    if template_match:
+        return None, template_match, None
+    # Only send the tables/metric rows the question needs (full DDL when unsure)
+    return None, None, prune_schema(user_question, company_schema).ddl
+
+def numerical_query_steps(user_question, selected_company, plan=None):
+    """
+    Text-to-SQL pipeline as a sequence of (event, data) steps: "progress" events
+    after the SQL is generated and executed, then ("result", (payload, status)).
+    `plan` is a plan_numerical_query() result computed ahead of time, if any.
+    """
+    error, template_match, ddl_content = plan or plan_numerical_query(user_question, selected_company)
+    if error:
+        yield "result", error
+        return
+    model_name = "llama-3.3-70b-versatile"
+
+    if template_match:
+        print(f"⚡ Fast path ({template_match.template})")
+        sql_query = template_match.sql
     else:
-        return jsonify({"error": "Company not recognized"}), 404
+        # The rate limiter picks the least-loaded key from API_KEYS
+        llm_output, llm_time = query_llm(user_question, ddl_content, model_name)
+
+        if not llm_output:
+            yield "result", ({"error": "Failed to generate a response from LLM."}, 500)
+            return
+
+        sql_query, notes = extract_sql_and_notes(llm_output)
+    if not sql_query:
+        yield "result", ({"error": "Failed to extract SQL query from LLM response."}, 500)
+        return
+
+    print(f"Generated SQL Query: {sql_query}")
+    yield "progress", {"stage": "sql_generated", "fast_path": template_match is not None}
+    results, columns, exec_time, error_msg = execute_sql(sql_query, db_config)
+    yield "progress", {"stage": "executed", "seconds": exec_time}
+    if results:
+        formatted_results = str(results[0][0]) if results else "No data found"
+        yield "result", ({"response": formatted_results}, 200)
+    else:
+        yield "result", ({"error": error_msg}, 500)
 
-    if not os.path.exists(ddl_file_path):
-        return jsonify({"error": "DDL not found for the specified company"}), 404
+# ✅ Handle Contextual (RAG-based) Queries
+def prefetch_contextual(user_question, selected_company):
+    """Embedding, semantic-cache lookup and FAISS search (no LLM call); None without an index."""
+    vector_store = get_vector_store(selected_company)
+    if vector_store is None:
+        return None
+    final_query = scoped_query(user_question, selected_company)
+    retriever = vector_store.as_retriever(search_kwargs={"k": 4})
+    return retriever, final_query, retrieve_for_question(final_query, retriever, selected_company)
 
-    with open(ddl_file_path, "r", encoding="utf-8") as ddl_file:
-        ddl_content = ddl_file.read().strip()
+def contextual_answer(user_question, selected_company, prefetched=None):
+    """(payload, status) for a contextual question, reusing a prefetch_contextual() result if given."""
+    prefetched = prefetched or prefetch_contextual(user_question, selected_company)
+    if prefetched is None:
+        return {"error": "Vector store not available. Please run the embedding process first."}, 500
 
-    api_key = api_keys[0]  # Cycle through if needed
-    llm_output, llm_time = query_llm(user_question, ddl_content, model_name, api_key)
+    retriever, final_query, retrieval = prefetched
+    response, relevant_docs = query_llm_groq_cached(final_query, retriever, selected_company, retrieval)
 
-    if not llm_output:
-        return jsonify({"error": "Failed to generate a response from LLM."}), 500
+    if isinstance(response, str) and response.startswith("❌"):
+        return {"error": response}, 500
 
-    sql_query, notes = extract_sql_and_notes(llm_output)
-    if sql_query:
-        print(f"Generated SQL Query: {sql_query}")
-        results, columns, exec_time, error_msg = execute_sql(sql_query, db_config)
-        if results:
-            formatted_results = str(results[0][0]) if results else "No data found"
-            return jsonify({"response": formatted_results}), 200
-        else:
-            return jsonify({"error": error_msg}), 500
-    else:
-        return jsonify({"error": "Failed to extract SQL query from LLM response."}), 500
-    
-# ✅ Handle Contextual (RAG-based) Queries
-def handle_contextual_query(user_question, selected_company):
-    vector_store = load_faiss_index()
+    return {
+        "response": response,
+        "sources": format_sources(relevant_docs)
+    }, 200
+
+# ✅ Speculative execution: overlap classification with both branches' LLM-free work
+def _answer_or_error(answer, user_question, selected_company, prepared):
+    """Run one branch to the end on its prepared future; failures become an error payload."""
+    try:
+        return answer(user_question, selected_company, prepared.result())
+    except Exception as e:
+        return {"error": "Internal Server Error", "details": str(e)}, 500
+
+def answer_speculatively(user_question, selected_company):
+    """
+    Start the schema lookup and the vector retrieval while the classifier runs, then
+    finish only the branch it picks (the other future is cancelled, or its result
+    ignored if it already started). Below SPECULATIVE_BORDERLINE confidence both
+    branches run to the end and the classifier's pick wins unless only the other
+    one produced an answer (the numerical one on the request thread, the contextual one
+    on speculative_answer_pool; with no free slot there, the classifier's pick alone).
+    Returns (classification, (payload, status)).
+    """
+    plan = speculation_pool.submit(plan_numerical_query, user_question, selected_company)
+    prefetch = speculation_pool.submit(prefetch_contextual, user_question, selected_company)
+    classification, confidence = classify_with_confidence(user_question)
+    print(f"✅ Classification result: {classification} ({confidence:.2f})")
+
+    if confidence < SPECULATIVE_BORDERLINE and speculative_answer_slots.acquire(blocking=False):
+        print("🔀 Borderline confidence: answering both ways")
+        contextual = speculative_answer_pool.submit(
+            _answer_or_error, contextual_answer, user_question, selected_company, prefetch)
+        contextual.add_done_callback(lambda _: speculative_answer_slots.release())
+        answers = {
+            "numerical": _answer_or_error(numerical_answer, user_question, selected_company, plan),
+            "contextual": contextual.result(),
+        }
+        other = "contextual" if classification == "numerical" else "numerical"
+        if answers[classification][1] != 200 and answers[other][1] == 200:
+            return other, answers[other]
+        return classification, answers[classification]
+
+    if classification == "numerical":
+        prefetch.cancel()
+        return classification, numerical_answer(user_question, selected_company, plan.result())
+    plan.cancel()
+    return classification, contextual_answer(user_question, selected_company, prefetch.result())
+
+def contextual_query_steps(user_question, selected_company):
+    """Streaming RAG answer as ("sources", ...), ("token", ...) steps, then ("result", (payload, status))."""
+    vector_store = get_vector_store(selected_company)
     if vector_store is None:
-        return jsonify({"error": "Vector store not available. Please run the embedding process first."}), 500
-    
-    final_query = f"[Company: {selected_company}] {user_question}"
+        yield "result", ({"error": "Vector store not available. Please run the embedding process first."}, 500)
+        return
 
+    final_query = scoped_query(user_question, selected_company)
     retriever = vector_store.as_retriever(search_kwargs={"k": 4})
-    response, relevant_docs = query_llm_groq(final_query, retriever)
+    sources = []
+    for event, data in query_llm_groq_stream(final_query, retriever, selected_company):
+        if event == "sources":
+            sources = format_sources(data)
+            yield "sources", sources
+        elif event == "token":
+            yield "token", {"text": data}
+        elif event == "answer":
+            yield "result", ({"response": data, "sources": sources}, 200)
+        else:
+            yield "result", ({"error": data}, 500)
+
+def stream_chatbot_answer(user_question, selected_company):
+    """
+    Server-sent events for /query_chatbot: "progress" (classified, sql_generated,
+    executed), "sources" and "token" for contextual answers, and finally "done"
+    with the same JSON the non-streaming endpoint returns (or "error").
+    """
+    try:
+        cached = answer_cache.get(user_question, selected_company) if CACHE_ENABLED else None
+        if cached is not None:
+            yield sse_event("done", cached)
+            return
 
-    if isinstance(response, str) and response.startswith("❌"):
-        return jsonify({"error": response}), 500
+        classification = classify_question(user_question)
+        yield sse_event("progress", {"stage": "classified", "classification": classification})
 
-    sources = [{"source": doc["source"], "snippet": doc["text"][:200]} for doc in relevant_docs]
-    return jsonify({
-        "response": response,
-        "sources": sources
-    }), 200
+        if classification == 'numerical':
+            steps = numerical_query_steps(user_question, selected_company)
+        else:
+            steps = contextual_query_steps(user_question, selected_company)
+        for event, data in steps:
+            if event != "result":
+                yield sse_event(event, data)
+                continue
+            payload, status = data
+            if status != 200:
+                yield sse_event("error", payload)
+                return
+            if CACHE_ENABLED:
+                answer_cache.put(user_question, selected_company, classification, payload)
+            yield sse_event("done", payload)
+    except Exception as e:
+        print("❌ Error in /query_chatbot stream:", str(e))
+        yield sse_event("error", {"error": "Internal Server Error", "details": str(e)})
 
 
 if __name__ == '__main__':
+    warm_up()
     port = int(os.environ.get("PORT", 10000))  # Default to 10000 if PORT is not set
     app.run(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
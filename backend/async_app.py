@@ -0,0 +1,211 @@
+# ASGI variant of app.py: uvicorn async_app:app --host 0.0.0.0 --port $PORT --workers 2
+# (or gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker async_app:app)
+#
+# /query_chatbot runs on the event loop: Groq calls go through pooled AsyncGroq clients, SQL through
+# the asyncio Oracle pool, and FAISS search / SQLite cache lookups in worker threads,
+# so a request waiting on the LLM or the database doesn't hold a thread. Every other
+# route is the unchanged Flask app mounted as WSGI.
+import os
+import asyncio
+import contextlib
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from a2wsgi import WSGIMiddleware
+import app as chatbot  # Flask app: chat history, companies and health routes
+from real_chatbot import query_llm_async, extract_sql_and_notes, execute_sql_async
+from real_chatbot_rag import query_llm_groq_cached_async, query_llm_groq_stream_async
+from vector_store import get_vector_store, scoped_query
+from classifier import classify_question
+from db_pool import close_async_pools
+from groq_clients import groq_clients
+from schema_pruner import prune_schema
+from sql_templates import generate_sql
+from answer_cache import CACHE_ENABLED
+from sse import SSE_HEADERS, wants_stream, sse_event, format_sources
+
+# Threads for the Flask routes mounted below
+WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "10"))
+
+# ✅ Route to Query Real Chatbot (same request and response JSON as app.py)
+async def query_chatbot(request):
+    try:
+        data = await request.json()
+        print("Received data:", data)  # 🔍 Debug log
+
+        user_question = data.get("question")
+        session_id = data.get("session_id")
+        user_id = data.get("user_id")
+        selected_company = data.get("selected_company")
+
+        # Validation
+        if not user_question or not session_id or not user_id or not selected_company:
+            return JSONResponse({"error": "Invalid request data - Missing required fields"}, 400)
+
+        # 📡 Server-sent events: progress, sources and tokens as soon as they exist
+        if wants_stream(data, request.headers.get("accept")):
+            return StreamingResponse(stream_chatbot_answer(user_question, selected_company),
+                                     media_type="text/event-stream", headers=SSE_HEADERS)
+
+        if CACHE_ENABLED:
+            cached = await asyncio.to_thread(chatbot.answer_cache.get, user_question, selected_company)
+            if cached is not None:
+                print("⚡ Answer cache hit")
+                return JSONResponse(cached, 200)
+
+        classification = await asyncio.to_thread(classify_question, user_question)
+        print(f"✅ Classification result: {classification}")
+
+        if classification == 'numerical':
+            payload, status = await handle_numerical_query(user_question, selected_company)
+        else:
+            payload, status = await handle_contextual_query(user_question, selected_company)
+
+        if CACHE_ENABLED and status == 200:
+            await asyncio.to_thread(chatbot.answer_cache.put, user_question, selected_company, classification, payload)
+
+        print("✅ Response generated:", payload)
+        return JSONResponse(payload, status)
+
+    except Exception as e:
+        print("❌ Error in /query_chatbot:", str(e))  # 🔥 Log the exact error
+        return JSONResponse({"error": "Internal Server Error", "details": str(e)}, 500)
+
+async def handle_numerical_query(user_question, selected_company):
+    async for event, data in numerical_query_steps(user_question, selected_company):
+        if event == "result":
+            payload, status = data
+    return payload, status
+
+async def numerical_query_steps(user_question, selected_company):
+    """Async counterpart of app.numerical_query_steps()."""
+    model_name = "llama-3.3-70b-versatile"
+
+    # Usually served from the TTL cache; a refresh queries Oracle, so keep it off the loop
+    ddl_prefix = await asyncio.to_thread(chatbot.get_ddl_prefix_from_db, selected_company)
+    if not ddl_prefix:
+        yield "result", ({"error": "Company not recognized"}, 404)
+        return
+
+    company_schema = chatbot.schema_catalog.get(ddl_prefix)
+    if company_schema is None:
+        yield "result", ({"error": "DDL not found for the specified company"}, 404)
+        return
+
+    template_match = generate_sql(user_question, company_schema, [selected_company])
+    if template_match:
+        print(f"⚡ Fast path ({template_match.template})")
+        sql_query = template_match.sql
+    else:
+        pruned = await asyncio.to_thread(prune_schema, user_question, company_schema)
+        llm_output, llm_time = await query_llm_async(user_question, pruned.ddl, model_name)
+
+        if not llm_output:
+            yield "result", ({"error": "Failed to generate a response from LLM."}, 500)
+            return
+
+        sql_query, notes = extract_sql_and_notes(llm_output)
+    if not sql_query:
+        yield "result", ({"error": "Failed to extract SQL query from LLM response."}, 500)
+        return
+
+    print(f"Generated SQL Query: {sql_query}")
+    yield "progress", {"stage": "sql_generated", "fast_path": template_match is not None}
+    results, columns, exec_time, error_msg = await execute_sql_async(sql_query, chatbot.db_config)
+    yield "progress", {"stage": "executed", "seconds": exec_time}
+    if results:
+        yield "result", ({"response": str(results[0][0])}, 200)
+    else:
+        yield "result", ({"error": error_msg}, 500)
+
+# ✅ Handle Contextual (RAG-based) Queries
+async def handle_contextual_query(user_question, selected_company):
+    vector_store = await asyncio.to_thread(get_vector_store, selected_company)
+    if vector_store is None:
+        return {"error": "Vector store not available. Please run the embedding process first."}, 500
+
+    final_query = scoped_query(user_question, selected_company)
+
+    retriever = vector_store.as_retriever(search_kwargs={"k": 4})
+    response, relevant_docs = await query_llm_groq_cached_async(final_query, retriever, selected_company)
+
+    if isinstance(response, str) and response.startswith("❌"):
+        return {"error": response}, 500
+
+    return {"response": response, "sources": format_sources(relevant_docs)}, 200
+
+async def contextual_query_steps(user_question, selected_company):
+    """Async counterpart of app.contextual_query_steps()."""
+    vector_store = await asyncio.to_thread(get_vector_store, selected_company)
+    if vector_store is None:
+        yield "result", ({"error": "Vector store not available. Please run the embedding process first."}, 500)
+        return
+
+    final_query = scoped_query(user_question, selected_company)
+    retriever = vector_store.as_retriever(search_kwargs={"k": 4})
+    sources = []
+    async for event, data in query_llm_groq_stream_async(final_query, retriever, selected_company):
+        if event == "sources":
+            sources = format_sources(data)
+            yield "sources", sources
+        elif event == "token":
+            yield "token", {"text": data}
+        elif event == "answer":
+            yield "result", ({"response": data, "sources": sources}, 200)
+        else:
+            yield "result", ({"error": data}, 500)
+
+async def stream_chatbot_answer(user_question, selected_company):
+    """Same server-sent events as app.stream_chatbot_answer()."""
+    try:
+        if CACHE_ENABLED:
+            cached = await asyncio.to_thread(chatbot.answer_cache.get, user_question, selected_company)
+            if cached is not None:
+                yield sse_event("done", cached)
+                return
+
+        classification = await asyncio.to_thread(classify_question, user_question)
+        yield sse_event("progress", {"stage": "classified", "classification": classification})
+
+        if classification == 'numerical':
+            steps = numerical_query_steps(user_question, selected_company)
+        else:
+            steps = contextual_query_steps(user_question, selected_company)
+        async for event, data in steps:
+            if event != "result":
+                yield sse_event(event, data)
+                continue
+            payload, status = data
+            if status != 200:
+                yield sse_event("error", payload)
+                return
+            if CACHE_ENABLED:
+                await asyncio.to_thread(chatbot.answer_cache.put, user_question, selected_company, classification, payload)
+            yield sse_event("done", payload)
+    except Exception as e:
+        print("❌ Error in /query_chatbot stream:", str(e))
+        yield sse_event("error", {"error": "Internal Server Error", "details": str(e)})
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    # No-op per worker when gunicorn already warmed up the preloaded master
+    await asyncio.to_thread(chatbot.warm_up)
+    yield
+    await groq_clients.aclose()
+    await close_async_pools()
+
+app = Starlette(
+    routes=[
+        Route("/query_chatbot", query_chatbot, methods=["POST"]),
+        Mount("/", app=WSGIMiddleware(chatbot.app, workers=WSGI_THREADS)),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    port = int(os.environ.get("PORT", 10000))  # Default to 10000 if PORT is not set
+    uvicorn.run(app, host='0.0.0.0', port=port)
@@ -1,16 +1,17 @@
+import os
 from flask import Flask, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
+from storage import configure_app, AUTH_DATABASE_URL
 
 # ✅ Initialize Flask App
 auth_app = Flask(__name__)
 CORS(auth_app)
 bcrypt = Bcrypt(auth_app)
 
-# ✅ SQLite Configuration
-auth_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
-auth_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# ✅ Database Configuration (SQLite by default; AUTH_DATABASE_URL=postgresql://... for several instances)
+configure_app(auth_app, AUTH_DATABASE_URL)
 db = SQLAlchemy(auth_app)
 
 # ✅ User Model
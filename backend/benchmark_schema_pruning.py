@@ -0,0 +1,87 @@
+"""
+Prompt-size / accuracy benchmark for schema pruning.
+
+Usage:
+    python benchmark_schema_pruning.py                      # built-in question set
+    python benchmark_schema_pruning.py --questions qs.csv   # columns: question,prefix,table,metric
+
+A question counts as correct when the DDL sent to the LLM still contains the
+expected table and metric row (a full-DDL fallback always does).
+"""
+import csv
+import time
+import argparse
+from schema_catalog import get_schema_catalog
+from schema_pruner import prune_schema
+from rate_limiter import estimate_tokens
+
+# The few-shot examples from query_llm, with the table/metric each one needs
+DEFAULT_QUESTIONS = [
+    ("What was McDonald's revenue in Q3 2024?", "mcd", "MCD_INCOME_QUARTERLY", "Revenue"),
+    ("How much gross profit did Coca-Cola report in 2023?", "ko", "KO_INCOME_QUARTERLY", "Gross Profit"),
+    ("What was the change in operating expenses from first quarter of 2024 to the second quarter for meta?", "meta", "META_INCOME_QUARTERLY", "Operating Expenses"),
+    ("What's the ratio of quarter 3 2024 and q2 2024 for Meta's cash and equivalents?", "meta", "META_BALANCE_SHEET_QUARTERLY", "Cash and Equivalents"),
+    ("What is the ratio of Accounts Receivable to Total Current Assets in Q3 2024 for AMD?", "amd", "AMD_BALANCE_SHEET_QUARTERLY", "Total Current Assets"),
+    ("What proportion of Accounts Receivable is of Total Current Assets in Q3 2024 for AMD?", "amd", "AMD_BALANCE_SHEET_QUARTERLY", "Accounts Receivable"),
+    ("What was the average Book Value Per Share for the first three quarters of 2024 for Amazon?", "amzn", "AMZN_BALANCE_SHEET_QUARTERLY", "Book Value Per Share"),
+    ("What was the percentage change in Cash and Equivalents from Q2 2024 to Q3 2024 for amazon?", "amzn", "AMZN_BALANCE_SHEET_QUARTERLY", "Cash and Equivalents"),
+    ("Give me the minimum value of Accounts Receivable in 2023 for Meta?", "meta", "META_BALANCE_SHEET_QUARTERLY", "Accounts Receivable"),
+    ("Provide me with the maximum value of Accounts Receivable in 2023 for Meta?", "meta", "META_BALANCE_SHEET_QUARTERLY", "Accounts Receivable"),
+    ("What's the year-over-year change in Retained Earnings from Q3 2023 to Q3 2024 for AMD?", "amd", "AMD_BALANCE_SHEET_QUARTERLY", "Retained Earnings"),
+    ("How did the EPS Growth in Q3 2024 compare to Q3 2023 for Amazon?", "amzn", "AMZN_INCOME_QUARTERLY", "EPS Growth"),
+    ("What were Tesla's net sales in Q1 2024?", "tsla", "TSLA_INCOME_QUARTERLY", "Revenue"),
+    ("How much did Netflix spend on research and development in the second quarter of 2024?", "nflx", "NFLX_INCOME_QUARTERLY", "Research and Development"),
+    ("What was Verizon's free cash flow in 2023?", "vz", "VZ_CASH_FLOW_QUARTERLY", "Free Cash Flow"),
+    ("What was PepsiCo's total debt in Q4 2023?", "pep", "PEP_BALANCE_SHEET_QUARTERLY", "Total Debt"),
+]
+
+def load_questions(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["question"], row["prefix"].lower(), row["table"].upper(), row["metric"]) for row in csv.DictReader(f)]
+
+def run(questions):
+    catalog = get_schema_catalog()
+    rows = []
+    for question, prefix, table_name, metric in questions:
+        company = catalog.get(prefix)
+        if company is None:
+            print(f"⚠️ Unknown company prefix: {prefix}")
+            continue
+        start_time = time.perf_counter()
+        result = prune_schema(question, company)
+        elapsed = (time.perf_counter() - start_time) * 1000
+        table = company.tables.get(table_name)
+        correct = (not result.pruned) or (table_name in result.tables and table is not None
+                                          and table.canonical_metric(metric) in result.metrics)
+        rows.append({
+            "full_tokens": estimate_tokens(company.ddl),
+            "sent_tokens": estimate_tokens(result.ddl),
+            "pruned": result.pruned,
+            "correct": correct,
+            "ms": elapsed,
+        })
+        if not correct:
+            print(f"❌ Missed {metric!r} ({table_name}) for: {question}  -> kept {result.metrics}")
+    return rows
+
+def report(rows):
+    if not rows:
+        print("No questions evaluated.")
+        return
+    n = len(rows)
+    full = sum(r["full_tokens"] for r in rows)
+    sent = sum(r["sent_tokens"] for r in rows)
+    print("\n-------------------------------------")
+    print(f"Questions:            {n}")
+    print(f"Pruned prompts:       {sum(r['pruned'] for r in rows)} ({sum(r['pruned'] for r in rows) / n:.0%})")
+    print(f"Schema accuracy:      {sum(r['correct'] for r in rows) / n:.0%}")
+    print(f"Avg DDL tokens:       {full / n:.0f} -> {sent / n:.0f}")
+    print(f"DDL token savings:    {1 - sent / full:.0%}")
+    print(f"Avg pruning time:     {sum(r['ms'] for r in rows) / n:.2f} ms")
+    print("-------------------------------------")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark schema-pruned prompts")
+    parser.add_argument("--questions", help="CSV with question,prefix,table,metric columns")
+    args = parser.parse_args()
+    report(run(load_questions(args.questions) if args.questions else DEFAULT_QUESTIONS))
@@ -0,0 +1,246 @@
+"""
+Set-based deletes for the chat history database.
+
+Empty sessions (no messages) are deleted with DELETE ... WHERE NOT EXISTS in
+chunks of CHAT_CLEANUP_CHUNK sessions, one short transaction per chunk, walking
+the session ids in order so each session is looked at once. Other writers get
+the database between chunks (CHAT_CLEANUP_PAUSE_MS), so a large cleanup never
+holds the write lock for more than one chunk.
+
+EmptySessionSweeper also runs this every CHAT_CLEANUP_INTERVAL seconds in the
+background (0 disables it). The sweeper only deletes sessions older than
+CHAT_CLEANUP_MIN_AGE seconds, so a chat that was just opened and has no
+messages yet is left alone.
+
+Every worker process (and app instance) runs a sweeper thread, started on its
+first request, but only the one holding the sweeper lease sweeps: an flock on
+<database>.sweeper.lock for SQLite, a session advisory lock on PostgreSQL. The
+lease goes with the process, so another one takes over if the holder dies.
+CHAT_CLEANUP_SWEEPER=0 keeps a process out of the running entirely.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, exists, or_, text
+
+try:
+    import fcntl  # sweeper lease on SQLite (POSIX only)
+except ImportError:
+    fcntl = None
+
+# Configuration
+CHAT_CLEANUP_CHUNK = int(os.getenv("CHAT_CLEANUP_CHUNK", "1000"))            # sessions / messages per transaction
+CHAT_CLEANUP_PAUSE_MS = float(os.getenv("CHAT_CLEANUP_PAUSE_MS", "20"))      # pause between chunks
+CHAT_CLEANUP_INTERVAL = float(os.getenv("CHAT_CLEANUP_INTERVAL", "3600"))    # seconds between sweeps; 0 = off
+CHAT_CLEANUP_MIN_AGE = float(os.getenv("CHAT_CLEANUP_MIN_AGE", "3600"))      # seconds before an empty session is swept
+CHAT_CLEANUP_SWEEPER = os.getenv("CHAT_CLEANUP_SWEEPER", "1") == "1"         # 0: never sweep on a schedule here
+SWEEPER_LOCK_KEY = 0x636861745377  # PostgreSQL advisory lock id ("chatSw")
+
+def delete_session(engine, chat_table, session_table, session_id, chunk_size=CHAT_CLEANUP_CHUNK,
+                   pause_ms=CHAT_CLEANUP_PAUSE_MS):
+    """Delete a session and its messages, the messages in chunks; returns the number of messages deleted."""
+    c, s = chat_table.c, session_table.c
+    deleted = 0
+    while True:
+        with engine.begin() as conn:
+            ids = select(c.id).where(c.session_id == session_id).limit(chunk_size).scalar_subquery()
+            count = conn.execute(delete(chat_table).where(c.id.in_(ids))).rowcount
+            deleted += count
+            if count < chunk_size:
+                # Last chunk: the session goes in the same transaction as its remaining messages
+                conn.execute(delete(chat_table).where(c.session_id == session_id))
+                conn.execute(delete(session_table).where(s.id == session_id))
+                return deleted
+        time.sleep(pause_ms / 1000)
+
+class EmptySessionSweeper:
+    """Deletes sessions without messages in chunks, on demand (run) or on a schedule (start)."""
+
+    def __init__(self, engine, chat_table, session_table, chunk_size=CHAT_CLEANUP_CHUNK, pause_ms=CHAT_CLEANUP_PAUSE_MS,
+                 interval=CHAT_CLEANUP_INTERVAL, min_age=CHAT_CLEANUP_MIN_AGE, on_deleted=None):
+        self.engine = engine
+        self.chat_table = chat_table
+        self.session_table = session_table
+        self.chunk_size = chunk_size
+        self.pause = pause_ms / 1000
+        self.interval = interval
+        self.min_age = min_age
+        self.on_deleted = on_deleted  # called with each chunk of deleted session ids
+        self._reset()
+
+    def _reset(self):
+        """Fresh per-process state; also used after a fork, which only copies the forking thread."""
+        self._pid = os.getpid()
+        self._running = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lease = None
+        self.stats = {
+            "runs": 0, "deleted_total": 0, "errors": 0, "last_error": None,
+            "last_started_at": None, "last_duration_s": None, "last_deleted": None,
+            "in_progress": False, "progress": {"deleted": 0, "chunks": 0},
+        }
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            inherited = self._lease
+            self._reset()  # the parent's lease and a lock held mid-sweep are not ours
+            self._inherited_lease = inherited  # kept, never closed: closing it here would end the parent's
+
+    def _delete_chunk(self, after, cutoff):
+        """Delete the next chunk of empty sessions with ids above `after`; returns (ids seen, number deleted)."""
+        c, s = self.chat_table.c, self.session_table.c
+        empty = ~exists().where(c.session_id == s.id)
+        with self.engine.begin() as conn:
+            ids = conn.execute(
+                select(s.id)
+                .where(s.id > after, empty, or_(s.created_at.is_(None), s.created_at < cutoff))
+                .order_by(s.id)
+                .limit(self.chunk_size)
+            ).scalars().all()
+            if not ids:
+                return ids, 0
+            # NOT EXISTS again: a message may have arrived since the select
+            deleted = conn.execute(delete(self.session_table).where(s.id.in_(ids), empty)).rowcount
+        return ids, deleted
+
+    def run(self, min_age=None):
+        """
+        One full pass; returns the number of sessions deleted, or None if another
+        pass is already running. `min_age` (seconds) overrides CHAT_CLEANUP_MIN_AGE.
+        """
+        self._check_fork()
+        if not self._running.acquire(blocking=False):
+            return None
+        min_age = self.min_age if min_age is None else min_age
+        cutoff = datetime.utcnow() - timedelta(seconds=min_age)
+        start_time = time.perf_counter()
+        self.stats.update(in_progress=True, last_started_at=datetime.utcnow().isoformat(),
+                          progress={"deleted": 0, "chunks": 0})
+        progress = self.stats["progress"]
+        after = ""
+        try:
+            while not self._stop.is_set():
+                ids, deleted = self._delete_chunk(after, cutoff)
+                if not ids:
+                    break
+                after = ids[-1]
+                progress["deleted"] += deleted
+                progress["chunks"] += 1
+                if self.on_deleted is not None:
+                    self.on_deleted(ids)
+                if len(ids) < self.chunk_size:
+                    break
+                time.sleep(self.pause)
+            return progress["deleted"]
+        except Exception as e:
+            self.stats["errors"] += 1
+            self.stats["last_error"] = str(e)
+            raise
+        finally:
+            self.stats["runs"] += 1
+            self.stats["deleted_total"] += progress["deleted"]
+            self.stats["last_deleted"] = progress["deleted"]
+            self.stats["last_duration_s"] = round(time.perf_counter() - start_time, 3)
+            self.stats["in_progress"] = False
+            self._running.release()
+
+    # ---- Sweeper lease: one scheduled sweeper across workers/instances ----
+
+    def _acquire_lease(self):
+        dialect = self.engine.dialect.name
+        if dialect == "postgresql":
+            conn = self.engine.connect()
+            try:
+                if conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": SWEEPER_LOCK_KEY}).scalar():
+                    conn.commit()
+                    return conn  # the lock lives as long as this connection
+            except Exception:
+                conn.invalidate()
+                raise
+            conn.close()
+            return None
+        database = self.engine.url.database
+        if dialect == "sqlite" and fcntl is not None and database and database != ":memory:":
+            handle = open(f"{database}.sweeper.lock", "a")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                return None
+            return handle
+        return True  # nothing to coordinate with
+
+    def _lease_alive(self):
+        if hasattr(self._lease, "execute"):  # PostgreSQL: the lock dies with its connection
+            try:
+                self._lease.execute(text("SELECT 1"))
+                self._lease.commit()
+            except Exception:
+                self._release_lease()
+                return False
+        return True
+
+    def _release_lease(self):
+        lease, self._lease = self._lease, None
+        if lease is None or lease is True:
+            return
+        try:
+            if hasattr(lease, "invalidate"):
+                lease.invalidate()  # really close it: back in the pool it would keep the advisory lock
+            else:
+                lease.close()  # lock file: closing releases the flock
+        except Exception:
+            pass
+
+    def holds_lease(self):
+        """True if this process is (or just became) the scheduled sweeper."""
+        if self._lease is not None and self._lease_alive():
+            return True
+        try:
+            self._lease = self._acquire_lease()
+        except Exception as e:
+            logging.warning("⚠️ Could not take the session sweeper lease: %s", e)
+            self._lease = None
+        return self._lease is not None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            if not self.holds_lease():
+                continue
+            try:
+                deleted = self.run()
+                if deleted:
+                    logging.info("🧹 Swept %d empty chat sessions", deleted)
+            except Exception as e:
+                logging.error("❌ Empty session sweep failed: %s", e)
+        self._release_lease()
+
+    def start(self):
+        """
+        Sweep every `interval` seconds in a daemon thread of this process (no-op if the
+        interval is 0, CHAT_CLEANUP_SWEEPER=0, or it is already running here). Cheap
+        enough to call on every request: a forked worker starts its own thread.
+        """
+        if self.interval <= 0 or not CHAT_CLEANUP_SWEEPER:
+            return
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            self._check_fork()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="session-sweeper", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def report(self):
+        self._check_fork()
+        stats = dict(self.stats, progress=dict(self.stats["progress"]))
+        stats.update(interval_s=self.interval, min_age_s=self.min_age, chunk_size=self.chunk_size,
+                     pid=self._pid, scheduled=self._thread is not None, lease=self._lease is not None)
+        return stats
@@ -0,0 +1,226 @@
+"""
+Batched writes of chat messages to the chat history database.
+
+CHAT_WRITE_MODE decides when /save_chat(s) answers relative to the commit:
+
+  sync   Each request inserts its messages in its own transaction and answers
+         after the commit. One commit per request.
+  group  (default) Requests hand their messages to a writer thread, which
+         collects everything that arrives within CHAT_WRITE_WINDOW_MS (or up to
+         CHAT_WRITE_BATCH rows) and commits it in one transaction. A request still
+         answers only after its messages are committed, so durability is the same
+         as sync; concurrent requests share a commit instead of paying one each.
+         If the commit takes longer than CHAT_WRITE_TIMEOUT, the request answers
+         202 "queued" like async mode (the batch still commits), so a client retry
+         doesn't save the messages twice.
+  async  Write-behind: requests answer 202 as soon as the messages are queued.
+         Messages still queued when the process dies (crash, SIGKILL) are lost,
+         at most one window's worth; a normal shutdown flushes the queue. A failed
+         batch is logged and counted, not reported to the client.
+         Messages are ordered by id, which is assigned at commit. With several
+         workers, two requests for one session (a question, then its answer) can
+         be queued in different processes and commit in either order. Save both
+         in one /save_chats request, or use group mode, when order matters.
+
+On SQLite, what "committed" means is set by CHAT_DB_SYNCHRONOUS (see
+apply_sqlite_pragmas): in WAL mode, NORMAL survives an application crash but
+may lose the last commits on power loss or an OS crash; FULL survives both
+at the cost of an fsync per commit.
+"""
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+import concurrent.futures
+from concurrent.futures import Future
+from sqlalchemy import insert
+
+# Configuration
+CHAT_WRITE_MODE = os.getenv("CHAT_WRITE_MODE", "group")          # sync, group or async
+CHAT_WRITE_WINDOW_MS = float(os.getenv("CHAT_WRITE_WINDOW_MS", "10"))
+CHAT_WRITE_BATCH = int(os.getenv("CHAT_WRITE_BATCH", "500"))       # most rows per transaction
+CHAT_WRITE_TIMEOUT = float(os.getenv("CHAT_WRITE_TIMEOUT", "10"))  # seconds a group-mode request waits
+CHAT_DB_SYNCHRONOUS = os.getenv("CHAT_DB_SYNCHRONOUS", "NORMAL")   # NORMAL or FULL
+SESSION_OWNER_TTL = float(os.getenv("SESSION_OWNER_TTL", "300"))   # seconds a session ownership check is cached
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    """WAL (readers don't block the writer), CHAT_DB_SYNCHRONOUS, and a busy timeout for concurrent workers."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={'FULL' if CHAT_DB_SYNCHRONOUS.upper() == 'FULL' else 'NORMAL'}")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-16000")  # ~16 MB page cache
+    cursor.close()
+
+# --------------------------- Session Ownership ---------------------------
+
+class SessionOwnerCache:
+    """
+    session_id -> user_id for sessions already checked, so repeated saves to the
+    same session skip the ownership query. Only positive results are cached;
+    deleting a session must call forget() (other workers notice within `ttl`).
+    """
+
+    def __init__(self, ttl=SESSION_OWNER_TTL, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._owners = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def owns(self, session_id, user_id, lookup):
+        """True if user_id owns session_id; `lookup(session_id, user_id)` queries the database on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._owners.get(session_id)
+            if entry is not None and entry[0] == user_id and now - entry[1] < self.ttl:
+                self.stats["hits"] += 1
+                return True
+            self.stats["misses"] += 1
+        if not lookup(session_id, user_id):
+            return False
+        with self._lock:
+            if len(self._owners) >= self.max_entries:
+                self._owners.clear()
+            self._owners[session_id] = (user_id, now)
+        return True
+
+    def forget(self, *session_ids):
+        with self._lock:
+            for session_id in session_ids:
+                self._owners.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._owners.clear()
+
+# --------------------------- Chat Writer ---------------------------
+
+class ChatWriter:
+    """Inserts chat rows into `table` according to CHAT_WRITE_MODE (see module docstring)."""
+
+    def __init__(self, engine, table, mode=CHAT_WRITE_MODE, window_ms=CHAT_WRITE_WINDOW_MS, batch=CHAT_WRITE_BATCH,
+                 timeout=CHAT_WRITE_TIMEOUT):
+        if mode not in ("sync", "group", "async"):
+            raise ValueError(f"Unknown CHAT_WRITE_MODE: {mode}")
+        self.engine = engine
+        self.table = table
+        self.mode = mode
+        self.window = window_ms / 1000
+        self.batch = batch
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "rows": 0, "transactions": 0, "largest_batch": 0, "failed_rows": 0,
+                      "timeouts": 0}
+        atexit.register(self.flush)
+
+    def _insert(self, rows):
+        with self.engine.begin() as conn:
+            conn.execute(insert(self.table), rows)
+        with self._lock:
+            self.stats["rows"] += len(rows)
+            self.stats["transactions"] += 1
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(rows))
+
+    def write(self, rows):
+        """
+        Save rows (dicts of column values). Returns True once committed, False if only
+        queued (async mode, or a group commit still running after CHAT_WRITE_TIMEOUT).
+        Raises if the commit fails (sync and group modes).
+        """
+        with self._lock:
+            self.stats["requests"] += 1
+        if self.mode == "sync":
+            self._insert(rows)
+            return True
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((rows, future))
+        if self.mode == "async":
+            return False
+        try:
+            future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            logging.warning("⚠️ Chat write still queued after %.1fs; answering as queued", self.timeout)
+            with self._lock:
+                self.stats["timeouts"] += 1
+            return False
+        return True
+
+    def _ensure_thread(self):
+        # Started lazily so gunicorn workers forked after import each get their own writer
+        if self._thread is None or self._pid != os.getpid():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                    self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+                    self._pid = os.getpid()
+                    self._thread.start()
+
+    def _collect(self, first):
+        """
+        The first request plus whatever else arrives within the window, up to `batch`
+        rows; also whether the shutdown marker (None) was reached.
+        """
+        pending = [first]
+        rows = len(first[0])
+        deadline = time.monotonic() + self.window
+        while rows < self.batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return pending, True
+            pending.append(item)
+            rows += len(item[0])
+        return pending, False
+
+    def _commit(self, pending):
+        rows = [row for item_rows, _ in pending for row in item_rows]
+        try:
+            self._insert(rows)
+        except Exception as e:
+            logging.error("❌ Chat write of %d rows failed: %s", len(rows), e)
+            with self._lock:
+                self.stats["failed_rows"] += len(rows)
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        for _, future in pending:
+            future.set_result(True)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            pending, stop = self._collect(first)
+            self._commit(pending)
+            if stop:
+                return
+
+    def flush(self):
+        """Commit everything still queued and stop the writer thread (runs at interpreter exit)."""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=CHAT_WRITE_TIMEOUT)
+        self._thread = None
+
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["mode"] = self.mode
+        stats["queued"] = self._queue.qsize()
+        stats["rows_per_transaction"] = round(stats["rows"] / stats["transactions"], 2) if stats["transactions"] else 0.0
+        return stats
@@ -1,37 +1,117 @@
+import os
 import pickle
 import re
+import threading
+from functools import lru_cache
 from nltk.tokenize import word_tokenize
 from nltk.stem import WordNetLemmatizer
 import nltk
-nltk.download('wordnet')
-nltk.download('punkt')
+import compact_classifier
 
 # Paths to saved artifacts
 xgboost_model_path = 'artifacts/rf_model.pkl'
 vectorizer_path = 'artifacts/tfidf_vectorizer 2.pkl'
 
-# Load the XGBoost model
-with open(xgboost_model_path, 'rb') as f:
-    xgb_model = pickle.load(f)
-    print(f"✅ Loaded XGBoost model from {xgboost_model_path}")
+# 'compact' (default when artifacts/compact exists) or 'pickle'
+CLASSIFIER_FORMAT = os.getenv("CLASSIFIER_FORMAT", "compact")
 
-# Load the TF-IDF vectorizer
-with open(vectorizer_path, 'rb') as f:
-    tfidf = pickle.load(f)
-    print(f"✅ Loaded TF-IDF vectorizer from {vectorizer_path}")
+# NLTK data the preprocessing needs: resource path -> download package
+NLTK_RESOURCES = {"corpora/wordnet": "wordnet", "tokenizers/punkt": "punkt"}
+# Set NLTK_AUTO_DOWNLOAD=0 on hosts that must never reach the network at boot
+NLTK_AUTO_DOWNLOAD = os.getenv("NLTK_AUTO_DOWNLOAD", "1") == "1"
+
+_models = {}
+_models_lock = threading.Lock()
+_nltk_ready = False
+
+def ensure_nltk_resources():
+    """Check NLTK data locally; only download what is actually missing."""
+    global _nltk_ready
+    if _nltk_ready:
+        return
+    for resource, package in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            if not NLTK_AUTO_DOWNLOAD:
+                raise LookupError(f"NLTK resource '{package}' is missing; run nltk.download('{package}')")
+            nltk.download(package, quiet=True)
+    _nltk_ready = True
+
+def load_models():
+    """Load the classifier and TF-IDF vectorizer once per process (call before forking to share pages)."""
+    if _models:
+        return _models
+    with _models_lock:
+        if not _models:
+            ensure_nltk_resources()
+            if CLASSIFIER_FORMAT != "pickle" and compact_classifier.exists():
+                # Memory-mapped flat arrays (see compact_classifier.py export)
+                vectorizer, model = compact_classifier.load()
+                print(f"✅ Loaded compact classifier from {compact_classifier.COMPACT_DIR}")
+            else:
+                # Load the XGBoost model
+                with open(xgboost_model_path, 'rb') as f:
+                    model = pickle.load(f)
+                    print(f"✅ Loaded XGBoost model from {xgboost_model_path}")
+
+                # Load the TF-IDF vectorizer
+                with open(vectorizer_path, 'rb') as f:
+                    vectorizer = pickle.load(f)
+                    print(f"✅ Loaded TF-IDF vectorizer from {vectorizer_path}")
+
+            lemmatize("warmup")  # forces the lazy WordNet corpus to load now
+            _models["tfidf"] = vectorizer
+            _models["model"] = model
+    return _models
 
 # ✅ Define the preprocessing function
 lemmatizer = WordNetLemmatizer()
+PUNCTUATION = re.compile(r"[^\w\s]")
+
+@lru_cache(maxsize=100_000)
+def lemmatize(token):
+    """Memoized WordNet lemma (questions reuse a small vocabulary)."""
+    return lemmatizer.lemmatize(token)
 
 def preprocess(text):
     """Preprocess the input text."""
+    ensure_nltk_resources()
     text = text.lower()  # Convert to lowercase
-    text = re.sub(r"[^\w\s]", '', text)  # Remove punctuation
+    text = PUNCTUATION.sub('', text)  # Remove punctuation
     tokens = word_tokenize(text)
-    tokens = [lemmatizer.lemmatize(token) for token in tokens]  # Lemmatize each token
+    tokens = [lemmatize(token) for token in tokens]  # Lemmatize each token
     return ' '.join(tokens)
 
-# ✅ Classification function
+# ✅ Classification functions
+def _label(prediction):
+    return 'numerical' if prediction == 1 else 'contextual'
+
+def classify_batch(questions, with_confidence=False):
+    """
+    Classifies many questions with one TF-IDF transform and one model call.
+
+    Args:
+        questions (list[str]): Texts to classify.
+        with_confidence (bool): Also return the predicted class probability.
+
+    Returns:
+        list: 'numerical'/'contextual' labels, or (label, confidence) tuples
+        when with_confidence is True.
+    """
+    if not questions:
+        return []
+    models = load_models()
+    tfidf, xgb_model = models["tfidf"], models["model"]
+    input_vectorized = tfidf.transform([preprocess(q) for q in questions])
+    if not with_confidence:
+        return [_label(p) for p in xgb_model.predict(input_vectorized)]
+
+    probabilities = xgb_model.predict_proba(input_vectorized)
+    classes = list(xgb_model.classes_)
+    best = probabilities.argmax(axis=1)
+    return [(_label(classes[i]), float(row[i])) for row, i in zip(probabilities, best)]
+
 def classify_question(user_input):
     """
     Classifies the user input as either 'numerical' or 'contextual'.
@@ -42,10 +122,11 @@ def classify_question(user_input):
     Returns:
         str: 'numerical' if numerical, 'contextual' otherwise.
     """
-    preprocessed_input = preprocess(user_input)
-    input_vectorized = tfidf.transform([preprocessed_input])
-    prediction = xgb_model.predict(input_vectorized)
-    return 'numerical' if prediction[0] == 1 else 'contextual'
+    return classify_batch([user_input])[0]
+
+def classify_with_confidence(user_input):
+    """Like classify_question, but returns (label, probability of that label)."""
+    return classify_batch([user_input], with_confidence=True)[0]
 
 # ✅ Example usage for testing
 if __name__ == "__main__":
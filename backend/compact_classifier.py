@@ -0,0 +1,303 @@
+"""
+Compact, memory-mappable format for the question classifier.
+
+The pickled random forest (artifacts/rf_model.pkl) is flattened into plain NumPy
+node arrays and the TF-IDF vocabulary into a sorted term array, all saved as
+.npy files under artifacts/compact/. Loading is a handful of np.load(mmap_mode='r')
+calls, so preforked workers share the pages, and prediction walks every tree for
+the whole batch at once instead of going through sklearn's per-call overhead.
+
+Usage:
+    python compact_classifier.py export    # pickles -> artifacts/compact/ (needs scikit-learn)
+    python compact_classifier.py verify    # compare against the pickled model
+    python compact_classifier.py bench     # load time and per-question latency
+"""
+import os
+import re
+import sys
+import json
+import time
+import pickle
+import argparse
+import numpy as np
+
+COMPACT_DIR = os.path.join("artifacts", "compact")
+FORMAT_VERSION = 1
+
+# --------------------------- Vectorizer ---------------------------
+
+class CompactVectorizer:
+    """Re-implementation of a fitted word-level TfidfVectorizer.transform over array-backed vocabulary."""
+
+    def __init__(self, meta, terms, term_features, idf, feature_columns, n_columns):
+        self.lowercase = meta["lowercase"]
+        self.token_pattern = re.compile(meta["token_pattern"])
+        self.ngram_range = tuple(meta["ngram_range"])
+        self.stop_words = frozenset(meta["stop_words"] or ())
+        self.binary = meta["binary"]
+        self.sublinear_tf = meta["sublinear_tf"]
+        self.use_idf = meta["use_idf"]
+        self.norm = meta["norm"]
+        self.terms = terms                    # sorted vocabulary (fixed-width unicode)
+        self.term_features = term_features    # sorted position -> original feature index
+        self.idf = idf
+        self.feature_columns = feature_columns  # original feature index -> forest column (-1 if unused)
+        self.n_columns = n_columns
+
+    def _tokens(self, doc):
+        if self.lowercase:
+            doc = doc.lower()
+        tokens = self.token_pattern.findall(doc)
+        if self.stop_words:
+            tokens = [t for t in tokens if t not in self.stop_words]
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+        original = tokens
+        if min_n == 1:
+            tokens = list(original)
+            min_n += 1
+        else:
+            tokens = []
+        for n in range(min_n, min(max_n + 1, len(original) + 1)):
+            for i in range(len(original) - n + 1):
+                tokens.append(" ".join(original[i:i + n]))
+        return tokens
+
+    def transform(self, docs):
+        """Dense float32 matrix restricted to the columns the forest actually splits on."""
+        X = np.zeros((len(docs), self.n_columns), dtype=np.float32)
+        grams = [self._tokens(doc) for doc in docs]
+        flat = [gram for doc_grams in grams for gram in doc_grams]
+        if not flat:
+            return X
+
+        # One vocabulary lookup for the whole batch
+        unique, inverse = np.unique(np.array(flat), return_inverse=True)
+        positions = np.searchsorted(self.terms, unique)
+        positions[positions >= len(self.terms)] = 0
+        found = self.terms[positions] == unique
+        features = np.where(found, self.term_features[positions], -1)[inverse.ravel()]
+        rows = np.repeat(np.arange(len(docs)), [len(doc_grams) for doc_grams in grams])
+        known = features >= 0
+        if not known.any():
+            return X
+
+        # Term counts per (row, feature)
+        n_features = len(self.feature_columns)
+        pairs, counts = np.unique(rows[known].astype(np.int64) * n_features + features[known], return_counts=True)
+        rows, features = pairs // n_features, pairs % n_features
+        weights = counts.astype(np.float64)
+        if self.binary:
+            weights[:] = 1.0
+        elif self.sublinear_tf:
+            weights = 1.0 + np.log(weights)
+        if self.use_idf:
+            weights *= self.idf[features]
+        if self.norm == "l2":
+            norms = np.sqrt(np.bincount(rows, weights * weights, minlength=len(docs)))
+        elif self.norm == "l1":
+            norms = np.bincount(rows, np.abs(weights), minlength=len(docs))
+        else:
+            norms = np.ones(len(docs))
+        norms[norms == 0] = 1.0
+        weights /= norms[rows]
+
+        columns = self.feature_columns[features]
+        used = columns >= 0
+        X[rows[used], columns[used]] = weights[used]
+        return X
+
+# --------------------------- Forest ---------------------------
+
+class CompactForest:
+    """A random forest stored as flat node arrays; all trees are walked in lockstep."""
+
+    def __init__(self, meta, roots, left, right, feature, threshold, leaf_proba):
+        self.classes_ = np.array(meta["classes"])
+        self.max_depth = meta["max_depth"]
+        self.roots = roots
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.leaf_proba = leaf_proba
+
+    def apply(self, X):
+        """Leaf index reached in every tree, shape (n_samples, n_trees)."""
+        n = X.shape[0]
+        nodes = np.broadcast_to(self.roots, (n, len(self.roots))).copy()
+        rows = np.arange(n)[:, None]
+        for _ in range(self.max_depth):
+            internal = self.left[nodes] != -1
+            if not internal.any():
+                break
+            go_left = X[rows, np.where(internal, self.feature[nodes], 0)] <= self.threshold[nodes]
+            nodes = np.where(internal, np.where(go_left, self.left[nodes], self.right[nodes]), nodes)
+        return nodes
+
+    def predict_proba(self, X):
+        return self.leaf_proba[self.apply(X)].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+# --------------------------- Export / Load ---------------------------
+
+def export(model, vectorizer, out_dir=COMPACT_DIR):
+    """Write a fitted RandomForestClassifier + TfidfVectorizer in the compact format."""
+    if vectorizer.analyzer != "word" or vectorizer.strip_accents or vectorizer.preprocessor or vectorizer.tokenizer:
+        raise ValueError("Only word analyzers with the default preprocessing can be exported.")
+    os.makedirs(out_dir, exist_ok=True)
+
+    roots, left, right, feature, threshold, proba = [], [], [], [], [], []
+    offset, max_depth = 0, 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        roots.append(offset)
+        is_leaf = tree.children_left == -1
+        left.append(np.where(is_leaf, -1, tree.children_left + offset))
+        right.append(np.where(is_leaf, -1, tree.children_right + offset))
+        feature.append(np.where(is_leaf, -1, tree.feature))
+        threshold.append(tree.threshold)
+        values = tree.value[:, 0, :].astype(np.float64)
+        totals = values.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1.0
+        proba.append(values / totals)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    feature = np.concatenate(feature)
+    used = np.unique(feature[feature >= 0])
+    feature_columns = np.full(len(vectorizer.vocabulary_), -1, dtype=np.int32)
+    feature_columns[used] = np.arange(len(used), dtype=np.int32)
+    feature = np.where(feature >= 0, feature_columns[np.maximum(feature, 0)], -1).astype(np.int32)
+
+    terms = np.array(sorted(vectorizer.vocabulary_))
+    arrays = {
+        "roots": np.array(roots, dtype=np.int32),
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "feature": feature,
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "leaf_proba": np.concatenate(proba),
+        "terms": terms,
+        "term_features": np.array([vectorizer.vocabulary_[t] for t in terms], dtype=np.int32),
+        "idf": (vectorizer.idf_ if vectorizer.use_idf else np.ones(len(terms))).astype(np.float64),
+        "feature_columns": feature_columns,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), array)
+
+    stop_words = vectorizer.get_stop_words()
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "classes": [c.item() if hasattr(c, "item") else c for c in model.classes_],
+        "max_depth": int(max_depth),
+        "n_columns": int(len(used)),
+        "lowercase": vectorizer.lowercase,
+        "token_pattern": vectorizer.token_pattern,
+        "ngram_range": list(vectorizer.ngram_range),
+        "stop_words": sorted(stop_words) if stop_words else None,
+        "binary": vectorizer.binary,
+        "sublinear_tf": vectorizer.sublinear_tf,
+        "use_idf": vectorizer.use_idf,
+        "norm": vectorizer.norm,
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"✅ Exported {len(model.estimators_)} trees ({offset} nodes, {len(used)} features used) to {out_dir}")
+
+def exists(path=COMPACT_DIR):
+    return os.path.exists(os.path.join(path, "meta.json"))
+
+def load(path=COMPACT_DIR, mmap=True):
+    """Load (vectorizer, forest) from the compact format."""
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact classifier format: {meta.get('format_version')}")
+    mode = "r" if mmap else None
+    a = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+         for name in ("roots", "left", "right", "feature", "threshold", "leaf_proba",
+                      "terms", "term_features", "idf", "feature_columns")}
+    vectorizer = CompactVectorizer(meta, a["terms"], a["term_features"], a["idf"], a["feature_columns"], meta["n_columns"])
+    forest = CompactForest(meta, np.asarray(a["roots"]), a["left"], a["right"], a["feature"], a["threshold"], a["leaf_proba"])
+    return vectorizer, forest
+
+# --------------------------- CLI ---------------------------
+
+SAMPLE_QUESTIONS = [
+    "What was McDonald's revenue in Q3 2024?",
+    "How much gross profit did Coca-Cola report in 2023?",
+    "What's the ratio of quarter 3 2024 and q2 2024 for Meta's cash and equivalents?",
+    "What is the percentage change in revenue?",
+    "What are the main risks Tesla mentions in its latest filing?",
+    "How is Amazon investing in AI?",
+    "Summarize Netflix's subscriber growth strategy.",
+    "Did management comment on supply chain issues?",
+]
+
+def _load_pickles():
+    from classifier import xgboost_model_path, vectorizer_path
+    with open(xgboost_model_path, "rb") as f:
+        model = pickle.load(f)
+    with open(vectorizer_path, "rb") as f:
+        vectorizer = pickle.load(f)
+    return model, vectorizer
+
+def _questions(path):
+    if not path:
+        return SAMPLE_QUESTIONS
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def verify(questions):
+    """Check the compact model reproduces the pickled model's probabilities and labels."""
+    from classifier import preprocess
+    model, vectorizer = _load_pickles()
+    compact_vectorizer, forest = load()
+    docs = [preprocess(q) for q in questions]
+    expected = model.predict_proba(vectorizer.transform(docs))
+    actual = forest.predict_proba(compact_vectorizer.transform(docs))
+    labels_match = (model.classes_[expected.argmax(axis=1)] == forest.classes_[actual.argmax(axis=1)]).all()
+    max_diff = float(np.abs(expected - actual).max()) if len(docs) else 0.0
+    print(f"Questions: {len(docs)}  labels match: {labels_match}  max |Δproba|: {max_diff:.2e}")
+    return bool(labels_match) and max_diff < 1e-9
+
+def bench(questions, repeat=200):
+    from classifier import preprocess
+    docs = [preprocess(q) for q in questions]
+
+    start_time = time.perf_counter()
+    model, vectorizer = _load_pickles()
+    pickle_load = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    compact_vectorizer, forest = load()
+    compact_load = time.perf_counter() - start_time
+
+    def per_question(fn):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for doc in docs:
+                fn([doc])
+        return (time.perf_counter() - start) / (repeat * len(docs)) * 1000
+
+    pickle_ms = per_question(lambda d: model.predict(vectorizer.transform(d)))
+    compact_ms = per_question(lambda d: forest.predict(compact_vectorizer.transform(d)))
+    print("\n-------------------------------------")
+    print(f"Load time:     pickle {pickle_load * 1000:.1f} ms | compact {compact_load * 1000:.1f} ms")
+    print(f"Per question:  pickle {pickle_ms:.3f} ms | compact {compact_ms:.3f} ms")
+    print("-------------------------------------")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact classifier artifacts")
+    parser.add_argument("command", choices=["export", "verify", "bench"])
+    parser.add_argument("--questions", help="Text file with one question per line")
+    args = parser.parse_args()
+    if args.command == "export":
+        export(*_load_pickles())
+    elif args.command == "verify":
+        sys.exit(0 if verify(_questions(args.questions)) else 1)
+    else:
+        bench(_questions(args.questions))
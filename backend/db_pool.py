@@ -0,0 +1,160 @@
+import os
+import time
+import atexit
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from dotenv import load_dotenv
+import oracledb
+
+# Load environment variables
+load_dotenv()
+
+# Pool sizing (override via .env)
+POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", "8"))
+POOL_INCREMENT = int(os.getenv("DB_POOL_INCREMENT", "1"))
+POOL_TIMEOUT = int(os.getenv("DB_POOL_ACQUIRE_TIMEOUT_MS", "5000"))      # wait for a free session
+POOL_PING_INTERVAL = int(os.getenv("DB_POOL_PING_INTERVAL", "60"))       # ping idle sessions older than this (s)
+
+def get_db_config():
+    """Oracle connection settings from the environment."""
+    return {
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "dsn": os.getenv("DB_DSN"),
+        "wallet_location": os.getenv("DB_WALLET_LOCATION"),
+    }
+
+_pools = {}
+_pools_pid = os.getpid()  # process that created the pools in _pools
+_pools_lock = threading.Lock()
+_async_pools = {}
+_stats = {"acquired": 0, "acquire_errors": 0, "acquire_wait_total": 0.0}
+_stats_lock = threading.Lock()
+
+def _pool_params(db_config):
+    return dict(
+        user=db_config["user"],
+        password=db_config["password"],
+        dsn=db_config["dsn"],
+        config_dir=db_config["wallet_location"],
+        wallet_location=db_config["wallet_location"],
+        wallet_password=db_config["password"],
+        min=POOL_MIN,
+        max=POOL_MAX,
+        increment=POOL_INCREMENT,
+        getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+        wait_timeout=POOL_TIMEOUT,
+        ping_interval=POOL_PING_INTERVAL,
+    )
+
+def get_pool(db_config=None):
+    """Return the shared session pool for db_config, creating it on first use."""
+    global _pools_pid
+    db_config = db_config or get_db_config()
+    key = (db_config["user"], db_config["dsn"])
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = oracledb.create_pool(**_pool_params(db_config))
+            _pools[key] = pool
+            _pools_pid = os.getpid()
+            logging.info("✅ Oracle session pool created (min=%d, max=%d)", POOL_MIN, POOL_MAX)
+    return pool
+
+def _record_acquire(start_time):
+    with _stats_lock:
+        _stats["acquired"] += 1
+        _stats["acquire_wait_total"] += time.perf_counter() - start_time
+
+@contextmanager
+def get_connection(db_config=None):
+    """Borrow a pooled connection and give it back when the block exits."""
+    pool = get_pool(db_config)
+    start_time = time.perf_counter()
+    try:
+        conn = pool.acquire()
+    except oracledb.Error:
+        with _stats_lock:
+            _stats["acquire_errors"] += 1
+        raise
+    _record_acquire(start_time)
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+def get_async_pool(db_config=None):
+    """
+    Shared asyncio session pool (python-oracledb thin mode) for the ASGI app.
+    Created on first use inside the worker's event loop; one per (user, dsn).
+    """
+    db_config = db_config or get_db_config()
+    key = (db_config["user"], db_config["dsn"])
+    pool = _async_pools.get(key)
+    if pool is None:
+        # No lock needed: only the event loop thread creates async pools
+        pool = oracledb.create_pool_async(**_pool_params(db_config))
+        _async_pools[key] = pool
+        logging.info("✅ Async Oracle session pool created (min=%d, max=%d)", POOL_MIN, POOL_MAX)
+    return pool
+
+@asynccontextmanager
+async def get_async_connection(db_config=None):
+    """Async counterpart of get_connection()."""
+    pool = get_async_pool(db_config)
+    start_time = time.perf_counter()
+    try:
+        conn = await pool.acquire()
+    except oracledb.Error:
+        with _stats_lock:
+            _stats["acquire_errors"] += 1
+        raise
+    _record_acquire(start_time)
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+def pool_stats():
+    """Session counts for each pool plus acquire counters."""
+    with _stats_lock:
+        acquired = _stats["acquired"]
+        stats = {
+            "acquired": acquired,
+            "acquire_errors": _stats["acquire_errors"],
+            "avg_acquire_ms": round(_stats["acquire_wait_total"] / acquired * 1000, 3) if acquired else 0.0,
+        }
+    stats["pools"] = [
+        {"dsn": dsn, "opened": pool.opened, "busy": pool.busy, "min": pool.min, "max": pool.max}
+        for (_, dsn), pool in list(_pools.items())
+    ]
+    stats["async_pools"] = [
+        {"dsn": dsn, "opened": pool.opened, "busy": pool.busy, "min": pool.min, "max": pool.max}
+        for (_, dsn), pool in list(_async_pools.items())
+    ]
+    return stats
+
+def close_pools():
+    """Close every pool this process created (registered with atexit, so it runs when a worker exits)."""
+    with _pools_lock:
+        if _pools_pid == os.getpid():  # a forked child must not log off its parent's sessions
+            for pool in _pools.values():
+                try:
+                    pool.close(force=True)
+                except oracledb.Error as e:
+                    logging.warning("⚠️ Error closing Oracle session pool: %s", e)
+        _pools.clear()
+
+atexit.register(close_pools)
+
+async def close_async_pools():
+    """Close the asyncio pools (ASGI shutdown)."""
+    for pool in list(_async_pools.values()):
+        await pool.close(force=True)
+    _async_pools.clear()
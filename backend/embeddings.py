@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "google")  # "google" (remote API) or "local" (ONNX on CPU)
+GOOGLE_EMBEDDING_MODEL = "models/embedding-001"
+LOCAL_MODEL_DIR = os.getenv("LOCAL_EMBED_MODEL_DIR", os.path.join("artifacts", "embedding_model"))
+LOCAL_MODEL_REPO = os.getenv("LOCAL_EMBED_MODEL_REPO", "Xenova/all-MiniLM-L6-v2")
+LOCAL_MODEL_FILE = os.getenv("LOCAL_EMBED_MODEL_FILE", "onnx/model_quantized.onnx")  # int8 export
+LOCAL_BATCH_SIZE = int(os.getenv("LOCAL_EMBED_BATCH_SIZE", "32"))
+LOCAL_THREADS = int(os.getenv("LOCAL_EMBED_THREADS", str(min(4, os.cpu_count() or 1))))
+LOCAL_MAX_LENGTH = int(os.getenv("LOCAL_EMBED_MAX_LENGTH", "256"))  # tokens per text
+EMBEDDING_INFO_FILE = "embedding.json"  # saved next to index.faiss: which model made the vectors
+
+# --------------------------- Local ONNX Backend ---------------------------
+
+class LocalOnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings computed on the CPU from an ONNX export of a
+    sentence-transformers model (mean pooling, then L2 normalization).
+
+    Documents are sorted by length so each batch pads to similar sizes, and the
+    batches run on a thread pool (onnxruntime releases the GIL). A single query
+    skips the pool and runs inline.
+    """
+
+    def __init__(self, model_dir=LOCAL_MODEL_DIR, batch_size=LOCAL_BATCH_SIZE, threads=LOCAL_THREADS,
+                 max_length=LOCAL_MAX_LENGTH):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("The local embedding backend needs onnxruntime and tokenizers "
+                              "(pip install onnxruntime tokenizers)") from e
+
+        model_path = os.path.join(model_dir, "model.onnx")
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"{model_path} not found; run: python embeddings.py download")
+
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        # Split the cores between concurrent batches instead of oversubscribing them
+        options.intra_op_num_threads = max(1, (os.cpu_count() or 1) // threads)
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="embed")
+
+    def _embed_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: feed[name] for name in self._input_names})[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        vectors = [None] * len(texts)
+        for indices, embedded in zip(batches, self._pool.map(lambda idx: self._embed_batch([texts[i] for i in idx]), batches)):
+            for i, vector in zip(indices, embedded):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self._embed_batch([text])[0].tolist()
+
+# --------------------------- Backend Selection ---------------------------
+
+def create_embeddings(backend=EMBEDDING_BACKEND, api_key=None):
+    """New embedding client for a backend ("google" or "local")."""
+    if backend == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        kwargs = {"google_api_key": api_key} if api_key else {}
+        return GoogleGenerativeAIEmbeddings(model=GOOGLE_EMBEDDING_MODEL, **kwargs)
+    if backend == "local":
+        return LocalOnnxEmbeddings()
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+def get_embeddings():
+    """Process-wide client for the configured backend (shared by the combined index and every shard)."""
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                _embeddings = create_embeddings()
+    return _embeddings
+
+def embedding_info(backend=EMBEDDING_BACKEND):
+    """Identifies the model behind an index's vectors; queries must use the same one."""
+    model = GOOGLE_EMBEDDING_MODEL if backend == "google" else f"{LOCAL_MODEL_REPO}/{LOCAL_MODEL_FILE}"
+    return {"backend": backend, "model": model}
+
+def read_embedding_info(store_path):
+    """Info saved with an index; indexes from before this file existed were built with Google."""
+    path = os.path.join(store_path, EMBEDDING_INFO_FILE)
+    if not os.path.exists(path):
+        return embedding_info("google")
+    with open(path, "r") as f:
+        return json.load(f)
+
+def write_embedding_info(store_path, info=None):
+    with open(os.path.join(store_path, EMBEDDING_INFO_FILE), "w") as f:
+        json.dump(info or embedding_info(), f)
+
+def index_matches_backend(store_path):
+    return read_embedding_info(store_path) == embedding_info()
+
+# --------------------------- Model Download ---------------------------
+
+def download_model(repo=LOCAL_MODEL_REPO, model_file=LOCAL_MODEL_FILE, model_dir=LOCAL_MODEL_DIR):
+    """Fetch the ONNX model and tokenizer from the Hugging Face Hub into model_dir."""
+    try:
+        from huggingface_hub import hf_hub_download
+    except ImportError as e:
+        raise ImportError("Downloading the model needs huggingface_hub (pip install huggingface_hub)") from e
+    os.makedirs(model_dir, exist_ok=True)
+    shutil.copyfile(hf_hub_download(repo, model_file), os.path.join(model_dir, "model.onnx"))
+    shutil.copyfile(hf_hub_download(repo, "tokenizer.json"), os.path.join(model_dir, "tokenizer.json"))
+    print(f"✅ {repo}/{model_file} saved to {model_dir}")
+
+def benchmark(backend, queries=50):
+    """Query embedding latency for a backend (p50/p95/max in ms)."""
+    client = create_embeddings(backend)
+    client.embed_query("warm up")
+    timings = []
+    for i in range(queries):
+        start_time = time.perf_counter()
+        client.embed_query(f"What did the company say about revenue growth in quarter {i % 4 + 1}?")
+        timings.append((time.perf_counter() - start_time) * 1000)
+    timings.sort()
+    print(f"{backend}: p50 {timings[len(timings) // 2]:.1f} ms, "
+          f"p95 {timings[int(len(timings) * 0.95) - 1]:.1f} ms, max {timings[-1]:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding backend tools (re-embed an index with: python vector_store.py migrate)")
+    parser.add_argument("command", choices=["download", "bench"])
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, choices=["google", "local"])
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    if args.command == "download":
+        download_model()
+    else:
+        benchmark(args.backend, args.queries)
@@ -0,0 +1,177 @@
+import os
+import time
+import asyncio
+import bisect
+import logging
+import threading
+import contextlib
+import httpx
+from dotenv import load_dotenv
+from groq import Groq, AsyncGroq
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "20"))        # per key
+GROQ_MAX_KEEPALIVE = int(os.getenv("GROQ_MAX_KEEPALIVE", "10"))            # idle connections kept open, per key
+GROQ_KEEPALIVE_EXPIRY = float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "60"))    # seconds an idle connection is kept
+GROQ_CONNECT_TIMEOUT = float(os.getenv("GROQ_CONNECT_TIMEOUT", "5"))
+GROQ_READ_TIMEOUT = float(os.getenv("GROQ_READ_TIMEOUT", "60"))
+GROQ_HTTP2 = os.getenv("GROQ_HTTP2", "1") == "1"  # used only when the h2 package is installed
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+def mask_key(api_key):
+    return f"...{(api_key or '')[-4:]}"
+
+class LatencyHistogram:
+    """Call latencies in fixed millisecond buckets, plus count/error/sum counters."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last bucket: above the largest bound
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+
+    def record(self, ms, error=False):
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.calls += 1
+        self.errors += int(error)
+        self.total_ms += ms
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding this fraction of the calls (None above the last bound)."""
+        if not self.calls:
+            return None
+        seen = 0
+        for bound, count in zip(self.buckets + (None,), self.counts):
+            seen += count
+            if seen >= fraction * self.calls:
+                return bound
+        return None
+
+    def report(self):
+        labels = [f"<={bound}ms" for bound in self.buckets] + [f">{self.buckets[-1]}ms"]
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "mean_ms": round(self.total_ms / self.calls, 1) if self.calls else None,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+class GroqClientRegistry:
+    """
+    One long-lived Groq client (and one AsyncGroq client) per API key, each on its
+    own pooled httpx client, so calls reuse open TLS connections instead of
+    handshaking every time. Shared by the text-to-SQL and RAG paths.
+
+    Clients are created lazily and dropped after a fork (gunicorn --preload), since
+    pooled sockets must not be shared between processes. Async clients belong to
+    the event loop that created them.
+
+    The SDK's own retries are off (max_retries=0): it would sleep on a 429 and
+    retry the same key, behind the rate limiter's back. query_llm retries on
+    another key instead; the RAG calls report the error.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._async_clients = {}
+        self._histograms = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _http_options(self):
+        return {
+            "limits": httpx.Limits(max_connections=GROQ_MAX_CONNECTIONS, max_keepalive_connections=GROQ_MAX_KEEPALIVE,
+                                   keepalive_expiry=GROQ_KEEPALIVE_EXPIRY),
+            "timeout": httpx.Timeout(GROQ_READ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT),
+            "http2": GROQ_HTTP2 and HTTP2_AVAILABLE,
+        }
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._clients, self._async_clients, self._pid = {}, {}, os.getpid()
+
+    def client(self, api_key):
+        """Pooled sync client for this key."""
+        with self._lock:
+            self._check_fork()
+            client = self._clients.get(api_key)
+            if client is None:
+                client = Groq(api_key=api_key, http_client=httpx.Client(**self._http_options()), max_retries=0)
+                self._clients[api_key] = client
+            return client
+
+    def async_client(self, api_key):
+        """Pooled AsyncGroq client for this key on the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._check_fork()
+            entry = self._async_clients.get(api_key)
+            if entry is None or entry[1] is not loop:
+                entry = (AsyncGroq(api_key=api_key, http_client=httpx.AsyncClient(**self._http_options()), max_retries=0),
+                         loop)
+                self._async_clients[api_key] = entry
+            return entry[0]
+
+    def record(self, api_key, seconds, error=False):
+        with self._lock:
+            histogram = self._histograms.get(api_key)
+            if histogram is None:
+                histogram = self._histograms[api_key] = LatencyHistogram()
+            histogram.record(seconds * 1000, error)
+
+    @contextlib.contextmanager
+    def timed(self, api_key):
+        """Record the latency of the calls in the block (an exception counts as an error)."""
+        start_time = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.record(api_key, time.perf_counter() - start_time, error)
+
+    def stats(self):
+        """Per-key latency histograms and pool settings (keys are masked)."""
+        with self._lock:
+            latency = {mask_key(key): histogram.report() for key, histogram in self._histograms.items()}
+            clients = len(self._clients)
+            async_clients = len(self._async_clients)
+        return {
+            "latency": latency,
+            "clients": clients,
+            "async_clients": async_clients,
+            "http2": GROQ_HTTP2 and HTTP2_AVAILABLE,
+            "max_connections": GROQ_MAX_CONNECTIONS,
+        }
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            client.close()
+
+    async def aclose(self):
+        with self._lock:
+            entries, self._async_clients = self._async_clients, {}
+        for client, loop in entries.values():
+            if loop is asyncio.get_running_loop():
+                try:
+                    await client.close()
+                except Exception as e:
+                    logging.warning("⚠️ Error closing Groq client: %s", e)
+
+groq_clients = GroqClientRegistry()
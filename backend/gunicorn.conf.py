@@ -0,0 +1,27 @@
+# Gunicorn settings for the chatbot service: gunicorn -c gunicorn.conf.py app:app
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+# Prefork mode: import the app and load models in the master once, then fork.
+# Workers share the model/index pages copy-on-write instead of each loading them.
+preload_app = os.getenv("PRELOAD_APP", "1") == "1"
+
+def on_starting(server):
+    if server.cfg.preload_app:
+        import app as chatbot
+        chatbot.warm_up()
+        # Keep the GC from touching (and so copying) the preloaded objects in every worker
+        gc.freeze()
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        # Connections opened in the master must not be shared across processes. close=False: drop
+        # them from this worker's pool without closing the sockets the master still holds
+        import app as chatbot
+        with chatbot.app.app_context():
+            chatbot.db.engine.dispose(close=False)
@@ -0,0 +1,183 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+try:
+    import fcntl  # cross-process lock for the disk tier (POSIX only)
+except ImportError:
+    fcntl = None
+
+# Configuration
+QUERY_EMBED_CACHE_ENABLED = os.getenv("QUERY_EMBED_CACHE", "1") == "1"
+QUERY_EMBED_CACHE_PATH = os.getenv("QUERY_EMBED_CACHE_PATH", "query_embeddings")  # directory
+QUERY_EMBED_CACHE_ENTRIES = int(os.getenv("QUERY_EMBED_CACHE_ENTRIES", "2048"))             # in-process LRU size
+QUERY_EMBED_CACHE_DISK_ENTRIES = int(os.getenv("QUERY_EMBED_CACHE_DISK_ENTRIES", "20000"))  # slots on disk
+
+class QueryEmbeddingCache:
+    """
+    Query string -> embedding vector, so a repeated search string costs no embedding call.
+
+    Two tiers: an in-process LRU of float32 arrays, and a disk tier shared by all
+    workers on the host. The disk tier is a ring of `disk_entries` slots in two
+    memory-mapped files: `vectors.f32` (one float32 row per slot) and `keys.u64`
+    (row 0 holds the write counter, row slot+1 the 128-bit SHA-256 prefix of the
+    query stored there). Each process keeps a hash index (key -> slot) that it
+    extends incrementally from the write counter, so lookups never scan the file.
+    Writers clear a slot's key before overwriting its vector and readers re-check
+    the key after copying the vector, so a slot being recycled is a miss, never a
+    wrong vector. Files made for another embedding model are discarded.
+    """
+
+    def __init__(self, path=QUERY_EMBED_CACHE_PATH, memory_entries=QUERY_EMBED_CACHE_ENTRIES,
+                 disk_entries=QUERY_EMBED_CACHE_DISK_ENTRIES, model=None):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.model = model
+        self._memory = OrderedDict()
+        self._slots = {}
+        self._seen = 0
+        self._keys = None
+        self._vectors = None
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "disk_errors": 0}
+
+    @staticmethod
+    def _hash(text):
+        return tuple(int(part) for part in np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest()[:16], dtype=np.uint64))
+
+    # ---- Disk tier ----
+
+    def _file_lock(self):
+        handle = open(os.path.join(self.path, "lock"), "a")
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle  # closing it releases the lock
+
+    def _meta(self):
+        try:
+            with open(os.path.join(self.path, "meta.json"), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _open(self, dim=None):
+        """Map the disk tier; with `dim`, create (or recreate) it if missing or stale. False if unavailable."""
+        if self._vectors is not None:
+            return True
+        meta = self._meta()
+        if meta is None or meta.get("model") != self.model or meta.get("slots") != self.disk_entries:
+            if dim is None:
+                return False
+            os.makedirs(self.path, exist_ok=True)
+            with self._file_lock():
+                meta = self._meta()  # another worker may have created it meanwhile
+                if meta is None or meta.get("model") != self.model or meta.get("slots") != self.disk_entries:
+                    # New files renamed into place: workers still mapping the old ones never see them shrink
+                    for name, dtype, shape in (("vectors.f32", np.float32, (self.disk_entries, dim)),
+                                               ("keys.u64", np.uint64, (self.disk_entries + 1, 2))):
+                        staging = os.path.join(self.path, f"{name}.tmp")
+                        np.memmap(staging, dtype=dtype, mode="w+", shape=shape).flush()
+                        os.replace(staging, os.path.join(self.path, name))
+                    meta = {"model": self.model, "slots": self.disk_entries, "dim": dim}
+                    with open(os.path.join(self.path, "meta.json"), "w") as f:
+                        json.dump(meta, f)
+        self._vectors = np.memmap(os.path.join(self.path, "vectors.f32"), dtype=np.float32, mode="r+",
+                                  shape=(meta["slots"], meta["dim"]))
+        self._keys = np.memmap(os.path.join(self.path, "keys.u64"), dtype=np.uint64, mode="r+",
+                               shape=(meta["slots"] + 1, 2))
+        self._slots, self._seen = {}, 0
+        return True
+
+    def _sync(self):
+        """Index the slots written (by any process) since the last look at the write counter."""
+        writes = int(self._keys[0, 0])
+        if writes == self._seen:
+            return
+        if writes < self._seen or len(self._slots) > 2 * self.disk_entries:
+            self._slots, self._seen = {}, 0  # files were reset, or the index is full of stale keys
+        for write in range(max(self._seen, writes - self.disk_entries), writes):
+            slot = write % self.disk_entries
+            self._slots[tuple(int(part) for part in self._keys[slot + 1])] = slot
+        self._seen = writes
+
+    def _disk_get(self, key):
+        if not self._open():
+            return None
+        self._sync()
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        vector = np.array(self._vectors[slot])
+        if tuple(int(part) for part in self._keys[slot + 1]) != key:
+            self._slots.pop(key, None)  # slot recycled for another query
+            return None
+        return vector
+
+    def _disk_put(self, key, vector):
+        if not self._open(dim=len(vector)) or self._vectors.shape[1] != len(vector):
+            return
+        with self._file_lock():
+            writes = int(self._keys[0, 0])
+            slot = writes % self.disk_entries
+            self._keys[slot + 1] = 0
+            self._vectors[slot] = vector
+            self._keys[slot + 1] = key
+            self._keys[0, 0] = writes + 1
+        self._slots[key] = slot
+
+    # ---- Public API ----
+
+    def get(self, text):
+        """Cached embedding (a float32 array the caller may modify) for this exact query string, or None."""
+        key = self._hash(text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return vector.copy()  # callers normalize in place (faiss.normalize_L2)
+            try:
+                vector = self._disk_get(key)
+            except (OSError, ValueError) as e:
+                logging.warning("⚠️ Query embedding disk cache unavailable: %s", e)
+                self.stats["disk_errors"] += 1
+                vector = None
+            if vector is not None:
+                self._remember(key, vector)
+                self.stats["disk_hits"] += 1
+                return vector.copy()
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, text, vector):
+        key = self._hash(text)
+        vector = np.array(vector, dtype=np.float32).ravel()  # private copy
+        with self._lock:
+            self._remember(key, vector)
+            try:
+                self._disk_put(key, vector)
+            except (OSError, ValueError) as e:
+                logging.warning("⚠️ Could not persist query embedding: %s", e)
+                self.stats["disk_errors"] += 1
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def report(self):
+        """Hit/miss counters and hit ratio (each hit is one embedding API call saved)."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._memory)
+            stats["disk_entries"] = min(int(self._keys[0, 0]), self.disk_entries) if self._keys is not None else 0
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
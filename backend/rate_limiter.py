@@ -0,0 +1,214 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Groq limits per API key (override via .env to match your plan)
+REQUESTS_PER_MINUTE = int(os.getenv("GROQ_RPM", "30"))
+TOKENS_PER_MINUTE = int(os.getenv("GROQ_TPM", "6000"))
+MAX_WAIT = float(os.getenv("GROQ_MAX_WAIT", "30"))  # longest we block waiting for capacity (s)
+
+# --------------------------- Token Bucket ---------------------------
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at capacity/period."""
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` tokens are available (amount is capped at capacity)."""
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def remaining_ratio(self):
+        return self.tokens / self.capacity
+
+    def consume(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+# --------------------------- Per-Key Limiter ---------------------------
+
+class ApiKeyRateLimiter:
+    """
+    Tracks requests-per-minute and tokens-per-minute for each API key and hands out
+    the least-loaded key. Callers only sleep when every key is out of capacity, or
+    when the server answered 429 and told us how long to back off.
+    """
+
+    def __init__(self, api_keys, rpm=REQUESTS_PER_MINUTE, tpm=TOKENS_PER_MINUTE):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._lock = threading.Lock()
+        self._keys = {}
+        for key in api_keys:
+            self._add_key(key)
+
+    def _add_key(self, key):
+        self._keys[key] = {
+            "requests": TokenBucket(self.rpm),
+            "tokens": TokenBucket(self.tpm),
+            "blocked_until": 0.0,
+            "calls": 0,
+            "rate_limited": 0,
+        }
+
+    def _reserve(self, estimated_tokens, api_key=None):
+        """
+        Try to reserve capacity right now.
+
+        Returns (key, 0.0) when a key was reserved, (key, wait) with the shortest
+        wait otherwise, or (None, inf) when there are no keys at all.
+        """
+        with self._lock:
+            if api_key is not None and api_key not in self._keys:
+                self._add_key(api_key)
+            now = time.monotonic()
+            best_key, best_wait, best_load = None, float("inf"), -1.0
+            for key in ([api_key] if api_key is not None else list(self._keys)):
+                state = self._keys[key]
+                state["requests"].refill(now)
+                state["tokens"].refill(now)
+                wait = max(
+                    state["blocked_until"] - now,
+                    state["requests"].wait_time(1),
+                    state["tokens"].wait_time(estimated_tokens),
+                    0.0,
+                )
+                load = min(state["requests"].remaining_ratio(), state["tokens"].remaining_ratio())
+                if wait < best_wait or (wait == best_wait and load > best_load):
+                    best_key, best_wait, best_load = key, wait, load
+
+            if best_key is not None and best_wait == 0.0:
+                state = self._keys[best_key]
+                state["requests"].consume(1)
+                state["tokens"].consume(estimated_tokens)
+                state["calls"] += 1
+            return best_key, best_wait
+
+    def acquire(self, estimated_tokens, api_key=None, max_wait=MAX_WAIT):
+        """
+        Reserve one request and `estimated_tokens` on a key.
+
+        Args:
+            estimated_tokens (int): Prompt plus completion tokens we expect to use.
+            api_key (str): Restrict to this key; otherwise the least-loaded key is chosen.
+            max_wait (float): Give up (return None) if capacity is further away than this.
+
+        Returns:
+            str: The API key to use, or None if no key frees up in time.
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            key, wait = self._reserve(estimated_tokens, api_key)
+            if key is None:
+                return None
+            if wait == 0.0:
+                return key
+            if time.monotonic() + wait > deadline:
+                logging.warning("No API key has capacity within %.1fs.", max_wait)
+                return None
+            time.sleep(wait)
+
+    async def acquire_async(self, estimated_tokens, api_key=None, max_wait=MAX_WAIT):
+        """Same as acquire(), but waits with asyncio.sleep so the event loop keeps running."""
+        deadline = time.monotonic() + max_wait
+        while True:
+            key, wait = self._reserve(estimated_tokens, api_key)
+            if key is None:
+                return None
+            if wait == 0.0:
+                return key
+            if time.monotonic() + wait > deadline:
+                logging.warning("No API key has capacity within %.1fs.", max_wait)
+                return None
+            await asyncio.sleep(wait)
+
+    def record_usage(self, api_key, estimated_tokens, actual_tokens):
+        """Return the difference when a call used fewer tokens than we reserved."""
+        with self._lock:
+            state = self._keys.get(api_key)
+            if state is None or actual_tokens is None:
+                return
+            diff = estimated_tokens - actual_tokens
+            if diff > 0:
+                state["tokens"].give_back(diff)
+            else:
+                state["tokens"].consume(-diff)
+
+    def penalize(self, api_key, retry_after):
+        """Block a key after a 429 for as long as the server asked."""
+        with self._lock:
+            state = self._keys.get(api_key)
+            if state is None:
+                return
+            state["blocked_until"] = max(state["blocked_until"], time.monotonic() + retry_after)
+            state["rate_limited"] += 1
+
+    def stats(self):
+        """Remaining capacity and counters per key (keys are masked)."""
+        with self._lock:
+            now = time.monotonic()
+            report = {}
+            for key, state in self._keys.items():
+                state["requests"].refill(now)
+                state["tokens"].refill(now)
+                report[f"...{key[-4:]}"] = {
+                    "requests_left": int(state["requests"].tokens),
+                    "tokens_left": int(state["tokens"].tokens),
+                    "blocked_for": round(max(0.0, state["blocked_until"] - now), 2),
+                    "calls": state["calls"],
+                    "rate_limited": state["rate_limited"],
+                }
+            return report
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """Process-wide limiter over the comma-separated API_KEYS."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                keys = [k.strip() for k in os.getenv("API_KEYS", "").split(",") if k.strip()]
+                _limiter = ApiKeyRateLimiter(keys)
+    return _limiter
+
+def parse_retry_after(value, default):
+    """Seconds to back off from a Retry-After header: delay-seconds, or an HTTP-date as some proxies send."""
+    if value is None:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def estimate_tokens(text, max_completion_tokens=0):
+    """Rough token count (~4 characters per token) plus the completion budget."""
+    return len(text) // 4 + max_completion_tokens
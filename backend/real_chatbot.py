@@ -1,14 +1,22 @@
 import pandas as pd
 import os
 import time
+import asyncio
 import oracledb
 import logging
 import re
 import random
 import httpx
 from datetime import datetime
-from groq import Groq
+from groq import APIStatusError, APIConnectionError
 import itertools
+from db_pool import get_connection, get_async_connection
+from rate_limiter import get_rate_limiter, estimate_tokens, parse_retry_after
+from groq_clients import groq_clients
+
+# Typical completion size for a single SQL statement; reconciled with actual usage after each call
+EXPECTED_COMPLETION_TOKENS = 256
+CONNECTION_RETRY_DELAY = 1.0  # seconds before retrying a connection error or timeout, doubled each time
 
 # def detect_company(company_name):
 #     """Maps company names from user input to corresponding DDL filenames."""
@@ -68,11 +76,9 @@ def save_progress(df, model_name, mode="w"):
     df.to_csv(output_file, mode=mode, index=False, header=header)
     logging.info("Progress saved to %s", output_file)
 
-def query_llm(user_question, ddl_content, model_name, api_key, max_retries=5):
-    """Queries the LLM API with retry logic."""
-    logging.debug("Querying LLM API using model: %s", model_name)
-    
-    prompt = f"""
+def build_sql_prompt(user_question, ddl_content):
+    """Few-shot text-to-SQL prompt shared by the sync and async LLM calls."""
+    return f"""
 ### Output format:
 The SQL query should ALWAYS start with "SQL:". For example "SQL:SELECT * FROM TABLE;".
 If you could not generate the SQL query, ONLY reply with "NOTE: [issue with creating the query].".  
@@ -128,55 +134,126 @@ query = "{user_question}"
 \n\n
 
 """
-    retries = 0
-    while retries < max_retries:
+
+# Errors query_llm retries or reports; anything else is a bug and propagates
+LLM_ERRORS = (APIStatusError, httpx.HTTPStatusError, APIConnectionError, httpx.TransportError)
+
+def _sql_completion_args(model_name, prompt):
+    """chat.completions.create() arguments for a text-to-SQL call."""
+    return {
+        "model": model_name,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.3,
+        "max_completion_tokens": 1024,
+        "top_p": 1,
+        "stream": False,
+    }
+
+def _finish_llm_call(limiter, key, estimated_tokens, response, start_time):
+    """Reconcile the token reservation with actual usage; returns (llm_response, time_taken)."""
+    usage = getattr(response, "usage", None)
+    limiter.record_usage(key, estimated_tokens, getattr(usage, "total_tokens", None))
+    llm_response = response.choices[0].message.content.strip()
+    time_taken = round(time.time() - start_time, 2)
+    logging.debug("LLM Response received: %s", llm_response)
+    return llm_response, time_taken
+
+def _retry_delay(limiter, key, error, retries):
+    """
+    Seconds to wait before retrying after `error`, or None to give up. A 429 blocks
+    the key in the limiter (the next acquire picks another key or waits), so no delay.
+    """
+    if isinstance(error, (APIStatusError, httpx.HTTPStatusError)):
+        if error.response.status_code != 429:
+            logging.error("LLM API error: %s", error)
+            return None
+        retry_after = parse_retry_after(error.response.headers.get("retry-after"), random.uniform(0, 5))
+        logging.warning("Rate limit hit. Key blocked for %.1f seconds...", retry_after)
+        limiter.penalize(key, retry_after)
+        return 0.0
+    # Connection error or timeout: not the key's fault, so no penalty
+    delay = CONNECTION_RETRY_DELAY * 2 ** retries
+    logging.warning("LLM connection error (%s). Retrying in %.1f seconds...", error, delay)
+    return delay
+
+def query_llm(user_question, ddl_content, model_name, api_key=None, max_retries=5):
+    """Queries the LLM API with retry logic; picks the least-loaded key unless api_key is given."""
+    logging.debug("Querying LLM API using model: %s", model_name)
+    prompt = build_sql_prompt(user_question, ddl_content)
+    limiter = get_rate_limiter()
+    estimated_tokens = estimate_tokens(prompt, EXPECTED_COMPLETION_TOKENS)
+    for retries in range(max_retries):
+        key = limiter.acquire(estimated_tokens, api_key=api_key)
+        if key is None:
+            logging.error("No API key available within the rate limit. Skipping query.")
+            return None, 0
+        try:
+            start_time = time.time()
+            with groq_clients.timed(key):
+                response = groq_clients.client(key).chat.completions.create(**_sql_completion_args(model_name, prompt))
+            return _finish_llm_call(limiter, key, estimated_tokens, response, start_time)
+        except LLM_ERRORS as e:
+            delay = _retry_delay(limiter, key, e, retries)
+            if delay is None:
+                return None, 0
+            if delay:
+                time.sleep(delay)
+    logging.error("Max retries reached. Skipping query.")
+    return None, 0
+
+async def query_llm_async(user_question, ddl_content, model_name, api_key=None, max_retries=5):
+    """query_llm() for the ASGI app: pooled AsyncGroq client, and rate-limit waits don't block the event loop."""
+    logging.debug("Querying LLM API (async) using model: %s", model_name)
+    prompt = build_sql_prompt(user_question, ddl_content)
+    limiter = get_rate_limiter()
+    estimated_tokens = estimate_tokens(prompt, EXPECTED_COMPLETION_TOKENS)
+    for retries in range(max_retries):
+        key = await limiter.acquire_async(estimated_tokens, api_key=api_key)
+        if key is None:
+            logging.error("No API key available within the rate limit. Skipping query.")
+            return None, 0
         try:
-            time.sleep(3)
             start_time = time.time()
-            client = Groq(api_key=api_key)
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_completion_tokens=1024,
-                top_p=1,
-                stream=False,
-            )
-            llm_response = response.choices[0].message.content.strip()
-            time_taken = round(time.time() - start_time, 2)
-            logging.debug("LLM Response received: %s", llm_response)
-            return llm_response, time_taken
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 429:
-                retry_after = int(e.response.headers.get("retry-after", random.uniform(0, 5)))
-                logging.warning("Rate limit hit. Retrying after %d seconds...", retry_after)
-                time.sleep(retry_after)
-                retries += 1
-            else:
-                logging.error("LLM API error: %s", e)
+            with groq_clients.timed(key):
+                response = await groq_clients.async_client(key).chat.completions.create(
+                    **_sql_completion_args(model_name, prompt))
+            return _finish_llm_call(limiter, key, estimated_tokens, response, start_time)
+        except LLM_ERRORS as e:
+            delay = _retry_delay(limiter, key, e, retries)
+            if delay is None:
                 return None, 0
+            if delay:
+                await asyncio.sleep(delay)
     logging.error("Max retries reached. Skipping query.")
     return None, 0
 
 def execute_sql(query, db_config):
     """Executes the SQL query and handles errors."""
     try:
-        conn = oracledb.connect(
-            user=db_config["user"],
-            password=db_config["password"],
-            dsn=db_config["dsn"],
-            config_dir=db_config["wallet_location"],
-            wallet_location=db_config["wallet_location"],
-            wallet_password=db_config["password"]
-        )
-        cursor = conn.cursor()
-        start_time = time.time()
-        cursor.execute(query.rstrip(";"))
-        results = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        execution_time = round(time.time() - start_time, 4)
-        cursor.close()
-        conn.close()
+        with get_connection(db_config) as conn:
+            cursor = conn.cursor()
+            start_time = time.time()
+            cursor.execute(query.rstrip(";"))
+            results = cursor.fetchall()
+            columns = [desc[0] for desc in cursor.description]
+            execution_time = round(time.time() - start_time, 4)
+            cursor.close()
+        return results, columns, execution_time, ""
+    except oracledb.DatabaseError as e:
+        logging.error("Database error: %s", e)
+        return None, None, None, str(e)
+
+async def execute_sql_async(query, db_config):
+    """execute_sql() on the asyncio Oracle pool."""
+    try:
+        async with get_async_connection(db_config) as conn:
+            cursor = conn.cursor()
+            start_time = time.time()
+            await cursor.execute(query.rstrip(";"))
+            results = await cursor.fetchall()
+            columns = [desc[0] for desc in cursor.description]
+            execution_time = round(time.time() - start_time, 4)
+            cursor.close()
         return results, columns, execution_time, ""
     except oracledb.DatabaseError as e:
         logging.error("Database error: %s", e)
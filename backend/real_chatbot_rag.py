@@ -1,28 +1,37 @@
 import os
 import re
+import asyncio
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from groq import Groq
+from groq_clients import groq_clients
+from embeddings import get_embeddings, embedding_info, index_matches_backend
+from ann_index import load_store
+from vector_store import FAISS_STORE_PATH, get_vector_store, vector_store_version, parse_company_name
+from semantic_cache import SemanticCache, SEMANTIC_CACHE_ENABLED
+from query_embedding_cache import QueryEmbeddingCache, QUERY_EMBED_CACHE_ENABLED
 
 # Load environment variables
 load_dotenv()
 
 # Configuration
-FAISS_STORE_PATH = "Rag"
 DATA_DIR = "extracted_sec_text"
 URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")  # Ensure this is set in your .env file
 
+# Paraphrased questions for the same company reuse earlier answers
+semantic_cache = SemanticCache(version_provider=vector_store_version)
+# Repeated search strings reuse their embedding instead of calling the embedding API again
+query_embedding_cache = QueryEmbeddingCache(model=embedding_info()["model"]) if QUERY_EMBED_CACHE_ENABLED else None
+
 # --------------------------- Helper Functions ---------------------------
 
 def load_faiss_index():
-    """Load the combined FAISS index."""
+    """Load the combined FAISS index from disk (use get_vector_store() on the request path)."""
     if os.path.exists(FAISS_STORE_PATH):
+        if not index_matches_backend(FAISS_STORE_PATH):
+            return "❌ FAISS index was embedded with another model; run: python vector_store.py migrate"
         try:
-            embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-            return FAISS.load_local(FAISS_STORE_PATH, embeddings, allow_dangerous_deserialization=True)
+            return load_store(FAISS_STORE_PATH, get_embeddings(), exact=False)
         except Exception as e:
             return f"❌ Error loading FAISS index: {e}"
     return None
@@ -33,14 +42,6 @@ def financial_preprocessor(text):
     text = URL_PATTERN.sub('', text)
     return text.strip()
 
-def parse_company_name(file_name):
-    """Extracts the company name from a file name."""
-    base = os.path.basename(file_name)
-    match = re.match(r"^(.*?)_", base)
-    if match:
-        return match.group(1)
-    return os.path.splitext(base)[0]
-
 def list_companies():
     """List distinct company names from files in DATA_DIR."""
     companies = set()
@@ -49,10 +50,33 @@ def list_companies():
             companies.add(parse_company_name(file_name))
     return sorted(companies)
 
-def retrieve_documents(retriever, query):
-    """Retrieve relevant documents along with metadata."""
+def embed_query(retriever, query):
+    """Embedding of a search string, from the query-embedding cache when it has been embedded before."""
+    if query_embedding_cache is None:
+        return retriever.vectorstore.embeddings.embed_query(query)
+    query_vector = query_embedding_cache.get(query)
+    if query_vector is None:
+        query_vector = retriever.vectorstore.embeddings.embed_query(query)
+        query_embedding_cache.put(query, query_vector)
+    return query_vector
+
+async def embed_query_async(retriever, query):
+    if query_embedding_cache is None:
+        return await retriever.vectorstore.embeddings.aembed_query(query)
+    # The disk tier uses mmap and flock: keep it off the event loop
+    query_vector = await asyncio.to_thread(query_embedding_cache.get, query)
+    if query_vector is None:
+        query_vector = await retriever.vectorstore.embeddings.aembed_query(query)
+        await asyncio.to_thread(query_embedding_cache.put, query, query_vector)
+    return query_vector
+
+def retrieve_documents(retriever, query, query_vector=None):
+    """Retrieve relevant documents along with metadata (reusing query_vector if already embedded)."""
     try:
-        relevant_docs = retriever.get_relevant_documents(query)
+        if query_vector is None:
+            query_vector = embed_query(retriever, query)
+        k = retriever.search_kwargs.get("k", 4)
+        relevant_docs = retriever.vectorstore.similarity_search_by_vector(query_vector, k=k)
         results = []
         for doc in relevant_docs:
             source = doc.metadata.get("source", "Unknown Source")
@@ -62,41 +86,221 @@ def retrieve_documents(retriever, query):
     except Exception as e:
         return f"❌ Retrieval Error: {str(e)}"
 
-def query_llm_groq(question, retriever):
-    """Queries Groq API directly using the provided retriever context."""
+def build_rag_messages(question, relevant_docs):
+    """Chat messages asking the LLM to answer from the retrieved snippets."""
+    retrieved_text = "\n\n".join([doc["text"][:400] + "..." for doc in relevant_docs])
+    return [{
+        "role": "user",
+        "content": (
+            "You are a financial AI assistant that provides concise answers based on retrieved documents.\n"
+            "Based on the following retrieved information, answer the question:\n\n"
+            f"{retrieved_text}\n\nQuestion: {question}"
+        )
+    }]
+
+def query_llm_groq(question, retriever, query_vector=None, relevant_docs=None):
+    """Queries Groq API directly using the provided retriever context (or documents already retrieved)."""
     try:
-        relevant_docs = retrieve_documents(retriever, question)
+        if relevant_docs is None:
+            relevant_docs = retrieve_documents(retriever, question, query_vector)
 
         if isinstance(relevant_docs, str):  # Error Handling
             return relevant_docs, []
 
-        retrieved_text = "\n\n".join([doc["text"][:400] + "..." for doc in relevant_docs])
-
-        client = Groq(api_key=GROQ_API_KEY)
-        response = client.chat.completions.create(
-            model="mixtral-8x7b-32768",
-            messages=[{
-                "role": "user",
-                "content": (
-                    "You are a financial AI assistant that provides concise answers based on retrieved documents.\n"
-                    "Based on the following retrieved information, answer the question:\n\n"
-                    f"{retrieved_text}\n\nQuestion: {question}"
-                )
-            }],
-            temperature=0.3,
-            max_tokens=512,
-            top_p=1,
-            stream=False,
-        )
+        with groq_clients.timed(GROQ_API_KEY):
+            response = groq_clients.client(GROQ_API_KEY).chat.completions.create(
+                model="mixtral-8x7b-32768",
+                messages=build_rag_messages(question, relevant_docs),
+                temperature=0.3,
+                max_tokens=512,
+                top_p=1,
+                stream=False,
+            )
         return response.choices[0].message.content, relevant_docs
     except Exception as e:
         return f"❌ Groq API Error: {str(e)}", []
 
+def embed_question(retriever, question):
+    """Question embedding for the semantic cache, or None if the cache is off or embedding fails."""
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    try:
+        return embed_query(retriever, question)
+    except Exception as e:
+        print(f"⚠️ Could not embed question for semantic cache: {e}")
+        return None
+
+def retrieve_for_question(question, retriever, company):
+    """
+    The LLM-free half of query_llm_groq_cached(): embed the question, check the
+    semantic cache and, on a miss, retrieve. Returns (query_vector, cached, relevant_docs)
+    where cached is an (answer, docs) hit or None.
+    """
+    query_vector = embed_question(retriever, question)
+    if query_vector is not None:
+        cached = semantic_cache.lookup(company, question, query_vector)
+        if cached is not None:
+            return query_vector, cached, None
+    return query_vector, None, retrieve_documents(retriever, question, query_vector)
+
+def query_llm_groq_cached(question, retriever, company, retrieval=None):
+    """
+    query_llm_groq behind the semantic cache: a paraphrase of an earlier question
+    for the same company returns the stored answer without retrieval or an LLM call.
+    The question is embedded once and that vector is reused for retrieval on a miss.
+    `retrieval` is a retrieve_for_question() result computed ahead of time, if any.
+    """
+    query_vector, cached, relevant_docs = retrieval or retrieve_for_question(question, retriever, company)
+    if cached is not None:
+        return cached
+    if isinstance(relevant_docs, str):  # Error Handling
+        return relevant_docs, []
+
+    response, relevant_docs = query_llm_groq(question, retriever, relevant_docs=relevant_docs)
+    if query_vector is not None and not (isinstance(response, str) and response.startswith("❌")):
+        semantic_cache.add(company, question, query_vector, response, relevant_docs)
+    return response, relevant_docs
+
+def query_llm_groq_stream(question, retriever, company):
+    """
+    Streaming query_llm_groq_cached(). Yields ("sources", docs) as soon as retrieval
+    is done, ("token", text) for each chunk Groq sends, then ("answer", full_text);
+    a failure ends the stream with ("error", message).
+    """
+    query_vector, cached, relevant_docs = retrieve_for_question(question, retriever, company)
+    if cached is not None:
+        answer, relevant_docs = cached
+        yield "sources", relevant_docs
+        yield "token", answer
+        yield "answer", answer
+        return
+
+    if isinstance(relevant_docs, str):
+        yield "error", relevant_docs
+        return
+    yield "sources", relevant_docs
+
+    parts = []
+    try:
+        with groq_clients.timed(GROQ_API_KEY):
+            stream = groq_clients.client(GROQ_API_KEY).chat.completions.create(
+                model="mixtral-8x7b-32768",
+                messages=build_rag_messages(question, relevant_docs),
+                temperature=0.3,
+                max_tokens=512,
+                top_p=1,
+                stream=True,
+            )
+            for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    parts.append(text)
+                    yield "token", text
+    except Exception as e:
+        yield "error", f"❌ Groq API Error: {str(e)}"
+        return
+
+    answer = "".join(parts)
+    if query_vector is not None:
+        semantic_cache.add(company, question, query_vector, answer, relevant_docs)
+    yield "answer", answer
+
+# --------------------------- Async Variants (ASGI app) ---------------------------
+
+async def query_llm_groq_async(question, retriever, query_vector=None):
+    """query_llm_groq() with FAISS search in a worker thread and a pooled AsyncGroq call."""
+    try:
+        relevant_docs = await asyncio.to_thread(retrieve_documents, retriever, question, query_vector)
+
+        if isinstance(relevant_docs, str):  # Error Handling
+            return relevant_docs, []
+
+        with groq_clients.timed(GROQ_API_KEY):
+            response = await groq_clients.async_client(GROQ_API_KEY).chat.completions.create(
+                model="mixtral-8x7b-32768",
+                messages=build_rag_messages(question, relevant_docs),
+                temperature=0.3,
+                max_tokens=512,
+                top_p=1,
+                stream=False,
+            )
+        return response.choices[0].message.content, relevant_docs
+    except Exception as e:
+        return f"❌ Groq API Error: {str(e)}", []
+
+async def embed_question_async(retriever, question):
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    try:
+        return await embed_query_async(retriever, question)
+    except Exception as e:
+        print(f"⚠️ Could not embed question for semantic cache: {e}")
+        return None
+
+async def query_llm_groq_cached_async(question, retriever, company):
+    """query_llm_groq_cached() for the event loop; the question is embedded with aembed_query."""
+    query_vector = await embed_question_async(retriever, question)
+    if query_vector is None:
+        return await query_llm_groq_async(question, retriever)
+
+    # lookup/add check vector_store_version(), which may stat, hash or even load the index
+    cached = await asyncio.to_thread(semantic_cache.lookup, company, question, query_vector)
+    if cached is not None:
+        return cached
+
+    response, relevant_docs = await query_llm_groq_async(question, retriever, query_vector)
+    if not (isinstance(response, str) and response.startswith("❌")):
+        await asyncio.to_thread(semantic_cache.add, company, question, query_vector, response, relevant_docs)
+    return response, relevant_docs
+
+async def query_llm_groq_stream_async(question, retriever, company):
+    """Async generator version of query_llm_groq_stream()."""
+    query_vector = await embed_question_async(retriever, question)
+    if query_vector is not None:
+        cached = await asyncio.to_thread(semantic_cache.lookup, company, question, query_vector)
+        if cached is not None:
+            answer, relevant_docs = cached
+            yield "sources", relevant_docs
+            yield "token", answer
+            yield "answer", answer
+            return
+
+    relevant_docs = await asyncio.to_thread(retrieve_documents, retriever, question, query_vector)
+    if isinstance(relevant_docs, str):
+        yield "error", relevant_docs
+        return
+    yield "sources", relevant_docs
+
+    parts = []
+    try:
+        with groq_clients.timed(GROQ_API_KEY):
+            stream = await groq_clients.async_client(GROQ_API_KEY).chat.completions.create(
+                model="mixtral-8x7b-32768",
+                messages=build_rag_messages(question, relevant_docs),
+                temperature=0.3,
+                max_tokens=512,
+                top_p=1,
+                stream=True,
+            )
+            async for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    parts.append(text)
+                    yield "token", text
+    except Exception as e:
+        yield "error", f"❌ Groq API Error: {str(e)}"
+        return
+
+    answer = "".join(parts)
+    if query_vector is not None:
+        await asyncio.to_thread(semantic_cache.add, company, question, query_vector, answer, relevant_docs)
+    yield "answer", answer
+
 # --------------------------- RAG API Functions ---------------------------
 
 def handle_contextual_query(user_question):
     """Handles contextual questions using RAG-based retrieval."""
-    vector_store = load_faiss_index()
+    vector_store = get_vector_store()
     if vector_store is None or isinstance(vector_store, str):
         return {"error": "Vector store not available. Please run the embedding process first."}, 500
 
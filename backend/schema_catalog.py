@@ -0,0 +1,235 @@
+import os
+import re
+import glob
+import time
+import hashlib
+import logging
+import threading
+from db_pool import get_connection
+
+# Configuration
+DDL_DIRECTORY = "Oracle_DDLs"
+METRICS_FILE = os.path.join(DDL_DIRECTORY, "metrics_values.txt")
+COMPANY_MAPPING_TTL = float(os.getenv("COMPANY_MAPPING_TTL", "3600"))  # seconds
+
+CREATE_TABLE_PATTERN = re.compile(r'CREATE TABLE "(\w+)"\."(\w+)"')
+METRIC_VALUE_PATTERN = re.compile(r'^\("(.+)"\)[,;]?\s*$', re.MULTILINE)
+QUARTER_COLUMN_PATTERN = re.compile(r'"(Q[1-4]_\d{4})"\s+FLOAT')
+METRICS_HEADER_PATTERN = re.compile(r"^-- Metrics for (\w+)\s*$")
+
+# --------------------------- Catalog Objects ---------------------------
+
+class TableSchema:
+    """One statement table: its metric rows and quarter columns."""
+
+    def __init__(self, owner, name, prefix):
+        self.owner = owner
+        self.name = name
+        self.prefix = prefix
+        self.statement = name[len(prefix) + 1:].replace("_QUARTERLY", "").lower()  # e.g. 'balance_sheet'
+        self.metrics = []
+        self.quarters = []
+        self._metric_index = {}
+        self._quarter_set = set()
+
+    @property
+    def qualified_name(self):
+        return f'"{self.owner}"."{self.name}"'
+
+    def add_metric(self, metric):
+        key = metric.lower()
+        if key not in self._metric_index:
+            self._metric_index[key] = metric
+            self.metrics.append(metric)
+
+    def add_quarter(self, quarter):
+        if quarter not in self._quarter_set:
+            self._quarter_set.add(quarter)
+            self.quarters.append(quarter)
+
+    def has_metric(self, metric):
+        return metric.lower() in self._metric_index
+
+    def canonical_metric(self, metric):
+        """Exact spelling of a metric as stored in the METRICS column (case-insensitive lookup)."""
+        return self._metric_index.get(metric.lower())
+
+    def has_quarter(self, quarter):
+        return quarter.upper() in self._quarter_set
+
+
+class CompanySchema:
+    """All tables for one DDL prefix plus the raw DDL text used in prompts."""
+
+    def __init__(self, prefix, ddl):
+        self.prefix = prefix
+        self.ddl = ddl
+        self.tables = {}
+        self._metric_tables = {}
+
+    def add_table(self, table):
+        self.tables[table.name] = table
+
+    def index_metrics(self):
+        """Build metric -> [tables] so lookups don't scan every table."""
+        self._metric_tables = {}
+        for table in self.tables.values():
+            for metric in table.metrics:
+                self._metric_tables.setdefault(metric.lower(), []).append(table)
+
+    def tables_for_metric(self, metric):
+        return self._metric_tables.get(metric.lower(), [])
+
+    @property
+    def metrics(self):
+        """Every metric name across the company's tables (lowercase keys)."""
+        return self._metric_tables.keys()
+
+    @property
+    def quarters(self):
+        seen = []
+        for table in self.tables.values():
+            seen.extend(q for q in table.quarters if q not in seen)
+        return seen
+
+
+class SchemaCatalog:
+    """In-memory view of Oracle_DDLs: company prefix -> tables -> metrics -> quarter columns."""
+
+    def __init__(self, companies, version=None):
+        self.companies = companies
+        self.version = version  # content hash of the files the catalog was built from
+        self.tables = {table.name: table for company in companies.values() for table in company.tables.values()}
+
+    def get(self, prefix):
+        return self.companies.get(prefix.lower()) if prefix else None
+
+    def get_ddl(self, prefix):
+        company = self.get(prefix)
+        return company.ddl if company else None
+
+    def get_table(self, name):
+        return self.tables.get(name.upper())
+
+# --------------------------- Parsing ---------------------------
+
+def parse_ddl(prefix, ddl):
+    """Parse one <prefix>_ddl.sql file into a CompanySchema."""
+    company = CompanySchema(prefix, ddl)
+    matches = list(CREATE_TABLE_PATTERN.finditer(ddl))
+    for i, match in enumerate(matches):
+        # Each table's INSERT block and column list sit between its CREATE TABLE and the next one.
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(ddl)
+        block = ddl[match.end():end]
+        table = TableSchema(match.group(1), match.group(2), prefix.upper())
+        for metric in METRIC_VALUE_PATTERN.findall(block):
+            table.add_metric(metric)
+        for quarter in QUARTER_COLUMN_PATTERN.findall(block):
+            table.add_quarter(quarter)
+        company.add_table(table)
+    return company
+
+def parse_metrics_file(path):
+    """Read metrics_values.txt into {table_name: [metric, ...]}."""
+    metrics = {}
+    current = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            header = METRICS_HEADER_PATTERN.match(line)
+            if header:
+                current = metrics.setdefault(header.group(1), [])
+            elif current is not None:
+                current.append(line)
+    return metrics
+
+def build_catalog(ddl_directory=DDL_DIRECTORY, metrics_file=METRICS_FILE):
+    """Parse every <prefix>_ddl.sql (plus metrics_values.txt) once."""
+    start_time = time.time()
+    companies = {}
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(ddl_directory, "*_ddl.sql"))):
+        prefix = os.path.basename(path)[:-len("_ddl.sql")].lower()
+        with open(path, "r", encoding="utf-8") as ddl_file:
+            ddl = ddl_file.read()
+        digest.update(ddl.encode("utf-8"))
+        companies[prefix] = parse_ddl(prefix, ddl.strip())
+
+    if os.path.exists(metrics_file):
+        with open(metrics_file, "rb") as f:
+            digest.update(f.read())
+    catalog = SchemaCatalog(companies, digest.hexdigest()[:16])
+    if os.path.exists(metrics_file):
+        for table_name, metrics in parse_metrics_file(metrics_file).items():
+            table = catalog.get_table(table_name)
+            if table is None:
+                continue
+            for metric in metrics:
+                table.add_metric(metric)
+    for company in companies.values():
+        company.index_metrics()
+
+    logging.info("📚 Schema catalog built: %d companies, %d tables in %.3fs",
+                 len(companies), len(catalog.tables), time.time() - start_time)
+    return catalog
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_schema_catalog():
+    """Process-wide schema catalog, built on first use."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = build_catalog()
+    return _catalog
+
+# --------------------------- Company Mapping ---------------------------
+
+class CompanyMappingCache:
+    """COMPANY_MAPPING (company name -> DDL prefix) cached for `ttl` seconds."""
+
+    def __init__(self, ttl=COMPANY_MAPPING_TTL):
+        self.ttl = ttl
+        self._mapping = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _expired(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def refresh(self, db_config=None):
+        """Reload the whole mapping table in one query."""
+        with get_connection(db_config) as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT COMPANY_NAME, DDL_PREFIX FROM COMPANY_MAPPING")
+            mapping = {name.lower(): prefix for name, prefix in cursor.fetchall()}
+            cursor.close()
+        self._mapping = mapping
+        self._loaded_at = time.monotonic()
+
+    def mapping(self, db_config=None):
+        if self._expired():
+            with self._lock:
+                if self._expired():
+                    try:
+                        self.refresh(db_config)
+                    except Exception as e:
+                        # Keep serving the stale mapping if the DB is briefly unreachable.
+                        if not self._mapping:
+                            raise
+                        logging.warning("⚠️ Using stale company mapping: %s", e)
+                        self._loaded_at = time.monotonic()
+        return self._mapping
+
+    def get_prefix(self, company_name, db_config=None):
+        return self.mapping(db_config).get(company_name.lower()) if company_name else None
+
+    def company_names(self, db_config=None):
+        return sorted({name.upper() for name in self.mapping(db_config)})
+
+
+company_mapping = CompanyMappingCache()
@@ -0,0 +1,214 @@
+import os
+import re
+import logging
+from difflib import SequenceMatcher
+
+# Configuration
+PRUNING_ENABLED = os.getenv("SCHEMA_PRUNING", "1") == "1"
+MIN_CONFIDENCE = float(os.getenv("SCHEMA_PRUNING_MIN_CONFIDENCE", "0.75"))  # below this, send the full DDL
+FUZZY_THRESHOLD = 0.8    # similarity needed for a metric row to be kept
+CANDIDATE_THRESHOLD = 0.6  # weaker matches are still reported, but never kept
+MAX_METRICS = 8          # most metric rows we keep in a pruned prompt
+
+# Common phrasings that don't appear verbatim in the METRICS column
+SYNONYMS = {
+    "sales": "revenue",
+    "net sales": "revenue",
+    "total revenue": "revenue",
+    "earnings per share": "eps",
+    "r and d": "research and development",
+    "sg and a": "selling general and admin",
+    "fcf": "free cash flow",
+    "cash and cash equivalents": "cash and equivalents",
+    "capex": "capital expenditures",
+    "net profit": "net income",
+}
+
+STOPWORDS = {"a", "an", "and", "the", "of", "in", "to", "for", "from", "on", "by", "what", "was", "is", "how", "did"}
+_metric_terms_cache = {}
+
+ORDINALS = {"first": 1, "1st": 1, "second": 2, "2nd": 2, "third": 3, "3rd": 3, "fourth": 4, "4th": 4}
+QUARTER_MENTION = re.compile(
+    r"\bq([1-4])\b"
+    r"|\bquarter ([1-4])\b"
+    r"|\b(first|second|third|fourth|1st|2nd|3rd|4th) quarter\b"
+    r"|\bfirst (two|three) quarters\b"
+    r"|\b(first|second) half\b"
+    r"|\b(20\d{2})\b"
+)
+
+# --------------------------- Question Parsing ---------------------------
+
+def normalize(text):
+    """Lowercase, drop possessives and punctuation, expand '&'."""
+    text = text.lower().replace("&", " and ")
+    text = re.sub(r"'s\b", "", text)
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+    return " ".join(text.split())
+
+def apply_synonyms(text):
+    padded = f" {text} "
+    for phrase in sorted(SYNONYMS, key=len, reverse=True):
+        replacement = SYNONYMS[phrase]
+        padded = padded.replace(f" {phrase} ", f" {replacement} ")
+    return padded.strip()
+
+def extract_quarters(question):
+    """
+    Quarter columns mentioned in a question, in order of appearance.
+
+    "Q3 2024" -> ["Q3_2024"]; "first three quarters of 2024" -> Q1..Q3 2024;
+    a bare year ("in 2023") expands to all four quarters. A quarter with no year
+    of its own takes the closest year mentioned before it (or after, if none).
+    """
+    text = normalize(question)
+    quarters = []
+    pending = []
+    last_year = None
+
+    def add(q, year):
+        column = f"Q{q}_{year}"
+        if column not in quarters:
+            quarters.append(column)
+
+    for match in QUARTER_MENTION.finditer(text):
+        q_num, q_word, q_ordinal, q_count, half, year = match.groups()
+        if year:
+            if pending:
+                for q in pending:
+                    add(q, year)
+                pending = []
+            else:
+                for q in range(1, 5):
+                    add(q, year)
+            last_year = year
+            continue
+        if q_num or q_word:
+            new = [int(q_num or q_word)]
+        elif q_ordinal:
+            new = [ORDINALS[q_ordinal]]
+        elif q_count:
+            new = list(range(1, {"two": 2, "three": 3}[q_count] + 1))
+        else:
+            new = [1, 2] if half == "first" else [3, 4]
+        if _year_follows(text, match.end()):
+            pending.extend(new)
+        elif last_year:
+            for q in new:
+                add(q, last_year)
+        else:
+            pending.extend(new)
+
+    if pending:
+        years = re.findall(r"\b(20\d{2})\b", text)
+        if years:
+            for q in pending:
+                add(q, last_year or years[0])
+    return quarters
+
+def _year_follows(text, pos):
+    return re.match(r"\s*(?:of\s+|in\s+|fy\s*)?(?:the\s+year\s+)?20\d{2}\b", text[pos:]) is not None
+
+def metric_terms(company):
+    """Normalized metric names and content-word stems for a company, computed once."""
+    terms = _metric_terms_cache.get(company.prefix)
+    if terms is None:
+        terms = []
+        for key in company.metrics:
+            metric = normalize(key)
+            words = metric.split()
+            terms.append((key, metric, {w[:4] for w in words if w not in STOPWORDS}, len(words)))
+        _metric_terms_cache[company.prefix] = terms
+    return terms
+
+def score_metrics(question, company):
+    """
+    Score every metric of a company against the question.
+
+    Exact phrase matches score 1.0; otherwise the best SequenceMatcher ratio of
+    a same-length word window is used. Returns [(score, metric_key), ...] sorted.
+    """
+    text = apply_synonyms(normalize(question))
+    padded = f" {text} "
+    tokens = text.split()
+    stems = {token[:4] for token in tokens if token not in STOPWORDS}
+    scores = []
+    for key, metric, metric_stems, n in metric_terms(company):
+        if f" {metric} " in padded:
+            scores.append((1.0, key))
+            continue
+        # Skip the fuzzy pass unless a content word (by 4-letter stem) is shared
+        if not metric_stems & stems:
+            continue
+        # Only compare word windows that contain one of the shared words
+        anchors = [i for i, token in enumerate(tokens) if token[:4] in metric_stems]
+        best = 0.0
+        for size in {max(1, n - 1), n, n + 1}:
+            starts = {i for a in anchors for i in range(max(0, a - size + 1), min(a, len(tokens) - size) + 1)}
+            for i in starts:
+                matcher = SequenceMatcher(None, " ".join(tokens[i:i + size]), metric)
+                if matcher.real_quick_ratio() > best and matcher.quick_ratio() > best:
+                    best = max(best, matcher.ratio())
+        if best >= CANDIDATE_THRESHOLD:
+            scores.append((round(best, 3), key))
+    scores.sort(key=lambda item: (-item[0], -len(item[1])))
+    return scores
+
+# --------------------------- Pruning ---------------------------
+
+class PrunedSchema:
+    """Result of pruning: the DDL text to send plus what was kept and why."""
+
+    def __init__(self, ddl, tables, metrics, quarters, confidence, pruned):
+        self.ddl = ddl
+        self.tables = tables
+        self.metrics = metrics
+        self.quarters = quarters
+        self.confidence = confidence
+        self.pruned = pruned
+
+def render_ddl(selection):
+    """Render {TableSchema: [metric, ...]} in the same layout as the Oracle_DDLs files."""
+    parts = []
+    for table, metrics in selection.items():
+        values = ",\n".join(f'("{metric}")' for metric in metrics)
+        columns = ", \n".join(f'\t"{quarter}" FLOAT(126)' for quarter in table.quarters)
+        parts.append(
+            f"  CREATE TABLE {table.qualified_name} \n\n"
+            f"-- Insert values into the METRICS column for {table.name}\n"
+            f'INSERT INTO {table.qualified_name} ("METRICS") VALUES\n'
+            f"{values};\n"
+            f'   (\t"METRICS" VARCHAR2(255), \n{columns}\n   )'
+        )
+    return "\n\n".join(parts)
+
+def prune_schema(question, company, min_confidence=MIN_CONFIDENCE):
+    """
+    Keep only the tables/metric rows a question is likely to need.
+
+    Falls back to the company's full DDL when pruning is disabled, no metric
+    scores above min_confidence, or a mentioned quarter isn't a column.
+    """
+    quarters = extract_quarters(question)
+    scores = score_metrics(question, company) if PRUNING_ENABLED else []
+    confidence = scores[0][0] if scores else 0.0
+
+    kept = [key for score, key in scores if score >= FUZZY_THRESHOLD][:MAX_METRICS]
+    selection = {}
+    for key in kept:
+        for table in company.tables_for_metric(key):
+            selection.setdefault(table, []).append(table.canonical_metric(key))
+
+    missing_quarter = any(not table.has_quarter(q) for table in selection for q in quarters)
+    if not selection or confidence < min_confidence or missing_quarter:
+        logging.debug("Schema pruning fell back to full DDL (confidence=%.2f)", confidence)
+        return PrunedSchema(company.ddl, list(company.tables), [], quarters, confidence, False)
+
+    return PrunedSchema(
+        render_ddl(selection),
+        [table.name for table in selection],
+        [metric for metrics in selection.values() for metric in metrics],
+        quarters,
+        confidence,
+        True,
+    )
@@ -0,0 +1,122 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+import faiss
+from schema_pruner import extract_quarters, normalize
+
+# Configuration
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "1") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # cosine similarity for a hit
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))  # seconds
+FISCAL_YEAR = re.compile(r"\bfy ?(\d{2})\b")
+
+def question_periods(question):
+    """Quarters and fiscal years a question asks about; "Q1 2023" and "Q1 2024" embed almost alike."""
+    quarters = extract_quarters(question)
+    fiscal_years = [f"FY20{yy}" for yy in FISCAL_YEAR.findall(normalize(question))]
+    return tuple(quarters + fiscal_years)
+
+class SemanticCache:
+    """
+    Answers to contextual questions, looked up by embedding similarity.
+
+    Each company and set of periods (question_periods) gets its own small
+    inner-product FAISS index over L2-normalized question embeddings, so the score
+    is the cosine similarity and a question about another quarter or year never hits. Entries are
+    evicted least-recently-used first once `max_entries` is reached, and ignored
+    (then removed) once older than `ttl`. If `version_provider` reports a new
+    vector store version, the whole cache is dropped.
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+                 ttl=SEMANTIC_CACHE_TTL, version_provider=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_provider = version_provider
+        self._version = None
+        self._indexes = {}
+        self._entries = OrderedDict()  # id -> entry, in LRU order
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype="float32").reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _company_key(self, company):
+        return (company or "").strip().lower()
+
+    def _current_version(self):
+        # Read outside the lock: the provider may stat, hash or even load the index
+        return self.version_provider() if self.version_provider is not None else None
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                logging.info("🔄 Vector store changed; clearing semantic cache")
+            self._indexes.clear()
+            self._entries.clear()
+            self._version = version
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is not None:
+            self._indexes[entry["key"]].remove_ids(np.array([entry_id], dtype="int64"))
+
+    def lookup(self, company, question, vector):
+        """Return (answer, docs) for a close enough earlier question about the same periods, else None."""
+        key = (self._company_key(company), question_periods(question))
+        query = self._normalize(vector)
+        version = self._current_version()
+        with self._lock:
+            self._check_version(version)
+            index = self._indexes.get(key)
+            if index is not None and index.ntotal:
+                scores, ids = index.search(query, 1)
+                entry_id, score = int(ids[0][0]), float(scores[0][0])
+                entry = self._entries.get(entry_id)
+                if entry is not None and score >= self.threshold:
+                    if time.time() - entry["created"] <= self.ttl:
+                        self._entries.move_to_end(entry_id)
+                        self.stats["hits"] += 1
+                        return entry["answer"], entry["docs"]
+                    self._remove(entry_id)
+            self.stats["misses"] += 1
+        return None
+
+    def add(self, company, question, vector, answer, docs):
+        """Remember an answer (and its sources) for this question and its embedding."""
+        key = (self._company_key(company), question_periods(question))
+        query = self._normalize(vector)
+        version = self._current_version()
+        with self._lock:
+            self._check_version(version)
+            index = self._indexes.get(key)
+            if index is None:
+                index = faiss.IndexIDMap2(faiss.IndexFlatIP(query.shape[1]))
+                self._indexes[key] = index
+            entry_id = self._next_id
+            self._next_id += 1
+            index.add_with_ids(query, np.array([entry_id], dtype="int64"))
+            self._entries[entry_id] = {"key": key, "answer": answer, "docs": docs, "created": time.time()}
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.stats["evictions"] += 1
+
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,207 @@
+import os
+import re
+import logging
+from schema_pruner import normalize, apply_synonyms, extract_quarters, metric_terms, QUARTER_MENTION
+
+# Configuration
+FAST_PATH_ENABLED = os.getenv("SQL_FAST_PATH", "1") == "1"
+
+# Operation keywords, matched after the metric names are cut out of the question
+OPERATIONS = {
+    "pct_change": re.compile(r"\b(?:percentage|percent|pct) (?:change|increase|decrease|growth|difference)\b|\bgrowth rate\b"),
+    "difference": re.compile(r"\b(?:change|changed|difference|differ|compare|compared|increase|increased|decrease|decreased|grow|grew|vs|versus)\b"),
+    "ratio": re.compile(r"\b(?:ratio|proportion|divided by|relative to)\b"),
+    "minimum": re.compile(r"\b(?:minimum|lowest|min|smallest)\b"),
+    "maximum": re.compile(r"\b(?:maximum|highest|max|largest|greatest|peak)\b"),
+    "average": re.compile(r"\b(?:average|mean|avg)\b"),
+    "sum": re.compile(r"\b(?:total|sum|combined|cumulative|aggregate)\b"),
+}
+# Anything that hints at more than a single-row lookup goes to the LLM
+UNSUPPORTED = re.compile(
+    r"\b(?:excluding|except|without|segment|forecast|predict|why|explain|trend|each|every|list|"
+    r"rank|top|all quarters|over time|per employee|if|would|should)\b"
+)
+YEAR_OVER_YEAR = re.compile(r"\b(?:year over year|yoy|yearly)\b")
+QUARTER_OVER_QUARTER = re.compile(r"\b(?:quarter over quarter|qoq|sequential|sequentially)\b")
+RATE_LIKE = re.compile(r"margin|growth|ratio|rate|yoy|per share|%")
+# Words allowed to remain once metrics, periods, the company and the operation are cut out.
+# Anything else ("growth", "go up", "before taxes") may change the meaning, so the LLM answers.
+FILLER_WORDS = {
+    "what", "was", "were", "is", "are", "the", "a", "an", "in", "for", "of", "during", "at", "on", "by",
+    "from", "to", "and", "between", "how", "much", "did", "does", "do", "has", "had", "have",
+    "company", "its", "their", "fiscal", "fy", "year", "quarter", "quarters", "value", "amount",
+    "figure", "number", "reported", "show", "tell", "give", "me", "please", "inc", "corp", "corporation",
+}
+# "between Q1 and Q4" / "from Q1 to Q4": a range of quarters for sum/average/min/max, endpoints for a change
+PERIOD_RANGE = re.compile(r"\bbetween\b|\bfrom\b.*\b(?:to|through|until)\b")
+FROM_TO = re.compile(r"\bfrom\b.*\bto\b")
+# A single quarter named explicitly ("Q3", "third quarter"), as opposed to a year or half
+EXPLICIT_QUARTER = re.compile(r"\bq[1-4]\b|\bquarter [1-4]\b|\b(?:first|second|third|fourth|1st|2nd|3rd|4th) quarter\b")
+
+class TemplateMatch:
+    """SQL produced by the rule-based generator."""
+
+    def __init__(self, sql, template, metrics, quarters):
+        self.sql = sql
+        self.template = template
+        self.metrics = metrics
+        self.quarters = quarters
+
+# --------------------------- Matching ---------------------------
+
+def find_exact_metrics(text, company):
+    """Metric names appearing verbatim in `text`, longest match wins on overlap."""
+    padded = f" {text} "
+    spans = []
+    for key, metric, _, _ in metric_terms(company):
+        start = padded.find(f" {metric} ")
+        while start != -1:
+            spans.append((start, start + len(metric) + 2, key))
+            start = padded.find(f" {metric} ", start + 1)
+    spans.sort(key=lambda span: (-(span[1] - span[0]), span[0]))
+    chosen = []
+    for start, end, key in spans:
+        if all(end <= s or start >= e for s, e, _ in chosen):
+            chosen.append((start, end, key))
+    chosen.sort()
+    return chosen
+
+def _quarter_key(column):
+    return int(column[3:]), int(column[1])
+
+def _shift_quarter(column, quarters_back):
+    q, year = int(column[1]), int(column[3:])
+    index = year * 4 + (q - 1) - quarters_back
+    return f"Q{index % 4 + 1}_{index // 4}"
+
+def _quarter_range(first, last):
+    """Every quarter from `first` through `last`, e.g. Q1_2023..Q4_2023."""
+    count = (_quarter_key(last)[0] - _quarter_key(first)[0]) * 4 + _quarter_key(last)[1] - _quarter_key(first)[1]
+    return [_shift_quarter(last, back) for back in range(count, -1, -1)]
+
+def _literal(metric):
+    return metric.replace("'", "''")
+
+def _column_list(quarters, separator=", "):
+    return separator.join(f'"{q}"' for q in quarters)
+
+def _only_filler(remainder, company, company_names):
+    """True if nothing but filler words is left after cutting out periods, company names and operations."""
+    names = [company.prefix] + [normalize(name) for name in company_names if name]
+    text = QUARTER_MENTION.sub(" ", remainder)
+    for pattern in list(OPERATIONS.values()) + [YEAR_OVER_YEAR, QUARTER_OVER_QUARTER]:
+        text = pattern.sub(" ", text)
+    padded = f" {text} "
+    for name in sorted(names, key=len, reverse=True):
+        padded = padded.replace(f" {name} ", " ")
+    return all(word in FILLER_WORDS for word in padded.split())
+
+def generate_sql(question, company, company_names=()):
+    """
+    Build SQL for common single-row questions without calling the LLM.
+
+    Supported shapes mirror the few-shot examples in query_llm: a value in one
+    quarter, sum/average/min/max over quarters ("between X and Y" meaning the whole
+    range), change and percentage change from the first quarter named to the
+    second, and ratios (two quarters of one metric, or two metrics
+    in one quarter). Returns None whenever the question is not an unambiguous
+    fit (including any word outside FILLER_WORDS besides the metric, period,
+    company name and operation), so the caller falls back to the LLM.
+    `company_names` are the names the user may call the company by.
+    """
+    if not FAST_PATH_ENABLED or company is None:
+        return None
+
+    text = apply_synonyms(normalize(question))
+    matches = find_exact_metrics(text, company)
+    if not matches or len(matches) > 2:
+        return None
+
+    # Strip metric names so words like "Total" or "Growth" inside them aren't read as operations
+    remainder = f" {text} "
+    for start, end, _ in reversed(matches):
+        remainder = remainder[:start] + " " + remainder[end:]
+    if UNSUPPORTED.search(remainder) or not _only_filler(remainder, company, company_names):
+        return None
+
+    ops = [name for name, pattern in OPERATIONS.items() if pattern.search(remainder)]
+    if "pct_change" in ops:
+        ops.remove("pct_change")
+        ops = ["pct_change"] + [op for op in ops if op != "difference"]
+    if len(ops) > 1:
+        return None
+    op = ops[0] if ops else None
+
+    quarters = extract_quarters(question)
+    if op in ("difference", "pct_change") and len(quarters) == 1:
+        if YEAR_OVER_YEAR.search(remainder):
+            quarters = [_shift_quarter(quarters[0], 4), quarters[0]]
+        elif QUARTER_OVER_QUARTER.search(remainder):
+            quarters = [_shift_quarter(quarters[0], 1), quarters[0]]
+    if not quarters:
+        return None
+    if op in ("sum", "average", "minimum", "maximum") and len(quarters) == 2 and PERIOD_RANGE.search(text):
+        quarters = _quarter_range(*sorted(quarters, key=_quarter_key))
+    if op in ("difference", "pct_change") and len(quarters) == 2:
+        # Change is measured in the order the quarters were named; only "from X to Y" may run backwards
+        if quarters != sorted(quarters, key=_quarter_key) and not FROM_TO.search(text):
+            return None
+
+    metric_keys = [key for _, _, key in matches]
+    tables = []
+    for key in metric_keys:
+        candidates = company.tables_for_metric(key)
+        if len(candidates) != 1:
+            return None  # same metric name in several statements: let the LLM decide
+        tables.append(candidates[0])
+    if any(not table.has_quarter(q) for table in tables for q in quarters):
+        return None
+
+    metrics = [table.canonical_metric(key) for table, key in zip(tables, metric_keys)]
+    table, metric = tables[0], metrics[0]
+    where = f'WHERE "METRICS" = \'{_literal(metric)}\''
+    source = f"FROM {table.qualified_name}"
+    chronological = sorted(quarters, key=_quarter_key)
+    rate_like = table.statement == "ratio" or RATE_LIKE.search(metric.lower()) is not None
+    flow = table.statement in ("income", "cash_flow") and not rate_like
+
+    if len(metrics) == 2:
+        if op != "ratio" or len(quarters) != 1:
+            return None
+        other_table, other_metric = tables[1], metrics[1]
+        q = quarters[0]
+        sql = (f'SELECT a."{q}" * 1.0 / b."{q}" AS ratio FROM {table.qualified_name} a '
+               f'JOIN {other_table.qualified_name} b ON a."METRICS" = \'{_literal(metric)}\' '
+               f'AND b."METRICS" = \'{_literal(other_metric)}\'')
+        template = "metric_ratio"
+    elif op is None and len(quarters) == 1:
+        sql = f'SELECT "{quarters[0]}" {source} {where}'
+        template = "value"
+    elif (op == "sum" or (op is None and not EXPLICIT_QUARTER.search(text))) and len(quarters) > 1 and flow:
+        # "How much gross profit in 2023" -> sum of the quarters (flows only, never balances or rates);
+        # "Q2 and Q3" without "total" is not a request for a sum
+        sql = f"SELECT ({_column_list(chronological, ' + ')}) {source} {where}"
+        template = "sum"
+    elif op == "average" and len(quarters) > 1:
+        sql = f"SELECT ({_column_list(chronological, ' + ')}) / {len(quarters)} {source} {where}"
+        template = "average"
+    elif op in ("minimum", "maximum") and len(quarters) > 1:
+        function = "LEAST" if op == "minimum" else "GREATEST"
+        sql = f"SELECT {function}({_column_list(chronological)}) {source} {where}"
+        template = op
+    elif op == "difference" and len(quarters) == 2:
+        start, end = quarters
+        sql = f'SELECT ("{end}" - "{start}") {source} {where}'
+        template = "difference"
+    elif op == "pct_change" and len(quarters) == 2:
+        start, end = quarters
+        sql = f'SELECT ("{end}" - "{start}") / "{start}" * 100 {source} {where}'
+        template = "pct_change"
+    elif op == "ratio" and len(quarters) == 2:
+        sql = f'SELECT ("{quarters[0]}" / "{quarters[1]}") {source} {where}'
+        template = "quarter_ratio"
+    else:
+        return None
+
+    logging.debug("Fast path template %s: %s", template, sql)
+    return TemplateMatch(sql, template, metrics, quarters)
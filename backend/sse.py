@@ -0,0 +1,16 @@
+import json
+
+# Stop proxies (nginx, Render) from buffering the stream and delaying the first byte
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def wants_stream(data, accept_header):
+    """Clients opt in with "stream": true in the body or an Accept: text/event-stream header."""
+    return bool(data.get("stream")) or "text/event-stream" in (accept_header or "")
+
+def sse_event(event, data):
+    """One server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def format_sources(relevant_docs):
+    """Source list in the shape /query_chatbot returns it."""
+    return [{"source": doc["source"], "snippet": doc["text"][:200]} for doc in relevant_docs]
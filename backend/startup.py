@@ -0,0 +1,30 @@
+import time
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Taken when the first module of the app imports this one
+PROCESS_START = time.perf_counter()
+_timings = OrderedDict()
+
+@contextmanager
+def timed(stage):
+    """Record how long a startup stage takes."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings[stage] = round(time.perf_counter() - start_time, 3)
+
+def mark(stage):
+    """Record the time elapsed since process start (e.g. 'imports')."""
+    _timings[stage] = round(time.perf_counter() - PROCESS_START, 3)
+
+def startup_report():
+    """Per-stage startup timings in seconds."""
+    return {"stages": dict(_timings), "since_start": round(time.perf_counter() - PROCESS_START, 3)}
+
+def log_startup_report():
+    stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in _timings.items())
+    logging.info("🚀 Startup: %s", stages)
+    print(f"🚀 Startup: {stages}")
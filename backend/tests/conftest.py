@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The backend modules are flat and use paths relative to backend/ (Oracle_DDLs, Rag, instance)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
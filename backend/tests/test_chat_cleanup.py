@@ -0,0 +1,80 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+import pytest
+
+sa = pytest.importorskip("sqlalchemy")
+from chat_cleanup import EmptySessionSweeper, delete_session
+
+metadata = sa.MetaData()
+chat_session = sa.Table(
+    "chat_session", metadata,
+    sa.Column("id", sa.String(50), primary_key=True),
+    sa.Column("user_id", sa.String(50)),
+    sa.Column("created_at", sa.DateTime),
+)
+chat = sa.Table(
+    "chat", metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("session_id", sa.String(50), sa.ForeignKey("chat_session.id")),
+    sa.Column("message", sa.Text),
+)
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'chats.db'}")
+    metadata.create_all(engine)
+    return engine
+
+def add_sessions(engine, count, age, messages=0):
+    ids = [str(uuid.uuid4()) for _ in range(count)]
+    created = datetime.utcnow() - timedelta(seconds=age)
+    with engine.begin() as conn:
+        conn.execute(chat_session.insert(), [{"id": i, "user_id": "u", "created_at": created} for i in ids])
+        if messages:
+            conn.execute(chat.insert(), [{"session_id": i, "message": "m"} for i in ids for _ in range(messages)])
+    return ids
+
+def count(engine, table):
+    with engine.connect() as conn:
+        return conn.execute(sa.select(sa.func.count()).select_from(table)).scalar()
+
+def test_sweep_deletes_only_old_empty_sessions_in_chunks(engine):
+    add_sessions(engine, 250, age=7200)
+    kept = add_sessions(engine, 40, age=7200, messages=2) + add_sessions(engine, 5, age=10)
+    forgotten = []
+    sweeper = EmptySessionSweeper(engine, chat, chat_session, chunk_size=100, pause_ms=0, min_age=3600,
+                                  on_deleted=forgotten.extend)
+    assert sweeper.run() == 250
+    assert count(engine, chat_session) == len(kept)
+    assert sweeper.report()["progress"]["chunks"] >= 3
+    assert len(forgotten) == 250
+    assert sweeper.run(min_age=0) == 5  # the endpoint's "all empty sessions"
+
+def test_delete_session_removes_messages_in_chunks(engine):
+    big, other = add_sessions(engine, 2, age=0, messages=250)
+    assert delete_session(engine, chat, chat_session, big, chunk_size=100, pause_ms=0) == 250
+    assert count(engine, chat) == 250 and count(engine, chat_session) == 1
+
+def test_only_one_sweeper_holds_the_lease(engine):
+    first = EmptySessionSweeper(engine, chat, chat_session)
+    second = EmptySessionSweeper(engine, chat, chat_session)
+    assert first.holds_lease()
+    assert not second.holds_lease()
+    first._release_lease()
+    assert second.holds_lease()
+    second._release_lease()
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_worker_does_not_inherit_a_sweep_in_progress(engine):
+    add_sessions(engine, 3, age=7200)
+    sweeper = EmptySessionSweeper(engine, chat, chat_session, pause_ms=0)
+    sweeper._running.acquire()  # the master is mid-sweep when the worker forks
+    sweeper.stats["in_progress"] = True
+    pid = os.fork()
+    if pid == 0:
+        ok = sweeper.run() == 3 and sweeper.report()["runs"] == 1 and not sweeper.report()["in_progress"]
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    sweeper._running.release()
+    assert os.WEXITSTATUS(status) == 0
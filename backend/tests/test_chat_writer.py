@@ -0,0 +1,47 @@
+import threading
+import pytest
+
+sa = pytest.importorskip("sqlalchemy")
+from chat_writer import ChatWriter
+
+metadata = sa.MetaData()
+chat = sa.Table(
+    "chat", metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("message", sa.Text),
+)
+
+class SlowWriter(ChatWriter):
+    """Holds each commit until `release` is set."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.release = threading.Event()
+
+    def _insert(self, rows):
+        self.release.wait(5)
+        super()._insert(rows)
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'chats.db'}")
+    metadata.create_all(engine)
+    return engine
+
+def count(engine):
+    with engine.connect() as conn:
+        return conn.execute(sa.select(sa.func.count()).select_from(chat)).scalar()
+
+def test_group_write_commits_before_answering(engine):
+    writer = ChatWriter(engine, chat, mode="group", window_ms=1)
+    assert writer.write([{"message": "q"}, {"message": "a"}]) is True
+    assert count(engine) == 2
+    writer.flush()
+
+def test_slow_group_commit_answers_queued_and_still_commits_once(engine):
+    writer = SlowWriter(engine, chat, mode="group", window_ms=1, timeout=0.05)
+    assert writer.write([{"message": "q"}]) is False  # queued, not an error
+    assert writer.report()["timeouts"] == 1
+    writer.release.set()
+    writer.flush()
+    assert count(engine) == 1
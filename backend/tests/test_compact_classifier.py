@@ -0,0 +1,48 @@
+import itertools
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sklearn")  # unpickling the reference model needs scikit-learn
+pytest.importorskip("nltk")
+import compact_classifier
+
+if not compact_classifier.exists():
+    pytest.skip("artifacts/compact has not been exported", allow_module_level=True)
+
+COMPANIES = ["amazon", "mcdonald", "coca cola", "jpmorgan", "hsbc", "google", "amd", "mastercard"]
+NUMERICAL = [
+    "what wa {c} revenue in q{q} {y}",
+    "how much gross profit did {c} report in {y}",
+    "what is the ratio of q{q} {y} and q{p} {y} for {c} cash and equivalent",
+    "what is the percentage change in {c} net income between q{p} {y} and q{q} {y}",
+    "what wa the average operating margin of {c} in {y}",
+]
+CONTEXTUAL = [
+    "what are the main risk {c} mention in it latest filing",
+    "how is {c} investing in ai",
+    "summarize {c} growth strategy for {y}",
+    "did {c} management comment on supply chain issue in q{q}",
+]
+
+def corpus(vectorizer):
+    """Every vocabulary term on its own (touches every feature) plus a few hundred generated questions."""
+    docs = list(vectorizer.vocabulary_)
+    for template, c, q, y in itertools.product(NUMERICAL + CONTEXTUAL, COMPANIES, (2, 4), (2023, 2024)):
+        docs.append(template.format(c=c, q=q, p=q - 1, y=y))
+    docs += ["", "the", "revenue revenue revenue", " ".join(sorted(vectorizer.vocabulary_)[:200])]
+    return docs
+
+def test_compact_model_matches_pickled_model_exactly():
+    model, vectorizer = compact_classifier._load_pickles()
+    compact_vectorizer, forest = compact_classifier.load()
+    docs = corpus(vectorizer)
+    assert len(docs) > 500
+
+    expected_X = vectorizer.transform(docs)
+    actual_X = compact_vectorizer.transform(docs)
+    expected = model.predict_proba(expected_X)
+    actual = forest.predict_proba(actual_X)
+
+    assert np.array_equal(expected, actual)
+    assert np.array_equal(model.predict(expected_X), forest.predict(actual_X))
+    assert list(model.classes_) == list(forest.classes_)
@@ -0,0 +1,24 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+from query_embedding_cache import QueryEmbeddingCache
+
+@pytest.fixture
+def cache(tmp_path):
+    return QueryEmbeddingCache(path=str(tmp_path / "cache"), memory_entries=4, disk_entries=8, model="test")
+
+def test_callers_cannot_modify_cached_vectors(cache):
+    original = np.array([3.0, 4.0], dtype=np.float32)
+    cache.put("q", original)
+    original[:] = 0  # caller reuses its buffer
+    vector = cache.get("q")
+    vector /= np.linalg.norm(vector)  # what faiss.normalize_L2 does to SemanticCache lookups
+    assert cache.get("q").tolist() == [3.0, 4.0]
+
+def test_disk_tier_is_shared_and_unchanged(cache, tmp_path):
+    cache.put("q", [3.0, 4.0])
+    other = QueryEmbeddingCache(path=str(tmp_path / "cache"), memory_entries=4, disk_entries=8, model="test")
+    vector = other.get("q")
+    vector *= 2
+    assert other.get("q").tolist() == [3.0, 4.0]
+    assert other.report()["disk_hits"] == 1 and other.report()["memory_hits"] == 1
@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+import pytest
+from rate_limiter import parse_retry_after
+
+@pytest.mark.parametrize("value, expected", [
+    ("7", 7.0),
+    ("2.5", 2.5),
+    ("-3", 0.0),
+    (None, 4.0),
+    ("soon", 4.0),
+    ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0),  # already past
+])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value, 4.0) == expected
+
+def test_parse_retry_after_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 <= parse_retry_after(format_datetime(when, usegmt=True), 4.0) <= 30
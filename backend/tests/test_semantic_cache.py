@@ -0,0 +1,33 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+from semantic_cache import SemanticCache, question_periods
+
+VECTOR = np.array([0.6, 0.8, 0.0], dtype=np.float32)
+
+def test_question_periods():
+    assert question_periods("Revenue in Q1 2023?") == ("Q1_2023",)
+    assert question_periods("What was FY23 revenue?") == ("FY2023",)
+    assert question_periods("Why did margins fall?") == ()
+
+def test_paraphrase_hits():
+    cache = SemanticCache(threshold=0.95)
+    cache.add("Apple", "What was revenue in Q1 2023?", VECTOR, "answer", [])
+    assert cache.lookup("apple", "How much revenue in Q1 2023?", VECTOR + 0.01) == ("answer", [])
+
+@pytest.mark.parametrize("cached, asked", [
+    ("What was revenue in 2022?", "What was revenue in 2023?"),
+    ("What was revenue in Q1 2023?", "What was revenue in Q1 2024?"),
+    ("What was revenue in Q1 2023?", "What was revenue in Q2 2023?"),
+])
+def test_other_period_misses(cached, asked):
+    cache = SemanticCache(threshold=0.95)
+    cache.add("Apple", cached, VECTOR, "answer", [])
+    assert cache.lookup("Apple", asked, VECTOR) is None  # same embedding, other period
+    assert cache.report()["misses"] == 1
+
+def test_version_is_read_outside_the_lock():
+    cache = SemanticCache(version_provider=lambda: cache._lock.locked() and pytest.fail("provider called under lock"))
+    cache.add("Apple", "Revenue in 2023?", VECTOR, "answer", [])
+    assert cache.lookup("Apple", "Revenue in 2023?", VECTOR) == ("answer", [])
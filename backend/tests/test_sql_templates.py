@@ -0,0 +1,67 @@
+import pytest
+from schema_catalog import build_catalog
+from sql_templates import generate_sql
+
+@pytest.fixture(scope="module")
+def amzn():
+    return build_catalog().get("amzn")
+
+# Questions the fast path must answer, with the template it should pick
+MATCHES = [
+    ("What was revenue in Q3 2024?", "value"),
+    ("What was Amazon's revenue in Q3 2024?", "value"),
+    ("What was the company's revenue for the third quarter of 2024?", "value"),
+    ("What was the total revenue in 2023?", "sum"),
+    ("What was revenue in the first half of 2024?", "sum"),
+    ("What was the combined revenue in Q2 2024 and Q3 2024?", "sum"),
+    ("How much did revenue increase from Q2 2024 to Q3 2024?", "difference"),
+    ("What was the percentage change in revenue between Q2 2024 and Q3 2024?", "pct_change"),
+    ("What was the average revenue in 2023?", "average"),
+]
+
+# Questions with words the templates don't understand: these must go to the LLM
+FALLBACKS = [
+    "What was Amazon's revenue growth in Q3 2024?",
+    "Did revenue go up in Q3 2024?",
+    "What was revenue before taxes in Q3 2024?",
+    "What was revenue in Q3 2024 and Q2 2024?",
+    "What was revenue in Q1 and Q2 2024?",
+    "What was revenue in Q3 2024 in Europe?",
+    "What was revenue in Q3 2024 in millions of euros?",
+    "What was revenue in Q3 2024 adjusted for currency?",
+    "What was revenue in Q3 2024 excluding AWS?",
+    "Why did revenue fall in Q3 2024?",
+    "What will revenue be in Q3 2024?",
+    "What was Microsoft's revenue in Q3 2024?",
+]
+
+@pytest.mark.parametrize("question, template", MATCHES)
+def test_fast_path_matches(amzn, question, template):
+    match = generate_sql(question, amzn, ["Amazon"])
+    assert match is not None
+    assert match.template == template
+
+@pytest.mark.parametrize("question", FALLBACKS)
+def test_falls_back_to_llm(amzn, question):
+    assert generate_sql(question, amzn, ["Amazon"]) is None
+
+def test_two_quarters_without_sum_keyword_are_not_added(amzn):
+    match = generate_sql("What was the combined revenue in Q3 2024 and Q2 2024?", amzn, ["Amazon"])
+    assert match.sql == 'SELECT ("Q2_2024" + "Q3_2024") FROM "ADMIN"."AMZN_INCOME_QUARTERLY" WHERE "METRICS" = \'Revenue\''
+    assert generate_sql("What was revenue in Q3 2024 and Q2 2024?", amzn, ["Amazon"]) is None
+
+def test_change_follows_the_order_the_quarters_were_named(amzn):
+    table = '"ADMIN"."AMZN_INCOME_QUARTERLY"'
+    backwards = generate_sql("What was the change in revenue from Q3 2024 to Q2 2024?", amzn, ["Amazon"])
+    assert backwards.sql == f'SELECT ("Q2_2024" - "Q3_2024") FROM {table} WHERE "METRICS" = \'Revenue\''
+    pct = generate_sql("What was the percentage change in revenue from Q3 2024 to Q2 2024?", amzn, ["Amazon"])
+    assert pct.sql == f'SELECT ("Q2_2024" - "Q3_2024") / "Q3_2024" * 100 FROM {table} WHERE "METRICS" = \'Revenue\''
+    # Without "from ... to" a reversed pair is ambiguous
+    assert generate_sql("What was the change in revenue between Q3 2024 and Q2 2024?", amzn, ["Amazon"]) is None
+
+def test_between_two_quarters_covers_the_whole_range(amzn):
+    match = generate_sql("What was the maximum revenue between Q1 2023 and Q4 2023?", amzn, ["Amazon"])
+    assert match.sql == ('SELECT GREATEST("Q1_2023", "Q2_2023", "Q3_2023", "Q4_2023") '
+                         'FROM "ADMIN"."AMZN_INCOME_QUARTERLY" WHERE "METRICS" = \'Revenue\'')
+    average = generate_sql("What was the average revenue from Q4 2023 to Q2 2024?", amzn, ["Amazon"])
+    assert average.quarters == ["Q4_2023", "Q1_2024", "Q2_2024"]
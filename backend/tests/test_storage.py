@@ -0,0 +1,207 @@
+import os
+import sys
+import uuid
+import shutil
+import subprocess
+from datetime import datetime
+import pytest
+
+sa = pytest.importorskip("sqlalchemy")
+pytest.importorskip("psycopg2")
+import storage
+from chat_schema import migrate_chat_db, CHAT_INDEXES
+
+# --------------------------- Temporary PostgreSQL ---------------------------
+
+@pytest.fixture(scope="module")
+def postgres_server(tmp_path_factory):
+    """A throwaway PostgreSQL cluster (initdb + pg_ctl on a Unix socket), or TEST_POSTGRES_URL if set."""
+    url = os.getenv("TEST_POSTGRES_URL")
+    if url:
+        yield url
+        return
+    initdb, pg_ctl = shutil.which("initdb"), shutil.which("pg_ctl")
+    if not initdb or not pg_ctl:
+        pytest.skip("initdb/pg_ctl not on PATH (or set TEST_POSTGRES_URL)")
+    if hasattr(os, "geteuid") and os.geteuid() == 0:
+        pytest.skip("initdb refuses to run as root (set TEST_POSTGRES_URL instead)")
+    base = tmp_path_factory.mktemp("pg")
+    data = base / "data"
+    subprocess.run([initdb, "-D", str(data), "-U", "postgres", "-A", "trust", "--no-sync"],
+                   check=True, capture_output=True)
+    subprocess.run([pg_ctl, "-D", str(data), "-l", str(base / "log"), "-w", "-o", f"-k {base} -h '' -F", "start"],
+                   check=True, capture_output=True)
+    try:
+        yield f"postgresql+psycopg2://postgres@/postgres?host={base}"
+    finally:
+        subprocess.run([pg_ctl, "-D", str(data), "-m", "immediate", "-w", "stop"], capture_output=True)
+
+@pytest.fixture
+def postgres_url(postgres_server):
+    """A fresh, empty database on the test server for each test."""
+    name = f"finqa_test_{uuid.uuid4().hex[:12]}"
+    admin = sa.create_engine(postgres_server, isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.execute(sa.text(f"CREATE DATABASE {name}"))
+    url = sa.engine.make_url(postgres_server).set(database=name).render_as_string(hide_password=False)
+    yield url
+    with admin.connect() as conn:
+        conn.execute(sa.text(f"DROP DATABASE {name} WITH (FORCE)"))
+    admin.dispose()
+
+# --------------------------- Engine Configuration ---------------------------
+
+def test_engine_options():
+    assert storage.engine_options("sqlite:///chats.db") == {}
+    options = storage.engine_options("postgres://u:p@db/finqa")
+    assert options["pool_size"] == storage.DB_POOL_SIZE and options["pool_pre_ping"]
+    assert storage.normalize_url("postgres://u:p@db/finqa") == "postgresql://u:p@db/finqa"
+
+def test_configure_app_on_postgresql(postgres_url):
+    flask = pytest.importorskip("flask")
+    flask_sqlalchemy = pytest.importorskip("flask_sqlalchemy")
+    app = flask.Flask(__name__)
+    storage.configure_app(app, postgres_url)
+    db = flask_sqlalchemy.SQLAlchemy(app)
+    with app.app_context():
+        assert db.engine.dialect.name == "postgresql"
+        assert db.engine.pool.size() == storage.DB_POOL_SIZE
+        assert db.engine.pool._pre_ping
+        with db.engine.connect() as conn:
+            assert conn.execute(sa.text("SELECT 1")).scalar() == 1
+        assert storage.pool_status(db.engine)["backend"] == "postgresql"
+        db.engine.dispose()
+
+# --------------------------- Schema Migration ---------------------------
+
+def create_old_chat_schema(engine):
+    """chats.db as it was before created_at and the history indexes."""
+    with engine.begin() as conn:
+        conn.execute(sa.text("CREATE TABLE chat_session (id VARCHAR(50) PRIMARY KEY, title VARCHAR(100), user_id VARCHAR(50))"))
+        conn.execute(sa.text("CREATE TABLE chat (id SERIAL PRIMARY KEY, sender VARCHAR(10), message TEXT, "
+                             "session_id VARCHAR(50) REFERENCES chat_session(id))"))
+        conn.execute(sa.text("INSERT INTO chat_session VALUES ('s1', 'Chat s1', 'u1')"))
+        conn.execute(sa.text("INSERT INTO chat (sender, message, session_id) VALUES ('user', 'hi', 's1')"))
+
+def test_migrate_chat_db_is_idempotent(postgres_url):
+    engine = sa.create_engine(postgres_url)
+    create_old_chat_schema(engine)
+    applied = migrate_chat_db(engine)
+    assert set(applied) == {"chat_session.created_at", "chat.created_at", *CHAT_INDEXES}
+    assert migrate_chat_db(engine) == []
+    inspector = sa.inspect(engine)
+    assert {"ix_chat_session_id_id"} <= {index["name"] for index in inspector.get_indexes("chat")}
+    with engine.connect() as conn:
+        assert conn.execute(sa.text("SELECT COUNT(*) FROM chat WHERE created_at IS NULL")).scalar() == 0
+    engine.dispose()
+
+def test_migrate_tolerates_an_index_created_by_another_instance(postgres_url, monkeypatch):
+    import chat_schema
+    engine = sa.create_engine(postgres_url)
+    create_old_chat_schema(engine)
+    migrate_chat_db(engine)
+    with engine.begin() as conn:
+        conn.execute(sa.text("DROP INDEX ix_chat_session_id_id"))
+
+    real_inspect = chat_schema.inspect
+    def inspect_then_race(bind):
+        inspector = real_inspect(bind)
+        inspector.get_indexes("chat")  # this instance sees the index missing...
+        with engine.begin() as conn:  # ...and another instance creates it first
+            conn.execute(sa.text("CREATE INDEX ix_chat_session_id_id ON chat (session_id, id)"))
+        return inspector
+    monkeypatch.setattr(chat_schema, "inspect", inspect_then_race)
+    assert migrate_chat_db(engine) == ["ix_chat_session_id_id"]  # IF NOT EXISTS: no error
+    engine.dispose()
+
+# --------------------------- SQLite -> PostgreSQL Copy ---------------------------
+
+@pytest.fixture
+def sqlite_url(tmp_path):
+    """A chats.db/users.db-like SQLite file with one orphaned message."""
+    url = f"sqlite:///{tmp_path / 'source.db'}"
+    engine = sa.create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(sa.text("CREATE TABLE chat_session (id VARCHAR(50) PRIMARY KEY, title VARCHAR(100), "
+                             "user_id VARCHAR(50), created_at DATETIME)"))
+        conn.execute(sa.text("CREATE TABLE chat (id INTEGER PRIMARY KEY, sender VARCHAR(10), message TEXT, "
+                             "session_id VARCHAR(50) REFERENCES chat_session(id), created_at DATETIME)"))
+        conn.execute(sa.text("CREATE INDEX ix_chat_session_id_id ON chat (session_id, id)"))
+        conn.execute(sa.text('CREATE TABLE "user" (id INTEGER PRIMARY KEY, username VARCHAR(50) UNIQUE NOT NULL, '
+                             "email VARCHAR(120) UNIQUE NOT NULL, password VARCHAR(200) NOT NULL)"))
+        now = datetime(2024, 5, 1, 12, 0, 0, 123456)
+        conn.execute(sa.text("INSERT INTO chat_session VALUES (:id, 'Chat', 'u1', :at)"),
+                     [{"id": f"s{i}", "at": now} for i in range(3)])
+        conn.execute(sa.text("INSERT INTO chat (id, sender, message, session_id, created_at) VALUES (:id, 'user', 'm', :s, :at)"),
+                     [{"id": i * 10, "s": f"s{i % 3}", "at": now} for i in range(1, 8)])
+        conn.execute(sa.text("INSERT INTO chat (id, sender, message, session_id) VALUES (99, 'user', 'orphan', 'gone')"))
+        conn.execute(sa.text("""INSERT INTO "user" VALUES (4, 'a', 'a@x.io', 'h'), (7, 'b', 'b@x.io', 'h')"""))
+    engine.dispose()
+    return url
+
+def test_copy_database(sqlite_url, postgres_url):
+    counts = storage.copy_database(sqlite_url, postgres_url, batch_size=2)
+    assert counts["chat_session"] == {"copied": 3, "skipped": 0}
+    assert counts["chat"] == {"copied": 7, "skipped": 1}  # the orphan
+    assert counts["user"] == {"copied": 2, "skipped": 0}
+
+    engine = sa.create_engine(postgres_url)
+    with engine.begin() as conn:
+        # Sequences continue after the copied ids
+        new_chat = conn.execute(sa.text("INSERT INTO chat (sender, message, session_id) VALUES ('bot', 'x', 's0') RETURNING id")).scalar()
+        assert new_chat == 71
+        new_user = conn.execute(sa.text("""INSERT INTO "user" (username, email, password) VALUES ('c', 'c@x.io', 'h') RETURNING id""")).scalar()
+        assert new_user == 8
+        assert conn.execute(sa.text("SELECT created_at FROM chat_session WHERE id = 's0'")).scalar() == datetime(2024, 5, 1, 12, 0, 0, 123456)
+    assert "ix_chat_session_id_id" in {index["name"] for index in sa.inspect(engine).get_indexes("chat")}
+    engine.dispose()
+
+def test_copy_refuses_a_non_empty_target(sqlite_url, postgres_url):
+    storage.copy_database(sqlite_url, postgres_url)
+    with pytest.raises(RuntimeError, match="not empty"):
+        storage.copy_database(sqlite_url, postgres_url)
+
+# --------------------------- App Round Trip ---------------------------
+
+@pytest.fixture
+def chat_app(postgres_url, monkeypatch):
+    """app.py imported against the test database (needs the app's full dependency set)."""
+    monkeypatch.setattr(storage, "CHAT_DATABASE_URL", postgres_url)
+    monkeypatch.delitem(sys.modules, "app", raising=False)
+    try:
+        import app as chatbot
+    except ImportError as e:
+        pytest.skip(f"app dependencies not installed: {e}")
+    yield chatbot
+    chatbot.session_sweeper.stop()
+    chatbot.chat_writer.flush()
+    with chatbot.app.app_context():
+        chatbot.db.engine.dispose()
+    sys.modules.pop("app", None)
+
+def test_save_page_cleanup_delete_round_trip(chat_app):
+    client = chat_app.app.test_client()
+    session_id = client.post("/new_session", json={"user_id": "u1"}).get_json()["session_id"]
+    empty_id = client.post("/new_session", json={"user_id": "u1"}).get_json()["session_id"]
+
+    messages = [{"sender": "user" if i % 2 == 0 else "bot", "message": f"m{i}"} for i in range(5)]
+    response = client.post("/save_chats", json={"session_id": session_id, "user_id": "u1", "messages": messages})
+    assert response.status_code == 201
+    assert client.post("/save_chats", json={"session_id": session_id, "user_id": "u2", "messages": messages}).status_code == 403
+
+    first = client.get(f"/get_chat/{session_id}?limit=3").get_json()
+    assert [m["message"] for m in first["messages"]] == ["m2", "m3", "m4"]
+    second = client.get(f"/get_chat/{session_id}?limit=3&before={first['next_before']}").get_json()
+    assert [m["message"] for m in second["messages"]] == ["m0", "m1"] and second["next_before"] is None
+
+    sessions = client.get("/get_sessions/u1?limit=1")
+    assert len(sessions.get_json()) == 1 and sessions.headers.get("X-Next-Before")
+
+    cleanup = client.delete("/cleanup_empty_sessions").get_json()
+    assert cleanup["deleted"] == 1
+    assert client.get(f"/get_chat/{empty_id}").status_code == 404
+
+    assert client.delete(f"/delete_chat/{session_id}").status_code == 200
+    assert client.get(f"/get_chat/{session_id}").status_code == 404
+    with chat_app.app.app_context():
+        assert chat_app.Chat.query.count() == 0
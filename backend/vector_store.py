@@ -0,0 +1,364 @@
+import os
+import re
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import threading
+from dotenv import load_dotenv
+from langchain_community.vectorstores import FAISS
+from embeddings import get_embeddings, create_embeddings, embedding_info, read_embedding_info, write_embedding_info
+from ann_index import FAISS_INDEX_TYPE, save_store, load_store
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+FAISS_STORE_PATH = os.getenv("FAISS_STORE_PATH", "Rag")
+INDEX_FILES = ("index.faiss", "index.pkl")
+CHECK_INTERVAL = float(os.getenv("VECTOR_STORE_CHECK_INTERVAL", "30"))  # seconds between on-disk checks
+SHARDS_PATH = os.getenv("FAISS_SHARDS_PATH", os.path.join(FAISS_STORE_PATH, "shards"))  # one index per company
+MANIFEST_NAME = "manifest.json"  # ingestion manifest kept next to the combined index
+MIGRATE_BATCH_SIZE = 512  # chunks per progress step when re-embedding
+QUARTER_PATTERN = re.compile(r"(Q[1-4])\s*(\d{4})")
+
+# --------------------------- Filing Names ---------------------------
+
+def parse_company_name(file_name):
+    """Extracts the company name from a file name."""
+    base = os.path.basename(file_name)
+    match = re.match(r"^(.*?)_", base)
+    if match:
+        return match.group(1)
+    return os.path.splitext(base)[0]
+
+def parse_quarter(file_name):
+    """'Amazon_Q3 2024.txt' -> 'Q3_2024' (None if the name has no quarter)."""
+    match = QUARTER_PATTERN.search(os.path.basename(file_name))
+    return f"{match.group(1)}_{match.group(2)}" if match else None
+
+def company_key(name):
+    """Shard directory name for a company: 'S&P Global' -> 'spglobal'."""
+    return re.sub(r"[^a-z0-9]", "", (name or "").lower())
+
+# --------------------------- Vector Store Manager ---------------------------
+
+class VectorStoreManager:
+    """
+    Loads the FAISS index once per process and shares it across request threads.
+
+    The on-disk files are stat'ed at most every `check_interval` seconds. When their
+    mtime/size change, a checksum confirms the content really changed and the new index
+    is loaded off to the side, then swapped in with a single reference assignment.
+    Requests already holding the old store keep using it until they finish.
+    """
+
+    def __init__(self, store_path=FAISS_STORE_PATH, check_interval=CHECK_INTERVAL):
+        self.store_path = store_path
+        self.check_interval = check_interval
+        self._store = None
+        self._signature = None
+        self._checksum = None
+        self._last_check = 0.0
+        self._embeddings = None
+        self._reload_lock = threading.Lock()
+        self.reloads = 0
+
+    @property
+    def embeddings(self):
+        """Embedding client reused across reloads."""
+        if self._embeddings is None:
+            self._embeddings = get_embeddings()
+        return self._embeddings
+
+    def _file_signature(self):
+        """(mtime, size) of each index file, or None if any file is missing."""
+        signature = []
+        for name in INDEX_FILES:
+            try:
+                st = os.stat(os.path.join(self.store_path, name))
+            except FileNotFoundError:
+                return None
+            signature.append((st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def _file_checksum(self):
+        """SHA-256 over the index files, used to ignore touches that don't change content."""
+        digest = hashlib.sha256()
+        for name in INDEX_FILES:
+            with open(os.path.join(self.store_path, name), "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        return digest.hexdigest()
+
+    def _load(self):
+        """Deserialize the index from disk; returns None on failure or if it was embedded with another model."""
+        built_with = read_embedding_info(self.store_path)
+        if built_with != embedding_info():
+            logging.error("❌ %s was embedded with %s but EMBEDDING_BACKEND is %s; re-embed it with: "
+                          "python vector_store.py migrate", self.store_path, built_with, embedding_info())
+            return None
+        try:
+            return load_store(self.store_path, self.embeddings, exact=False)
+        except Exception as e:
+            logging.error("❌ Error loading FAISS index: %s", e)
+            return None
+
+    def get(self):
+        """Return the current vector store, reloading it if the files on disk changed."""
+        store = self._store
+        if store is not None and time.monotonic() - self._last_check < self.check_interval:
+            return store
+
+        # Only one thread reloads; the others keep serving the current index meanwhile.
+        if not self._reload_lock.acquire(blocking=store is None):
+            return store
+        try:
+            if self._store is not None and time.monotonic() - self._last_check < self.check_interval:
+                return self._store
+            self.refresh()
+            return self._store
+        finally:
+            self._reload_lock.release()
+
+    def refresh(self):
+        """Check the files on disk and hot-swap the index if its content changed."""
+        self._last_check = time.monotonic()
+        signature = self._file_signature()
+        if signature is None:
+            # Files missing (or mid-write): keep whatever we already have.
+            return False
+        if signature == self._signature and self._store is not None:
+            return False
+
+        checksum = self._file_checksum()
+        if checksum == self._checksum and self._store is not None:
+            self._signature = signature
+            return False
+
+        new_store = self._load()
+        if new_store is None:
+            return False
+        self._store, self._signature, self._checksum = new_store, signature, checksum
+        self.reloads += 1
+        logging.info("🔄 FAISS index loaded from %s (reload #%d)", self.store_path, self.reloads)
+        return True
+
+    @property
+    def loaded(self):
+        return self._store is not None
+
+    def version(self):
+        """Checksum of the index currently served (checks the files on disk first)."""
+        self.get()
+        return self._checksum
+
+    def stats(self):
+        """Basic counters for monitoring."""
+        return {
+            "loaded": self.loaded,
+            "reloads": self.reloads,
+            "checksum": self._checksum,
+            "seconds_since_check": round(time.monotonic() - self._last_check, 2),
+        }
+
+
+# --------------------------- Company Shards ---------------------------
+
+class CompanyShards:
+    """
+    One FAISS index per company under `shards_path/<company_key>/`, so a question
+    only searches its own company's vectors. Each shard gets its own
+    VectorStoreManager (lazy load, hot reload); the directory listing is re-read
+    at most every `check_interval` seconds.
+    """
+
+    def __init__(self, shards_path=SHARDS_PATH, check_interval=CHECK_INTERVAL):
+        self.shards_path = shards_path
+        self.check_interval = check_interval
+        self._managers = {}
+        self._names = []
+        self._last_list = None
+        self._lock = threading.Lock()
+
+    def names(self):
+        """Shard keys currently on disk."""
+        if self._last_list is None or time.monotonic() - self._last_list > self.check_interval:
+            try:
+                entries = os.listdir(self.shards_path)
+            except FileNotFoundError:
+                entries = []
+            self._names = sorted(
+                name for name in entries
+                if os.path.exists(os.path.join(self.shards_path, name, INDEX_FILES[0]))
+            )
+            self._last_list = time.monotonic()
+        return self._names
+
+    def resolve(self, company):
+        """
+        Shard key for a company name as the UI sends it. Exact key match first, then a
+        prefix match either way ("McDonald's" -> 'mcdonald'); None if no shard fits.
+        """
+        key = company_key(company)
+        if not key:
+            return None
+        names = self.names()
+        if key in names:
+            return key
+        matches = [
+            name for name in names
+            if min(len(name), len(key)) >= 3 and (key.startswith(name) or name.startswith(key))
+        ]
+        return max(matches, key=len) if matches else None
+
+    def manager(self, company):
+        shard = self.resolve(company)
+        if shard is None:
+            return None
+        with self._lock:
+            manager = self._managers.get(shard)
+            if manager is None:
+                manager = VectorStoreManager(os.path.join(self.shards_path, shard), self.check_interval)
+                self._managers[shard] = manager
+        return manager
+
+    def get(self, company):
+        """The company's vector store, or None if it has no shard."""
+        manager = self.manager(company)
+        return manager.get() if manager is not None else None
+
+    def version(self):
+        """Combined checksum of the shards loaded so far (re-checked on disk like get())."""
+        with self._lock:
+            managers = sorted(self._managers.items())
+        return ",".join(f"{name}:{manager.version()}" for name, manager in managers)
+
+    def stats(self):
+        with self._lock:
+            managers = dict(self._managers)
+        return {"available": self.names(), "loaded": {name: m.stats() for name, m in managers.items()}}
+
+
+vector_store_manager = VectorStoreManager()
+company_shards = CompanyShards()
+
+def get_vector_store(company=None):
+    """
+    FAISS vector store for a question: the company's shard when one exists,
+    otherwise the combined index (None if no index is available).
+    """
+    if company:
+        store = company_shards.get(company)
+        if store is not None:
+            return store
+    return vector_store_manager.get()
+
+def scoped_query(question, company):
+    """Search text for a question: shards need no steering, the combined index gets a company prefix."""
+    if company and company_shards.resolve(company) is None:
+        return f"[Company: {company}] {question}"
+    return question
+
+def vector_store_version():
+    """Version of everything contextual answers can come from (combined index if in use, plus loaded shards)."""
+    combined = vector_store_manager.version() if vector_store_manager.loaded or not company_shards.names() else None
+    return f"{combined}|{company_shards.version()}"
+
+# --------------------------- Sharding Tool ---------------------------
+
+def replace_directory(staging, target):
+    """Rename a freshly written index directory over `target` (readers see the old or the new one, never a mix)."""
+    if os.path.exists(target):
+        previous = f"{target}.old"
+        shutil.rmtree(previous, ignore_errors=True)
+        os.rename(target, previous)
+        os.rename(staging, target)
+        shutil.rmtree(previous, ignore_errors=True)
+    else:
+        os.rename(staging, target)
+
+def build_shards(store_path=FAISS_STORE_PATH, shards_path=SHARDS_PATH):
+    """
+    Split the combined index into per-company shards without re-embedding: vectors
+    are reconstructed from the flat index and each chunk gets 'company' and
+    'quarter' metadata parsed from its source file name. Each shard is written to a
+    temporary directory and renamed into place so running servers never see a
+    half-written index. Shards use the FAISS_INDEX_TYPE index when they are big enough to train one.
+    """
+    store = load_store(store_path, get_embeddings())
+    vectors = store.index.reconstruct_n(0, store.index.ntotal)
+    groups = {}
+    for position, doc_id in store.index_to_docstore_id.items():
+        doc = store.docstore.search(doc_id)
+        source = doc.metadata.get("source", "")
+        metadata = dict(doc.metadata, company=parse_company_name(source), quarter=parse_quarter(source))
+        group = groups.setdefault(company_key(metadata["company"]), ([], [], []))
+        group[0].append(doc.page_content)
+        group[1].append(vectors[position].tolist())
+        group[2].append(metadata)
+
+    os.makedirs(shards_path, exist_ok=True)
+    for key, (texts, shard_vectors, metadatas) in sorted(groups.items()):
+        shard = FAISS.from_embeddings(list(zip(texts, shard_vectors)), get_embeddings(), metadatas=metadatas)
+        target = os.path.join(shards_path, key)
+        staging = f"{target}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        save_store(shard, staging, FAISS_INDEX_TYPE, keep_flat=False)
+        write_embedding_info(staging, read_embedding_info(store_path))
+        replace_directory(staging, target)
+        print(f"✅ {key}: {len(texts)} chunks")
+    return {key: len(group[0]) for key, group in groups.items()}
+
+# --------------------------- Re-embedding Tool ---------------------------
+
+def migrate_index(store_path, output_path, backend, batch_size=MIGRATE_BATCH_SIZE):
+    """
+    Re-embed every chunk of an index with another embedding backend. Chunk texts,
+    metadata and docstore ids are kept, so the ingestion manifest copied alongside
+    stays valid and later incremental runs continue from the migrated index.
+    """
+    target_embeddings = create_embeddings(backend)
+    source = load_store(store_path, target_embeddings)
+    ids = [source.index_to_docstore_id[i] for i in range(source.index.ntotal)]
+    docs = [source.docstore.search(doc_id) for doc_id in ids]
+    texts = [doc.page_content for doc in docs]
+
+    vectors = []
+    start_time = time.time()
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(target_embeddings.embed_documents(texts[start:start + batch_size]))
+        print(f"🔁 {len(vectors)}/{len(texts)} chunks re-embedded ({time.time() - start_time:.1f}s)")
+
+    store = FAISS.from_embeddings(list(zip(texts, vectors)), target_embeddings,
+                                  metadatas=[doc.metadata for doc in docs], ids=ids)
+    staging = f"{output_path.rstrip(os.sep)}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    save_store(store, staging, FAISS_INDEX_TYPE)
+    write_embedding_info(staging, embedding_info(backend))
+    manifest = os.path.join(store_path, MANIFEST_NAME)
+    if os.path.exists(manifest):
+        shutil.copyfile(manifest, os.path.join(staging, MANIFEST_NAME))
+    replace_directory(staging, output_path)
+    return len(texts)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vector store maintenance")
+    parser.add_argument("command", choices=["shard", "migrate"],
+                        help="shard: split the combined index per company; migrate: re-embed it with --backend")
+    parser.add_argument("--store", default=FAISS_STORE_PATH)
+    parser.add_argument("--shards", default=None, help="default: <store>/shards")
+    parser.add_argument("--backend", choices=["google", "local"], default="local", help="migrate: target backend")
+    parser.add_argument("--output", default=None, help="migrate: default <store>_<backend>")
+    args = parser.parse_args()
+    if args.command == "shard":
+        shards = args.shards or (SHARDS_PATH if args.store == FAISS_STORE_PATH else os.path.join(args.store, "shards"))
+        counts = build_shards(args.store, shards)
+        print(f"📦 {sum(counts.values())} chunks split into {len(counts)} company shards under {shards}")
+    else:
+        output = args.output or f"{args.store.rstrip(os.sep)}_{args.backend}"
+        count = migrate_index(args.store, output, args.backend)
+        print(f"✅ {count} chunks re-embedded with {args.backend} into {output}")
+        print(f"👉 Next: python vector_store.py shard --store {output}, then set "
+              f"EMBEDDING_BACKEND={args.backend} and FAISS_STORE_PATH={output}")
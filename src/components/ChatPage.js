@@ -10,6 +10,7 @@ function ChatPage() {
     const [currentChat, setCurrentChat] = useState([]);
     const [chatHistory, setChatHistory] = useState([]);
     const [sessionId, setSessionId] = useState("");
+    const [olderCursor, setOlderCursor] = useState(null);  // id to load earlier messages before
     const [user, setUser] = useState(null);
     const [dropdownOpen, setDropdownOpen] = useState(false);
     const [selectedCompany, setSelectedCompany] = useState('');
@@ -112,12 +113,19 @@ function ChatPage() {
     const fetchAllChatSessions = async () => {
         try {
             const userId = localStorage.getItem("userId");
-            const response = await axios.get(`${CHATBOT_API_URL}/get_all_sessions/${userId}`);
+            // Sessions come one page at a time; X-Next-Before is the cursor for the next page
+            const sessions = [];
+            let before = "";
+            do {
+                const response = await axios.get(`${CHATBOT_API_URL}/get_all_sessions/${userId}`, { params: { before, limit: 200 } });
+                sessions.push(...response.data);
+                before = response.headers["x-next-before"];
+            } while (before);
             
             // Filter out empty chats (sessions with no messages)
             const validSessions = await Promise.all(
-                response.data.map(async (chat) => {
-                    const chatMessages = await axios.get(`${CHATBOT_API_URL}/get_chats/${chat.session_id}`);
+                sessions.map(async (chat) => {
+                    const chatMessages = await axios.get(`${CHATBOT_API_URL}/get_chats/${chat.session_id}`, { params: { limit: 1 } });
                     return chatMessages.data.length > 0 ? chat : null;  // Only keep sessions with messages
                 })
             );
@@ -137,7 +145,8 @@ function ChatPage() {
         const userMessage = { sender: "user", message: message };
         setCurrentChat((prevChat) => [...prevChat, userMessage]);
     
-        await saveChatToBackend(userMessage);
+        // Saved while the (possibly slow) query runs, so closing the tab doesn't lose the question
+        const questionSaved = saveChatToBackend([userMessage]);
     
         try {
             // ✅ Updated API call to the real chatbot
@@ -154,27 +163,28 @@ function ChatPage() {
                 : { sender: "bot", message: "Sorry, I could not process that request." };
     
             setCurrentChat((prevChat) => [...prevChat, botMessage]);
-            await saveChatToBackend(botMessage);
+            await questionSaved;  // keep the answer after its question
+            await saveChatToBackend([botMessage]);
         } catch (error) {
             console.error("Error sending message:", error);
     
             // ✅ Add error handling message
             const errorMessage = { sender: "bot", message: "Error communicating with the chatbot." };
             setCurrentChat((prevChat) => [...prevChat, errorMessage]);
-            await saveChatToBackend(errorMessage);
+            await questionSaved;
+            await saveChatToBackend([errorMessage]);
         }
     
         setMessage(""); // Clear input
     };
     
 
-    // ✅ Save message to backend (SQLite)
-    const saveChatToBackend = async (chatMessage) => {
+    // ✅ Save messages to the backend in one request
+    const saveChatToBackend = async (chatMessages) => {
         try {
             const userId = localStorage.getItem("userId");
-            await axios.post(`${CHATBOT_API_URL}/save_chat`, {
-                sender: chatMessage.sender,
-                message: chatMessage.message,
+            await axios.post(`${CHATBOT_API_URL}/save_chats`, {
+                messages: chatMessages.map(({ sender, message }) => ({ sender, message })),
                 session_id: sessionId,
                 user_id: userId
             });
@@ -193,6 +203,7 @@ function ChatPage() {
             localStorage.setItem("sessionId", newSessionId);
             setSessionId(newSessionId);
             setCurrentChat([]);  // Clear chat messages
+            setOlderCursor(null);
     
             // Force fetch updated chat history after creating a new session
             fetchAllChatSessions();  
@@ -205,11 +216,22 @@ function ChatPage() {
         try {
             const response = await axios.get(`${CHATBOT_API_URL}/get_chat/${selectedSessionId}`);
             setSessionId(selectedSessionId);
-            setCurrentChat(response.data.messages);  // Load the fetched messages
+            setCurrentChat(response.data.messages);  // Load the latest page of messages
+            setOlderCursor(response.data.next_before);
         } catch (error) {
             console.error("Error loading chat session:", error);
         }
     };
+
+    const loadEarlierMessages = async () => {
+        try {
+            const response = await axios.get(`${CHATBOT_API_URL}/get_chat/${sessionId}`, { params: { before: olderCursor } });
+            setCurrentChat((prevChat) => [...response.data.messages, ...prevChat]);
+            setOlderCursor(response.data.next_before);
+        } catch (error) {
+            console.error("Error loading earlier messages:", error);
+        }
+    };
     
     
     // ✅ Delete a chat session
@@ -378,6 +400,9 @@ function ChatPage() {
                     {/* ✅ Chat Window Section */}
                     <div className="chat-app-window">
                         <div className={`chat-app-messages ${currentChat.length > 0 ? "has-messages" : ""}`}>
+                            {olderCursor && (
+                                <button className="chat-app-load-earlier-btn" onClick={loadEarlierMessages}>Load earlier messages</button>
+                            )}
                             {currentChat.length === 0 ? (
                                 <p className="chat-app-placeholder">What can I help with?</p>
                             ) : (